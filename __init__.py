@@ -6,6 +6,7 @@ Nodes:
 - Z-Forge Prompt Builder: Main node with Person 1, Scene, Composition settings
 - Z-Forge Person: Separate node for Person 2/3 data (connect to main node)
 - Z-Forge LLM Config: LM Studio connection and generation settings
+- Z-Forge Batch Prompt Builder: Many prompts per execution with concurrent expansion
 
 Features:
 - Widget Mode: GUI inputs for all variables
@@ -14,6 +15,7 @@ Features:
 - Master Randomize: Randomizes all people at once
 - External Mode: Output for use with other LLM nodes
 - Internal Mode: Full LM Studio integration with separate config node
+- Offline Mode: Rule-based expansion from the template tables (no LLM)
 """
 
 from .z_image_prompt import NODE_CLASS_MAPPINGS as MAIN_MAPPINGS
@@ -22,13 +24,16 @@ from .subject_node import NODE_CLASS_MAPPINGS as PERSON_MAPPINGS
 from .subject_node import NODE_DISPLAY_NAME_MAPPINGS as PERSON_DISPLAY_MAPPINGS
 from .z_forge_llm_config import NODE_CLASS_MAPPINGS as LLM_MAPPINGS
 from .z_forge_llm_config import NODE_DISPLAY_NAME_MAPPINGS as LLM_DISPLAY_MAPPINGS
+from .batch_node import NODE_CLASS_MAPPINGS as BATCH_MAPPINGS
+from .batch_node import NODE_DISPLAY_NAME_MAPPINGS as BATCH_DISPLAY_MAPPINGS
 
 # Combine mappings
-NODE_CLASS_MAPPINGS = {**MAIN_MAPPINGS, **PERSON_MAPPINGS, **LLM_MAPPINGS}
+NODE_CLASS_MAPPINGS = {**MAIN_MAPPINGS, **PERSON_MAPPINGS, **LLM_MAPPINGS, **BATCH_MAPPINGS}
 NODE_DISPLAY_NAME_MAPPINGS = {
     **MAIN_DISPLAY_MAPPINGS,
     **PERSON_DISPLAY_MAPPINGS,
     **LLM_DISPLAY_MAPPINGS,
+    **BATCH_DISPLAY_MAPPINGS,
 }
 
 __all__ = ["NODE_CLASS_MAPPINGS", "NODE_DISPLAY_NAME_MAPPINGS", "WEB_DIRECTORY"]
@@ -39,9 +44,23 @@ WEB_DIRECTORY = "./web"
 # Version info
 __version__ = "0.0.3"
 
-# Initialize model cache at startup (silent failure if LM Studio not running)
+# REST routes for connection tests and model refresh (no-op outside ComfyUI)
 try:
-    from .model_fetcher import initialize_model_cache
-    initialize_model_cache()
+    from .server_routes import register_routes
+    register_routes()
+except Exception:
+    pass  # Don't fail startup if the server API is unavailable
+
+# Parse the keyword-expansion tables of all templates up front
+try:
+    from .template_tables import precompile_template_tables
+    precompile_template_tables()
+except Exception:
+    pass  # Tables are parsed on first use instead
+
+# Discover models in the background (never blocks startup, silent if LM Studio not running)
+try:
+    from .model_fetcher import start_model_discovery
+    start_model_discovery()
 except Exception:
     pass  # Don't fail startup if model fetching fails
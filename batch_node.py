@@ -0,0 +1,323 @@
+"""
+Z-Forge Batch Prompt Builder Node
+Builds many prompts in one execution for dataset generation.
+
+Variable sets are either randomized (count) or supplied as YAML documents
+separated by '---'. Internal mode fans the LLM calls out over a bounded
+worker pool so throughput scales with the server's parallel slots.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Optional
+
+from .expansion_cache import get_expansion_cache
+from .host_balancer import get_host_balancer
+from .llm_backends import (
+    GenerationInterrupted,
+    comfy_supports_async_nodes,
+    get_backend,
+    raise_interrupt,
+)
+from .llm_config import LLMConfig, parse_llm_config
+from .offline_expander import expand_offline
+from .presets import ASPECTS, GENRES
+from .randomizer import (
+    RandomSource,
+    derive_rng,
+    make_rng,
+    randomize_scene,
+    randomize_subject,
+    seed_input,
+)
+from .yaml_builder import build_yaml_from_widgets
+from .z_image_prompt import (
+    LLM_MODES,
+    PERSON_COUNTS,
+    ZForgePromptBuilder,
+    resolve_system_prompt,
+)
+
+logger = logging.getLogger("ZForge")
+
+# Upper bound for concurrent LLM requests from one batch
+MAX_WORKERS = 32
+
+
+def split_variable_sets(text: str) -> list[str]:
+    """
+    Split multi-document YAML text into individual variable sets.
+
+    Args:
+        text: YAML documents separated by lines containing only '---'
+
+    Returns:
+        List of non-empty YAML strings
+    """
+    sets = []
+    current: list[str] = []
+    for line in text.splitlines():
+        if line.strip() == "---":
+            sets.append("\n".join(current).strip())
+            current = []
+        else:
+            current.append(line)
+    sets.append("\n".join(current).strip())
+    return [s for s in sets if s]
+
+
+def _subject_kwargs(prefix: str, data: dict[str, Any]) -> dict[str, Any]:
+    """Map randomized subject data onto build_yaml_from_widgets arguments."""
+    return {f"{prefix}{field}": value for field, value in data.items()}
+
+
+def build_random_variables(
+    genre: str, num_people: int, aspect: str, rng: RandomSource = None
+) -> str:
+    """
+    Build one fully randomized variable set.
+
+    Args:
+        genre: "realistic" or "fantasy"
+        num_people: Number of subjects (1-3)
+        aspect: Aspect ratio hint
+        rng: Random source for this set (random.Random, seed, or None)
+
+    Returns:
+        YAML variables string
+    """
+    rng = make_rng(rng)
+    kwargs: dict[str, Any] = {"subjects": num_people, "aspect": aspect}
+    for index in range(1, num_people + 1):
+        kwargs.update(_subject_kwargs(f"s{index}_", randomize_subject(genre=genre, rng=rng)))
+    kwargs.update(randomize_scene(genre=genre, rng=rng))
+    return build_yaml_from_widgets(**kwargs)
+
+
+class ZForgeBatchPromptBuilder(ZForgePromptBuilder):
+    """
+    Batch variant of the Prompt Builder.
+
+    Emits lists of variables and image prompts (one entry per variable set),
+    expanding them concurrently in Internal mode.
+    """
+
+    CATEGORY = "Z-Forge"
+    RETURN_TYPES = ("STRING", "STRING", "STRING")
+    RETURN_NAMES = ("variables", "image_prompt", "status")
+    OUTPUT_IS_LIST = (True, True, False)
+    OUTPUT_NODE = False
+    FUNCTION = "build_batch_async" if comfy_supports_async_nodes() else "build_batch"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "llm_mode": (
+                    LLM_MODES,
+                    {
+                        "default": "Internal (LM Studio)",
+                        "tooltip": (
+                            "External: output variables only. "
+                            "Internal: expand every set with LM Studio. "
+                            "Offline: rule-based expansion (no LLM)."
+                        ),
+                    },
+                ),
+                "genre": (
+                    GENRES,
+                    {"default": "realistic", "tooltip": "Genre for randomized sets"},
+                ),
+                "people": (
+                    PERSON_COUNTS,
+                    {"default": "1", "tooltip": "Number of people in randomized sets"},
+                ),
+                "aspect": (
+                    ASPECTS,
+                    {"default": "portrait", "tooltip": "Aspect ratio hint for randomized sets"},
+                ),
+                "count": (
+                    "INT",
+                    {
+                        "default": 8,
+                        "min": 1,
+                        "max": 1000,
+                        "tooltip": "Number of randomized variable sets (ignored if variable_sets is filled)",
+                    },
+                ),
+                "max_workers": (
+                    "INT",
+                    {
+                        "default": 4,
+                        "min": 1,
+                        "max": MAX_WORKERS,
+                        "tooltip": "Concurrent LLM requests. Match LM Studio's parallel slots.",
+                    },
+                ),
+            },
+            "optional": {
+                "llm_config": (
+                    "ZFORGE_LLM_CONFIG",
+                    {"tooltip": "Connect a Z-Forge LLM Config node for LM Studio settings"},
+                ),
+                "variable_sets": (
+                    "STRING",
+                    {
+                        "default": "",
+                        "multiline": True,
+                        "tooltip": "YAML variable sets separated by '---' lines. Overrides count.",
+                    },
+                ),
+                "system_prompt_override": (
+                    "STRING",
+                    {
+                        "default": "",
+                        "multiline": True,
+                        "tooltip": "Replace default prompt expansion instructions",
+                    },
+                ),
+                "seed": seed_input(
+                    "Seed for randomized variable sets - the same seed gives the same batch"
+                ),
+            },
+        }
+
+    @classmethod
+    def IS_CHANGED(cls, variable_sets="", seed=None, **kwargs):
+        """Re-execute when variable sets are randomized with a different seed."""
+        if variable_sets.strip():
+            return ""
+        if seed is None:
+            return str(time.time())
+        return f"seed:{seed}"
+
+    def build_batch(
+        self,
+        llm_mode: str,
+        genre: str,
+        people: str,
+        aspect: str,
+        count: int,
+        max_workers: int,
+        llm_config: Optional[LLMConfig] = None,
+        variable_sets: str = "",
+        system_prompt_override: str = "",
+        seed: Optional[int] = None,
+    ) -> tuple[list[str], list[str], str]:
+        """
+        Build and optionally expand a batch of prompts.
+
+        Returns:
+            Tuple of (variables list, image_prompt list, status)
+        """
+        status_lines = []
+        config = parse_llm_config(llm_config)
+        system_prompt, prompt_info = resolve_system_prompt(system_prompt_override, config)
+        status_lines.append(prompt_info)
+
+        # Collect variable sets
+        if variable_sets.strip():
+            variables = split_variable_sets(variable_sets)
+            status_lines.append(f"[Batch] {len(variables)} variable set(s) from input")
+        else:
+            num_people = int(people)
+            # One generator per item, so items don't depend on each other or on thread timing
+            variables = [
+                build_random_variables(genre, num_people, aspect, derive_rng(seed, f"item_{index}"))
+                for index in range(count)
+            ]
+            status_lines.append(f"[Batch] {len(variables)} randomized variable set(s) ({genre})")
+
+        if llm_mode == "Offline (rule-based)":
+            started = time.perf_counter()
+            prompts = [expand_offline(system_prompt, yaml, genre)[0] for yaml in variables]
+            elapsed = time.perf_counter() - started
+            status_lines.append(
+                f"[Offline] Expanded {len(prompts)} rule-based prompt(s) in {elapsed * 1000:.1f}ms"
+            )
+            return (variables, prompts, "\n".join(status_lines))
+
+        if llm_mode != "Internal (LM Studio)":
+            status_lines.append("[MODE] External mode - image_prompt entries are empty")
+            return (variables, [""] * len(variables), "\n".join(status_lines))
+
+        workers = max(1, min(max_workers, MAX_WORKERS, len(variables)))
+
+        def expand(yaml_input: str) -> tuple[str, str]:
+            prompt, info = self._call_lm_studio(system_prompt, yaml_input, config)
+            if not prompt and config.offline_fallback:
+                fallback, _ = expand_offline(system_prompt, yaml_input, genre)
+                return fallback, info + "\n[Offline] Used rule-based fallback"
+            return prompt, info
+
+        # Hold a reference on every reachable host for the whole batch so the
+        # model is not unloaded between items; the idle policy applies once
+        # the batch is done
+        backend = get_backend(config.backend)
+        balancer = get_host_balancer()
+        held = []
+        for address in balancer.available(config.host_list):
+            host_config = config.for_host(address)
+            try:
+                _, load_info = backend.acquire(host_config)
+            except Exception as e:
+                # Items report their own connection errors below
+                status_lines.append(
+                    f"[WARNING] Could not preload model on {address}: {type(e).__name__}: {e}"
+                )
+                continue
+            if load_info:
+                status_lines.append(load_info)
+            held.append(host_config)
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="zforge-batch"
+            ) as executor:
+                results = list(executor.map(expand, variables))
+        except GenerationInterrupted:
+            # Queued items see the interrupt before starting and stop too
+            raise_interrupt()
+        finally:
+            release_info = [backend.release(host_config) for host_config in held]
+        elapsed = time.perf_counter() - started
+
+        prompts = [prompt for prompt, _ in results]
+        failures = [info for prompt, info in results if not prompt]
+
+        rate = len(variables) / elapsed if elapsed > 0 else 0.0
+        status_lines.append(
+            f"[Batch] Expanded {len(variables) - len(failures)}/{len(variables)} "
+            f"with {workers} worker(s) in {elapsed:.2f}s ({rate:.2f} prompts/s)"
+        )
+        if failures:
+            status_lines.append(f"[Batch] {len(failures)} failed; first failure:")
+            status_lines.append(failures[0])
+        fallbacks = [info for _, info in results if info.endswith("[Offline] Used rule-based fallback")]
+        if fallbacks:
+            status_lines.append(f"[Offline] {len(fallbacks)} item(s) used the rule-based fallback; first:")
+            status_lines.append(fallbacks[0])
+        status_lines.extend(info for info in release_info if info)
+        backend_stats = backend.format_stats()
+        if backend_stats:
+            status_lines.append(backend_stats)
+        if len(config.host_list) > 1:
+            status_lines.append(balancer.format_stats(config.host_list))
+        if config.cache_mode != "Off":
+            status_lines.append(get_expansion_cache().format_stats())
+
+        return (variables, prompts, "\n".join(status_lines))
+
+    async def build_batch_async(self, **kwargs: Any) -> tuple[list[str], list[str], str]:
+        """Coroutine version of build_batch(); Internal mode runs in a worker thread."""
+        if kwargs.get("llm_mode") != "Internal (LM Studio)":
+            return self.build_batch(**kwargs)
+        return await asyncio.to_thread(self.build_batch, **kwargs)
+
+
+# Node registration
+NODE_CLASS_MAPPINGS = {"ZForgeBatchPromptBuilder": ZForgeBatchPromptBuilder}
+
+NODE_DISPLAY_NAME_MAPPINGS = {"ZForgeBatchPromptBuilder": "Z-Forge Batch Prompt Builder"}
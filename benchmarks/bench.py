@@ -0,0 +1,398 @@
+"""
+Z-Forge Benchmarks
+Timing suite for the prompt pipeline hot paths, with JSON baselines.
+
+Features:
+- YAML build, subject/scene randomisation and end-to-end build_prompt
+  (External and Internal mode, Internal against the fake LM Studio server)
+- Per-benchmark min/median/mean/p95 from repeated timed rounds
+- Results saved as JSON baselines; `compare` flags median slowdowns beyond a threshold
+
+Usage:
+    python benchmarks/bench.py run --save benchmarks/baselines/main.json
+    python benchmarks/bench.py run --compare benchmarks/baselines/main.json
+    python benchmarks/bench.py compare OLD.json NEW.json --threshold 10
+"""
+import argparse
+import gc
+import importlib
+import importlib.util
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "z_forge"
+
+# A timed round runs the benchmark enough times to take at least this long
+MIN_ROUND_SECONDS = 0.01
+DEFAULT_ROUNDS = 20
+DEFAULT_THRESHOLD = 10.0  # Percent slowdown of the median that counts as a regression
+
+
+def load_package() -> None:
+    """
+    Register the repository as the `z_forge` package without running __init__.
+
+    Skipping __init__ avoids ComfyUI route registration and the background
+    model discovery, which would add noise to the timings.
+    """
+    if PACKAGE in sys.modules:
+        return
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE, ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+    )
+    sys.modules[PACKAGE] = importlib.util.module_from_spec(spec)
+
+
+def module(name: str) -> Any:
+    return importlib.import_module(f"{PACKAGE}.{name}")
+
+
+@dataclass
+class Benchmark:
+    name: str
+    description: str
+    setup: Callable[["BenchContext"], Callable[[], Any]]
+
+
+BENCHMARKS: list[Benchmark] = []
+
+
+def benchmark(name: str, description: str) -> Callable:
+    """Register a setup function that returns the callable to time."""
+
+    def register(setup: Callable[["BenchContext"], Callable[[], Any]]) -> Callable:
+        BENCHMARKS.append(Benchmark(name, description, setup))
+        return setup
+
+    return register
+
+
+class BenchContext:
+    """Shared fixtures, created on first use and torn down after the run."""
+
+    def __init__(self):
+        self._server: Any = None
+
+    def fake_server(self) -> Any:
+        """Fake LM Studio server with no artificial latency (measures our overhead only)."""
+        if self._server is None:
+            fake = module("fake_lm_server")
+            self._server = fake.FakeLMServer(
+                latency=0.0, tokens_per_second=0.0, load_delay=0.0, unload_delay=0.0
+            ).start()
+            fake.install_fake_lmstudio()
+        return self._server
+
+    def builder_kwargs(self, **changes: Any) -> dict[str, Any]:
+        """build_prompt arguments from the node's INPUT_TYPES defaults."""
+        builder = module("z_image_prompt").ZForgePromptBuilder
+        kwargs = {}
+        for name, (kind, options) in builder.INPUT_TYPES()["required"].items():
+            if "default" in options:
+                kwargs[name] = options["default"]
+            else:
+                kwargs[name] = kind[0] if isinstance(kind, list) else None
+        kwargs.update(changes)
+        return kwargs
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+
+def _subject_widgets(index: int, data: dict[str, Any]) -> dict[str, Any]:
+    return {f"s{index}_{key}": value for key, value in data.items()}
+
+
+@benchmark("yaml_build_1p", "build_yaml_from_widgets, one subject")
+def bench_yaml_build_1p(ctx: BenchContext) -> Callable[[], Any]:
+    randomizer = module("randomizer")
+    build = module("yaml_builder").build_yaml_from_widgets
+    random.seed(1)
+    widgets = {
+        **_subject_widgets(1, randomizer.randomize_subject()),
+        **randomizer.randomize_scene(),
+    }
+    return lambda: build(subjects=1, aspect="portrait", **widgets)
+
+
+@benchmark("yaml_build_3p", "build_yaml_from_widgets, three subjects")
+def bench_yaml_build_3p(ctx: BenchContext) -> Callable[[], Any]:
+    randomizer = module("randomizer")
+    build = module("yaml_builder").build_yaml_from_widgets
+    random.seed(3)
+    widgets = {
+        **_subject_widgets(1, randomizer.randomize_subject()),
+        **_subject_widgets(2, randomizer.randomize_subject()),
+        **_subject_widgets(3, randomizer.randomize_subject()),
+        **randomizer.randomize_scene(),
+    }
+    return lambda: build(subjects=3, aspect="landscape", interaction="talking", **widgets)
+
+
+@benchmark("randomize_subject", "randomize_subject, realistic genre")
+def bench_randomize_subject(ctx: BenchContext) -> Callable[[], Any]:
+    randomize = module("randomizer").randomize_subject
+    return lambda: randomize(genre="realistic")
+
+
+@benchmark("randomize_subject_fantasy", "randomize_subject, fantasy genre")
+def bench_randomize_subject_fantasy(ctx: BenchContext) -> Callable[[], Any]:
+    randomize = module("randomizer").randomize_subject
+    return lambda: randomize(genre="fantasy")
+
+
+@benchmark("randomize_scene", "randomize_scene, realistic genre")
+def bench_randomize_scene(ctx: BenchContext) -> Callable[[], Any]:
+    randomize = module("randomizer").randomize_scene
+    return lambda: randomize(genre="realistic")
+
+
+@benchmark("build_prompt_external", "build_prompt, External mode, widget defaults")
+def bench_build_prompt_external(ctx: BenchContext) -> Callable[[], Any]:
+    builder = module("z_image_prompt").ZForgePromptBuilder()
+    kwargs = ctx.builder_kwargs(llm_mode="External (Output Only)")
+    return lambda: builder.build_prompt(**kwargs)
+
+
+@benchmark("build_prompt_external_random", "build_prompt, External mode, randomize all")
+def bench_build_prompt_external_random(ctx: BenchContext) -> Callable[[], Any]:
+    builder = module("z_image_prompt").ZForgePromptBuilder()
+    kwargs = ctx.builder_kwargs(
+        llm_mode="External (Output Only)", people="3", randomize_all_people=True, randomize_scene=True
+    )
+    return lambda: builder.build_prompt(**kwargs)
+
+
+def _internal_config(ctx: BenchContext, **changes: Any) -> Any:
+    server = ctx.fake_server()
+    LLMConfig = module("llm_config").LLMConfig
+    return LLMConfig(port=server.port, unload=False, cache_mode="Off", **changes)
+
+
+@benchmark("build_prompt_internal", "build_prompt, Internal mode against the fake server")
+def bench_build_prompt_internal(ctx: BenchContext) -> Callable[[], Any]:
+    builder = module("z_image_prompt").ZForgePromptBuilder()
+    kwargs = ctx.builder_kwargs(llm_mode="Internal (LM Studio)", llm_config=_internal_config(ctx))
+    return lambda: builder.build_prompt(**kwargs)
+
+
+@benchmark("build_prompt_internal_compact", "build_prompt, Internal mode, compact wire + pruned prompt")
+def bench_build_prompt_internal_compact(ctx: BenchContext) -> Callable[[], Any]:
+    builder = module("z_image_prompt").ZForgePromptBuilder()
+    config = _internal_config(
+        ctx, wire_format="Compact", prune_system_prompt=True, preexpand_keywords=True
+    )
+    kwargs = ctx.builder_kwargs(llm_mode="Internal (LM Studio)", llm_config=config)
+    return lambda: builder.build_prompt(**kwargs)
+
+
+@benchmark("build_prompt_internal_cached", "build_prompt, Internal mode, expansion cache hit")
+def bench_build_prompt_internal_cached(ctx: BenchContext) -> Callable[[], Any]:
+    builder = module("z_image_prompt").ZForgePromptBuilder()
+    config = _internal_config(ctx, seed=42).with_changes(cache_mode="Memory")
+    kwargs = ctx.builder_kwargs(llm_mode="Internal (LM Studio)", llm_config=config)
+    builder.build_prompt(**kwargs)  # Fill the cache
+    return lambda: builder.build_prompt(**kwargs)
+
+
+def _calibrate(func: Callable[[], Any]) -> int:
+    """Number of calls per round so a round takes at least MIN_ROUND_SECONDS."""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - started >= MIN_ROUND_SECONDS:
+            return loops
+        loops *= 2
+
+
+def time_benchmark(func: Callable[[], Any], rounds: int) -> dict[str, Any]:
+    """
+    Time a callable.
+
+    Args:
+        func: Callable to time
+        rounds: Number of timed rounds
+
+    Returns:
+        Dict of per-call statistics in seconds
+    """
+    random.seed(0)
+    func()  # Warm-up (imports, caches, connections)
+    loops = _calibrate(func)
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(loops):
+                func()
+            samples.append((time.perf_counter() - started) / loops)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    samples.sort()
+    median = statistics.median(samples)
+    return {
+        "median": median,
+        "min": samples[0],
+        "mean": statistics.fmean(samples),
+        "p95": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+        "loops": loops,
+        "ops_per_sec": 1 / median if median else None,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _format_time(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "-"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def run(selected: list[Benchmark], rounds: int) -> dict[str, Any]:
+    """Run benchmarks and return the results document."""
+    load_package()
+    ctx = BenchContext()
+    results = {}
+    try:
+        for bench in selected:
+            func = bench.setup(ctx)
+            stats = time_benchmark(func, rounds)
+            results[bench.name] = stats
+            print(
+                f"{bench.name:<32} median {_format_time(stats['median']):>10}  "
+                f"min {_format_time(stats['min']):>10}  p95 {_format_time(stats['p95']):>10}  "
+                f"({stats['loops']} x {rounds})"
+            )
+    finally:
+        ctx.close()
+    return {
+        "version": 1,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": results,
+    }
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float) -> list[str]:
+    """
+    Compare two results documents by median time.
+
+    Args:
+        baseline: Earlier results
+        current: New results
+        threshold: Percent slowdown that counts as a regression
+
+    Returns:
+        Names of regressed benchmarks
+    """
+    regressions = []
+    old_results = baseline.get("benchmarks", {})
+    print(f"{'benchmark':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, stats in current.get("benchmarks", {}).items():
+        old = old_results.get(name)
+        if old is None:
+            print(f"{name:<32} {'-':>10} {_format_time(stats['median']):>10}      new")
+            continue
+        change = 100 * (stats["median"] - old["median"]) / old["median"]
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print(
+            f"{name:<32} {_format_time(old['median']):>10} "
+            f"{_format_time(stats['median']):>10} {change:>+7.1f}%{flag}"
+        )
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {threshold:g}%: {', '.join(regressions)}")
+    else:
+        print(f"\nNo regressions beyond {threshold:g}%")
+    return regressions
+
+
+def _load(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Z-Forge prompt pipeline benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run benchmarks")
+    run_parser.add_argument("-k", "--filter", default="", help="Only run benchmarks whose name contains this")
+    run_parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    run_parser.add_argument("--save", help="Write results to this JSON file")
+    run_parser.add_argument("--compare", help="Compare against this baseline JSON file")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    compare_parser = commands.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    commands.add_parser("list", help="List benchmarks")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for bench in BENCHMARKS:
+            print(f"{bench.name:<32} {bench.description}")
+        return 0
+
+    if args.command == "compare":
+        return 1 if compare(_load(args.baseline), _load(args.current), args.threshold) else 0
+
+    selected = [b for b in BENCHMARKS if args.filter in b.name]
+    if not selected:
+        print(f"No benchmarks match '{args.filter}'")
+        return 2
+    results = run(selected, args.rounds)
+    if args.save:
+        path = Path(args.save)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+        print(f"\nSaved {path}")
+    if args.compare:
+        print()
+        return 1 if compare(_load(args.compare), results, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
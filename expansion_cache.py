@@ -0,0 +1,257 @@
+"""
+Z-Forge Expansion Cache
+Content-addressed cache for LLM prompt expansions.
+
+Features:
+- Canonical hash of system prompt, variables, backend, model and sampling parameters
+- In-memory LRU tier with TTL and max-entry eviction
+- Optional size-bounded on-disk tier that survives restarts
+- Bypassed automatically when the seed is random (-1)
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger("ZForge")
+
+# Cache modes (shown in the LLM Config node)
+CACHE_MODES = ["Memory", "Memory + Disk", "Off"]
+
+# On-disk tier location and size bound
+_CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache", "expansions")
+DISK_MAX_BYTES = 64 * 1024 * 1024
+
+# Config fields that change the generated text
+_KEY_FIELDS = ("backend", "model", "temperature", "max_tokens", "top_p", "top_k", "repeat_penalty", "seed")
+
+
+def request_key(system_prompt: str, variables: str, config: Any) -> str:
+    """
+    Hash everything that determines an expansion request, including a random seed.
+
+    Args:
+        system_prompt: System prompt sent to the LLM
+        variables: Variables (user message) sent to the LLM
+        config: LLMConfig for the request
+
+    Returns:
+        Hex digest
+    """
+    payload = {
+        "system_prompt": system_prompt,
+        "variables": variables,
+        **{field: getattr(config, field) for field in _KEY_FIELDS},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(system_prompt: str, variables: str, config: Any) -> Optional[str]:
+    """
+    Build a canonical cache key for an expansion request.
+
+    Args:
+        system_prompt: System prompt sent to the LLM
+        variables: Variables (user message) sent to the LLM
+        config: LLMConfig for the request
+
+    Returns:
+        Hex digest, or None if the request is not cacheable (random seed)
+    """
+    if config.seed < 0:
+        return None
+    return request_key(system_prompt, variables, config)
+
+
+class _Entry:
+    """A cached expansion and what it cost to produce."""
+
+    __slots__ = ("prompt", "seconds", "created")
+
+    def __init__(self, prompt: str, seconds: float, created: float):
+        self.prompt = prompt
+        self.seconds = seconds
+        self.created = created
+
+
+class ExpansionCache:
+    """
+    Two-tier expansion cache.
+
+    The memory tier is an LRU bounded by entry count. The disk tier stores one
+    JSON file per key and evicts the oldest files once the directory exceeds
+    its byte budget. Both tiers honour the same TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        disk_dir: str = _CACHE_DIR,
+        disk_max_bytes: int = DISK_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_enabled = False
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict[str, _Entry] = OrderedDict()
+        self._disk_bytes: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+
+    def configure(self, max_entries: int, ttl: float, disk_enabled: bool) -> None:
+        """Apply settings from the LLM config node."""
+        with self._lock:
+            self.max_entries = max(1, max_entries)
+            self.ttl = ttl
+            self.disk_enabled = disk_enabled
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[str]:
+        """
+        Look up a cached expansion.
+
+        Args:
+            key: Cache key from make_cache_key()
+            count_miss: Count a miss (off when re-checking a key that already missed)
+
+        Returns:
+            Cached prompt text, or None on a miss
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and self._expired(entry.created):
+                del self._memory[key]
+                entry = None
+            if entry is None and self.disk_enabled:
+                entry = self._disk_get(key)
+                if entry is not None:
+                    self._memory_put(key, entry)
+            if entry is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            self.seconds_saved += entry.seconds
+            return entry.prompt
+
+    def put(self, key: str, prompt: str, seconds: float) -> None:
+        """
+        Store an expansion.
+
+        Args:
+            key: Cache key from make_cache_key()
+            prompt: Generated prompt text
+            seconds: Time the generation took (reported as time saved on hits)
+        """
+        entry = _Entry(prompt, seconds, time.time())
+        with self._lock:
+            self._memory_put(key, entry)
+            if self.disk_enabled:
+                self._disk_put(key, entry)
+
+    def _memory_put(self, key: str, entry: _Entry) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[_Entry]:
+        path = self._disk_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            entry = _Entry(data["prompt"], float(data["seconds"]), float(data["created"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if self._expired(entry.created):
+            self._disk_remove(path)
+            return None
+        return entry
+
+    def _disk_put(self, key: str, entry: _Entry) -> None:
+        path = self._disk_path(key)
+        data = json.dumps(
+            {"prompt": entry.prompt, "seconds": entry.seconds, "created": entry.created},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_usage()
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(path, "wb") as f:
+                f.write(data)
+            self._disk_bytes += len(data) - previous
+        except OSError as e:
+            logger.warning(f"Z-Forge: failed to write expansion cache entry: {e}")
+            return
+        if self._disk_bytes > self.disk_max_bytes:
+            self._disk_evict()
+
+    def _disk_files(self) -> list[os.DirEntry]:
+        try:
+            return [e for e in os.scandir(self.disk_dir) if e.name.endswith(".json")]
+        except OSError:
+            return []
+
+    def _disk_usage(self) -> int:
+        return sum(e.stat().st_size for e in self._disk_files())
+
+    def _disk_remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+        except OSError:
+            pass
+
+    def _disk_evict(self) -> None:
+        """Remove expired files, then the oldest ones, until under the byte budget."""
+        files = sorted(self._disk_files(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in files)
+        now = time.time()
+        for e in files:
+            expired = self.ttl > 0 and now - e.stat().st_mtime > self.ttl
+            if not expired and total <= self.disk_max_bytes:
+                continue
+            size = e.stat().st_size
+            try:
+                os.remove(e.path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def format_stats(self) -> str:
+        """One-line summary of cache usage for status output."""
+        return (
+            f"[Cache] {self.hits} hit / {self.misses} miss, "
+            f"{self.seconds_saved:.2f}s saved"
+        )
+
+
+# Process-wide cache instance
+_cache = ExpansionCache()
+
+
+def get_expansion_cache() -> ExpansionCache:
+    """Get the process-wide expansion cache."""
+    return _cache
@@ -0,0 +1,829 @@
+"""
+Z-Forge Fake LM Studio Server
+Stand-in for LM Studio for tests, benchmarks and load testing on CPU-only machines.
+
+Features:
+- OpenAI-compatible /v1/models and /v1/chat/completions (JSON or SSE streaming)
+- LM Studio style /api/v0/models with loaded/not-loaded state
+- Configurable latency, tokens/sec, parallel slots, failure injection and
+  model load/unload delays (also changeable at runtime via /_fake/config)
+- Fake lmstudio SDK (Client, Chat, LLM handles, prediction streams) backed by
+  the fake server; install_fake_lmstudio() makes `import lmstudio` use it
+- Standard library only; run standalone with `python fake_lm_server.py --port 1234`
+"""
+import argparse
+import contextlib
+import hashlib
+import http.client
+import json
+import logging
+import random
+import socket
+import sys
+import threading
+import time
+import types
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass, fields, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Iterator, Optional
+
+logger = logging.getLogger("ZForge")
+
+FAILURE_MODES = ["error", "disconnect"]
+
+# Words the fake completions are assembled from
+_VOCABULARY = (
+    "soft", "golden", "light", "falls", "across", "her", "his", "their", "face", "while",
+    "the", "camera", "frames", "a", "quiet", "street", "at", "dusk", "with", "warm",
+    "neon", "reflections", "on", "wet", "pavement", "and", "gentle", "rain", "drifting",
+    "through", "shallow", "depth", "of", "field", "cinematic", "detailed", "skin",
+    "texture", "natural", "pose", "relaxed", "shoulders", "linen", "jacket", "in",
+    "muted", "tones", "background", "blurred", "city", "lights", "expression", "calm",
+)
+
+
+@dataclass(frozen=True)
+class FakeServerConfig:
+    """Behaviour of the fake server."""
+
+    models: tuple[str, ...] = ("fake-model-7b", "fake-model-1b")
+    latency: float = 0.05  # Seconds before the first token (prefill)
+    tokens_per_second: float = 200.0  # 0 = emit all tokens at once
+    completion_tokens: int = 120  # Length of each completion (capped by max_tokens)
+    parallel: int = 1  # Concurrent generations; others queue (0 = unlimited)
+    failure_rate: float = 0.0  # Probability that a completion request fails
+    failure_mode: str = "error"  # "error" = HTTP 500, "disconnect" = drop mid-response
+    load_delay: float = 0.5  # Seconds to load a model (JIT or explicit)
+    unload_delay: float = 0.1
+    seed: Optional[int] = None  # Seed for failure injection (None = random)
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _completion_tokens(messages: list[dict[str, Any]], count: int, seed: Optional[int]) -> list[str]:
+    """
+    Build a completion as a list of token strings.
+
+    Requests with a seed get the same text for the same messages.
+    """
+    if seed is not None and seed >= 0:
+        digest = hashlib.sha256(json.dumps([messages, seed], sort_keys=True).encode()).digest()
+        rng = random.Random(digest)
+    else:
+        rng = random.Random()
+
+    tokens = []
+    sentence_start = True
+    for index in range(count):
+        word = rng.choice(_VOCABULARY)
+        if sentence_start:
+            word = word.capitalize()
+        sentence_start = index % 12 == 11 or index == count - 1
+        tokens.append(("" if index == 0 else " ") + word + ("." if sentence_start else ""))
+    return tokens
+
+
+class FakeLMServer:
+    """
+    Threaded fake LM Studio server.
+
+    Example:
+        with FakeLMServer(tokens_per_second=50, failure_rate=0.1) as server:
+            install_fake_lmstudio()
+            ...  # point the LLM Config node at server.host / server.port
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        config: Optional[FakeServerConfig] = None,
+        **overrides: Any,
+    ):
+        """
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 = pick a free port)
+            config: Base configuration
+            **overrides: FakeServerConfig fields to change
+        """
+        self.host = host
+        self.port = port
+        self.config = replace(config or FakeServerConfig(), **overrides)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._slots = self._make_slots(self.config.parallel)
+        self._rng = random.Random(self.config.seed)
+        self._fail_next = 0
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+        # The first model starts loaded, like LM Studio with a model selected
+        self.loaded: list[str] = list(self.config.models[:1])
+        self.requests = 0
+        self.completions = 0
+        self.failures = 0
+        self.loads = 0
+        self.unloads = 0
+        self.tokens_out = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @staticmethod
+    def _make_slots(parallel: int) -> Optional[threading.BoundedSemaphore]:
+        return threading.BoundedSemaphore(parallel) if parallel > 0 else None
+
+    @property
+    def address(self) -> str:
+        """ "host:port" as used by the lmstudio SDK."""
+        return f"{self.host}:{self.port}"
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.address}"
+
+    def start(self) -> "FakeLMServer":
+        """Start serving on a background thread."""
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _FakeHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="ZForge-FakeLMServer", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"Z-Forge: fake LM Studio server listening on {self.url}")
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "FakeLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def configure(self, **changes: Any) -> FakeServerConfig:
+        """
+        Change behaviour while running.
+
+        Args:
+            **changes: FakeServerConfig fields to change
+
+        Returns:
+            The new configuration
+        """
+        with self._lock:
+            if "models" in changes:
+                changes["models"] = tuple(changes["models"])
+            self.config = replace(self.config, **changes)
+            if "parallel" in changes:
+                self._slots = self._make_slots(self.config.parallel)
+            if "seed" in changes:
+                self._rng = random.Random(self.config.seed)
+            return self.config
+
+    def fail_next(self, count: int = 1) -> None:
+        """Make the next `count` completion requests fail regardless of failure_rate."""
+        with self._lock:
+            self._fail_next += count
+
+    def stats(self) -> dict[str, Any]:
+        """Request, failure, load and token counters."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "completions": self.completions,
+                "failures": self.failures,
+                "loads": self.loads,
+                "unloads": self.unloads,
+                "tokens_out": self.tokens_out,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "loaded": list(self.loaded),
+            }
+
+    # Behaviour used by the request handler
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            if self._fail_next > 0:
+                self._fail_next -= 1
+                fail = True
+            else:
+                fail = self._rng.random() < self.config.failure_rate
+            if fail:
+                self.failures += 1
+            return fail
+
+    def load(self, model: str) -> bool:
+        """Load a model (sleeping load_delay). Returns False for unknown models."""
+        if model not in self.config.models:
+            return False
+        with self._load_lock:
+            if model in self.loaded:
+                return True
+            time.sleep(self.config.load_delay)
+            with self._lock:
+                self.loaded.append(model)
+                self.loads += 1
+        return True
+
+    def unload(self, model: str) -> bool:
+        """Unload a model (sleeping unload_delay). Returns False if it was not loaded."""
+        with self._load_lock:
+            if model not in self.loaded:
+                return False
+            time.sleep(self.config.unload_delay)
+            with self._lock:
+                self.loaded.remove(model)
+                self.unloads += 1
+        return True
+
+    def _begin(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _end(self, tokens: int) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.tokens_out += tokens
+            if tokens:
+                self.completions += 1
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ZForgeFakeLMStudio/1.0"
+
+    @property
+    def fake(self) -> FakeLMServer:
+        return self.server.fake
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("Z-Forge fake server: " + format % args)
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send_json(status, {"error": {"message": message, "type": "server_error"}})
+
+    def _read_json(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def do_GET(self) -> None:
+        fake = self.fake
+        path = self.path.split("?")[0]
+        if path == "/v1/models":
+            data = [{"id": m, "object": "model", "owned_by": "organization_owner"} for m in fake.config.models]
+            self._send_json(200, {"object": "list", "data": data})
+        elif path == "/api/v0/models":
+            loaded = set(fake.loaded)
+            data = [
+                {
+                    "id": m,
+                    "object": "model",
+                    "type": "llm",
+                    "state": "loaded" if m in loaded else "not-loaded",
+                }
+                for m in fake.config.models
+            ]
+            self._send_json(200, {"object": "list", "data": data})
+        elif path == "/_fake/stats":
+            self._send_json(200, fake.stats())
+        else:
+            self._send_error(404, f"Unknown route {path}")
+
+    def do_POST(self) -> None:
+        fake = self.fake
+        path = self.path.split("?")[0]
+        try:
+            body = self._read_json()
+        except (ValueError, UnicodeDecodeError):
+            self._send_error(400, "Invalid JSON body")
+            return
+
+        if path == "/v1/chat/completions":
+            self._chat_completion(body)
+        elif path in ("/_fake/load", "/_fake/unload"):
+            model = body.get("model") or ""
+            ok = fake.load(model) if path.endswith("/load") else fake.unload(model)
+            if ok:
+                self._send_json(200, {"model": model, "loaded": model in fake.loaded})
+            else:
+                self._send_error(404, f"Model not found: {model}")
+        elif path == "/_fake/config":
+            known = {f.name for f in fields(FakeServerConfig)}
+            unknown = set(body) - known
+            if unknown:
+                self._send_error(400, f"Unknown setting(s): {', '.join(sorted(unknown))}")
+                return
+            self._send_json(200, asdict(fake.configure(**body)))
+        else:
+            self._send_error(404, f"Unknown route {path}")
+
+    def _chat_completion(self, body: dict[str, Any]) -> None:
+        fake = self.fake
+        config = fake.config
+        model = body.get("model") or (fake.loaded[0] if fake.loaded else "")
+        if model not in config.models:
+            self._send_error(404, f"Model not found: {model or '(none loaded)'}")
+            return
+
+        messages = body.get("messages") or []
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) for m in messages)
+        max_tokens = body.get("max_tokens") or config.completion_tokens
+        if max_tokens < 0:
+            max_tokens = config.completion_tokens
+        count = min(config.completion_tokens, max_tokens)
+        tokens = _completion_tokens(messages, count, body.get("seed"))
+        finish_reason = "length" if count < config.completion_tokens else "stop"
+
+        fake._begin()
+        sent = 0
+        try:
+            if fake._should_fail():
+                if config.failure_mode == "disconnect" and not body.get("stream"):
+                    self.close_connection = True
+                    return
+                if config.failure_mode != "disconnect":
+                    self._send_error(500, "Injected failure")
+                    return
+                # Streaming disconnects happen halfway through the response
+                tokens = tokens[: len(tokens) // 2]
+                finish_reason = None
+
+            fake.load(model)  # JIT load, like LM Studio
+            slots = fake._slots
+            if slots is not None:
+                slots.acquire()
+            try:
+                if body.get("stream"):
+                    sent = self._stream(model, tokens, prompt_tokens, finish_reason)
+                else:
+                    self._sleep_for(len(tokens))
+                    sent = len(tokens)
+                    self._send_json(
+                        200,
+                        {
+                            "id": f"chatcmpl-fake-{fake.requests}",
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {"role": "assistant", "content": "".join(tokens)},
+                                    "finish_reason": finish_reason,
+                                }
+                            ],
+                            "usage": {
+                                "prompt_tokens": prompt_tokens,
+                                "completion_tokens": len(tokens),
+                                "total_tokens": prompt_tokens + len(tokens),
+                            },
+                        },
+                    )
+            finally:
+                if slots is not None:
+                    slots.release()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # Client went away (e.g. cancelled stream)
+        finally:
+            fake._end(sent)
+
+    def _sleep_for(self, count: int) -> None:
+        """Sleep for prefill latency plus generation time of `count` tokens."""
+        config = self.fake.config
+        duration = config.latency
+        if config.tokens_per_second > 0:
+            duration += count / config.tokens_per_second
+        time.sleep(duration)
+
+    def _stream(
+        self, model: str, tokens: list[str], prompt_tokens: int, finish_reason: Optional[str]
+    ) -> int:
+        """Send tokens as server-sent events, paced at tokens_per_second."""
+        config = self.fake.config
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        created = int(time.time())
+
+        def event(delta: dict[str, Any], reason: Optional[str] = None, **extra: Any) -> None:
+            chunk = {
+                "id": f"chatcmpl-fake-{created}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": reason}],
+                **extra,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        time.sleep(config.latency)
+        started = time.perf_counter()
+        for index, token in enumerate(tokens):
+            if config.tokens_per_second > 0:
+                delay = started + index / config.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            event({"content": token})
+
+        if finish_reason is None:
+            return len(tokens)  # Injected disconnect: no final chunk
+
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        event({}, finish_reason, usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        return len(tokens)
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# FAKE LMSTUDIO SDK
+# ═══════════════════════════════════════════════════════════════════════════════
+# The subset of the lmstudio package Z-Forge uses, talking HTTP to a fake server.
+
+
+class LMStudioError(Exception):
+    """Base class of fake SDK errors."""
+
+
+class LMStudioServerError(LMStudioError):
+    """The server rejected a request."""
+
+
+class LMStudioModelNotFoundError(LMStudioServerError):
+    """The requested model does not exist (or none is loaded)."""
+
+
+class LMStudioWebsocketError(LMStudioError):
+    """The connection failed or dropped (the real SDK's websocket error)."""
+
+
+# Prediction config keys (lmstudio camelCase) and their OpenAI request names
+_CONFIG_KEYS = {
+    "temperature": "temperature",
+    "maxTokens": "max_tokens",
+    "topPSampling": "top_p",
+    "topKSampling": "top_k",
+    "repeatPenalty": "repeat_penalty",
+    "seed": "seed",
+}
+
+
+@dataclass
+class PredictionStats:
+    prompt_tokens_count: int = 0
+    predicted_tokens_count: int = 0
+    time_to_first_token_sec: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+    stop_reason: str = "eosFound"
+
+
+@dataclass
+class PredictionResult:
+    content: str
+    stats: PredictionStats
+    model_key: str = ""
+
+    def __str__(self) -> str:
+        return self.content
+
+
+@dataclass
+class LlmPredictionFragment:
+    content: str
+
+
+class Chat:
+    """Chat history (system prompt plus user/assistant turns)."""
+
+    def __init__(self, initial_prompt: Optional[str] = None):
+        self.messages: list[dict[str, str]] = []
+        if initial_prompt:
+            self.messages.append({"role": "system", "content": initial_prompt})
+
+    def add_user_message(self, content: str) -> None:
+        self.messages.append({"role": "user", "content": content})
+
+    def add_assistant_response(self, content: str) -> None:
+        self.messages.append({"role": "assistant", "content": content})
+
+
+def _request(
+    address: str, method: str, path: str, payload: Optional[dict[str, Any]] = None, timeout: float = 300.0
+) -> Any:
+    """Send a request to the fake server, mapping failures to SDK errors."""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(
+        f"http://{address}{path}",
+        data=data,
+        method=method,
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        return urllib.request.urlopen(request, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", {}).get("message", str(e))
+        except ValueError:
+            message = str(e)
+        if e.code == 404:
+            raise LMStudioModelNotFoundError(message) from None
+        raise LMStudioServerError(message) from None
+    except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+        raise LMStudioWebsocketError(f"Connection to {address} failed: {e}") from None
+
+
+def _request_json(address: str, method: str, path: str, payload: Optional[dict[str, Any]] = None) -> Any:
+    with _request(address, method, path, payload) as response:
+        try:
+            return json.loads(response.read())
+        except (http.client.HTTPException, OSError) as e:
+            raise LMStudioWebsocketError(f"Connection to {address} dropped: {e}") from None
+
+
+class PredictionStream:
+    """Iterable of prediction fragments; result() is available once exhausted."""
+
+    def __init__(self, response: Any, address: str, model_key: str, prompt_tokens: int):
+        self._response = response
+        self._address = address
+        self._model_key = model_key
+        self._started = time.perf_counter()
+        self._first_token_at: Optional[float] = None
+        self._fragments: list[str] = []
+        self._prompt_tokens = prompt_tokens
+        self._stop_reason = ""
+        self._cancelled = False
+        self._result: Optional[PredictionResult] = None
+
+    def __iter__(self) -> Iterator[LlmPredictionFragment]:
+        try:
+            for raw in self._response:
+                if self._cancelled:
+                    break
+                line = raw.decode().strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                usage = chunk.get("usage")
+                if usage:
+                    self._prompt_tokens = usage.get("prompt_tokens", self._prompt_tokens)
+                choice = chunk["choices"][0]
+                if choice.get("finish_reason"):
+                    self._stop_reason = (
+                        "maxPredictedTokensReached"
+                        if choice["finish_reason"] == "length"
+                        else "eosFound"
+                    )
+                content = choice.get("delta", {}).get("content")
+                if content:
+                    if self._first_token_at is None:
+                        self._first_token_at = time.perf_counter()
+                    self._fragments.append(content)
+                    yield LlmPredictionFragment(content)
+        except (http.client.HTTPException, OSError) as e:
+            if not self._cancelled:
+                raise LMStudioWebsocketError(f"Connection to {self._address} dropped: {e}") from None
+        except Exception:
+            if not self._cancelled:
+                raise  # cancel() closing the response can break a read in progress
+        finally:
+            self._response.close()
+
+        if self._cancelled:
+            self._stop_reason = "userStopped"
+        elif not self._stop_reason:
+            raise LMStudioWebsocketError(f"Connection to {self._address} dropped mid-prediction")
+        self._finish()
+
+    def _finish(self) -> None:
+        ended = time.perf_counter()
+        ttft = tps = None
+        if self._first_token_at is not None:
+            ttft = self._first_token_at - self._started
+            generating = ended - self._first_token_at
+            tps = len(self._fragments) / generating if generating > 0 else None
+        self._result = PredictionResult(
+            content="".join(self._fragments),
+            stats=PredictionStats(
+                prompt_tokens_count=self._prompt_tokens,
+                predicted_tokens_count=len(self._fragments),
+                time_to_first_token_sec=ttft,
+                tokens_per_second=tps,
+                stop_reason=self._stop_reason,
+            ),
+            model_key=self._model_key,
+        )
+
+    def cancel(self) -> None:
+        """Stop the prediction; iteration ends and result() holds the partial text."""
+        self._cancelled = True
+        # Wake a read still waiting for the first token (close() alone would not)
+        sock = getattr(getattr(getattr(self._response, "fp", None), "raw", None), "_sock", None)
+        if sock is not None:
+            with contextlib.suppress(OSError):
+                sock.shutdown(socket.SHUT_RDWR)
+        self._response.close()
+
+    def result(self) -> PredictionResult:
+        """The final result (consumes the rest of the stream if needed)."""
+        if self._result is None:
+            for _ in self:
+                pass
+        if self._result is None:
+            self._finish()
+        return self._result
+
+
+class LLM:
+    """Handle to a model on the fake server."""
+
+    def __init__(self, address: str, identifier: str):
+        self._address = address
+        self.identifier = identifier
+
+    def _payload(self, chat: Chat, config: Optional[dict[str, Any]], stream: bool) -> dict[str, Any]:
+        payload: dict[str, Any] = {"model": self.identifier, "messages": chat.messages, "stream": stream}
+        for key, name in _CONFIG_KEYS.items():
+            if config and key in config:
+                payload[name] = config[key]
+        return payload
+
+    def respond_stream(self, chat: Chat, config: Optional[dict[str, Any]] = None) -> PredictionStream:
+        """Start a streamed prediction."""
+        payload = self._payload(chat, config, stream=True)
+        prompt_tokens = sum(_estimate_tokens(m["content"]) for m in chat.messages)
+        response = _request(self._address, "POST", "/v1/chat/completions", payload)
+        return PredictionStream(response, self._address, self.identifier, prompt_tokens)
+
+    def respond(
+        self,
+        chat: Chat,
+        config: Optional[dict[str, Any]] = None,
+        on_prediction_fragment: Optional[Callable[[LlmPredictionFragment], None]] = None,
+    ) -> PredictionResult:
+        """Run a prediction to completion."""
+        stream = self.respond_stream(chat, config)
+        for fragment in stream:
+            if on_prediction_fragment is not None:
+                on_prediction_fragment(fragment)
+        return stream.result()
+
+    def unload(self) -> None:
+        _request_json(self._address, "POST", "/_fake/unload", {"model": self.identifier})
+
+
+class _LlmNamespace:
+    def __init__(self, address: str):
+        self._address = address
+
+    def _loaded_keys(self) -> list[str]:
+        data = _request_json(self._address, "GET", "/api/v0/models")
+        return [m["id"] for m in data.get("data", []) if m.get("state") == "loaded"]
+
+    def model(self, model_key: Optional[str] = None) -> LLM:
+        """Get a model handle, loading the model if needed (None = currently loaded model)."""
+        if model_key is None:
+            loaded = self._loaded_keys()
+            if not loaded:
+                raise LMStudioModelNotFoundError("No model is currently loaded")
+            return LLM(self._address, loaded[0])
+        _request_json(self._address, "POST", "/_fake/load", {"model": model_key})
+        return LLM(self._address, model_key)
+
+    def load_new_instance(self, model_key: str) -> LLM:
+        return self.model(model_key)
+
+    def list_loaded(self) -> list[LLM]:
+        return [LLM(self._address, key) for key in self._loaded_keys()]
+
+    def unload(self, model_key: str) -> None:
+        LLM(self._address, model_key).unload()
+
+
+class Client:
+    """Fake lmstudio.Client for "host:port" addresses."""
+
+    def __init__(self, api_host: Optional[str] = None):
+        self.api_host = api_host or "localhost:1234"
+        self.llm = _LlmNamespace(self.api_host)
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+_SDK_EXPORTS = (
+    "Chat",
+    "Client",
+    "LLM",
+    "LlmPredictionFragment",
+    "LMStudioError",
+    "LMStudioModelNotFoundError",
+    "LMStudioServerError",
+    "LMStudioWebsocketError",
+    "PredictionResult",
+    "PredictionStats",
+    "PredictionStream",
+)
+
+
+def install_fake_lmstudio() -> types.ModuleType:
+    """
+    Make `import lmstudio` return the fake SDK.
+
+    Returns:
+        The installed module (pass it to sys.modules to restore later if needed)
+    """
+    module = types.ModuleType("lmstudio", "Fake lmstudio SDK (Z-Forge fake_lm_server)")
+    for name in _SDK_EXPORTS:
+        setattr(module, name, globals()[name])
+    sys.modules["lmstudio"] = module
+    return module
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run the fake server from the command line until interrupted."""
+    defaults = FakeServerConfig()
+    parser = argparse.ArgumentParser(description="Fake LM Studio server for Z-Forge testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--models", default=",".join(defaults.models), help="Comma-separated model IDs")
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="Seconds to first token")
+    parser.add_argument("--tps", type=float, default=defaults.tokens_per_second, help="Tokens per second")
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--parallel", type=int, default=defaults.parallel)
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate)
+    parser.add_argument("--failure-mode", choices=FAILURE_MODES, default=defaults.failure_mode)
+    parser.add_argument("--load-delay", type=float, default=defaults.load_delay)
+    parser.add_argument("--unload-delay", type=float, default=defaults.unload_delay)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    server = FakeLMServer(
+        args.host,
+        args.port,
+        models=tuple(m.strip() for m in args.models.split(",") if m.strip()),
+        latency=args.latency,
+        tokens_per_second=args.tps,
+        completion_tokens=args.completion_tokens,
+        parallel=args.parallel,
+        failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode,
+        load_delay=args.load_delay,
+        unload_delay=args.unload_delay,
+        seed=args.seed,
+    ).start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Z-Forge Host Balancer
+Spreads LLM requests over several servers and fails over when one goes down.
+
+Features:
+- Host list from the LLM Config node ("host:port" or "host:port weight" per line)
+- Least-outstanding-requests or smooth weighted round-robin routing
+- Hosts ejected after a connection failure, with exponential backoff
+- Background TCP health checks eject dead hosts before a request has to wait
+  for a timeout, and restore hosts once they accept connections again
+"""
+import logging
+import socket
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
+
+logger = logging.getLogger("ZForge")
+
+BALANCE_LEAST_OUTSTANDING = "Least outstanding"
+BALANCE_WEIGHTED_ROUND_ROBIN = "Weighted round-robin"
+BALANCING_POLICIES = [BALANCE_LEAST_OUTSTANDING, BALANCE_WEIGHTED_ROUND_ROBIN]
+
+HEALTH_CHECK_INTERVAL = 5.0
+HEALTH_CHECK_TIMEOUT = 1.0
+
+# First ejection lasts EJECT_SECONDS, doubling per consecutive failure
+EJECT_SECONDS = 10.0
+MAX_EJECT_SECONDS = 300.0
+
+# Hosts not routed to for this long are no longer health-checked
+FORGET_AFTER_SECONDS = 600.0
+
+HostList = tuple[tuple[str, int], ...]
+
+
+@lru_cache(maxsize=64)
+def parse_hosts(text: str, primary: str) -> HostList:
+    """
+    Parse a host list.
+
+    Args:
+        text: One "host:port" per line (or comma-separated), optionally followed
+            by a weight ("10.0.0.2:1234 2"); "#" starts a comment
+        primary: "host:port" of the node's main server, always included
+            (weight 1 unless it is listed with another weight)
+
+    Returns:
+        Tuple of (address, weight) pairs, hosts with weight 0 removed
+    """
+    default_port = primary.rsplit(":", 1)[-1]
+    hosts = {primary: 1}
+    for line in text.replace(",", "\n").splitlines():
+        parts = line.split("#")[0].split()
+        if not parts:
+            continue
+        address = parts[0].removeprefix("http://").removeprefix("https://").rstrip("/")
+        if ":" not in address:
+            address = f"{address}:{default_port}"
+        weight = 1
+        if len(parts) > 1:
+            try:
+                weight = max(0, int(parts[1].removeprefix("weight=")))
+            except ValueError:
+                logger.warning(f"Z-Forge: ignoring invalid weight '{parts[1]}' for {address}")
+        hosts[address] = weight
+    return tuple((address, weight) for address, weight in hosts.items() if weight > 0) or (
+        (primary, 1),
+    )
+
+
+class _HostState:
+    """Routing and health state of one server."""
+
+    def __init__(self, address: str, weight: int):
+        self.address = address
+        self.weight = weight
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.current_weight = 0  # Smooth weighted round-robin
+        self.last_used = time.monotonic()
+        self.last_error = ""
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+
+def _probe(address: str, timeout: float = HEALTH_CHECK_TIMEOUT) -> Optional[str]:
+    """Check that a server accepts TCP connections. Returns an error message or None."""
+    host, _, port = address.rpartition(":")
+    try:
+        with socket.create_connection((host, int(port)), timeout=timeout):
+            return None
+    except (OSError, ValueError) as e:
+        return str(e) or type(e).__name__
+
+
+class HostBalancer:
+    """
+    Thread-safe request router over a set of LLM servers.
+
+    Call acquire() to pick a host for a request and release() when the
+    request is done, passing failed=True after a connection failure.
+    """
+
+    def __init__(self, health_check_interval: float = HEALTH_CHECK_INTERVAL):
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._hosts: dict[str, _HostState] = {}
+        self._thread: Optional[threading.Thread] = None
+
+    def _state(self, address: str, weight: int) -> _HostState:
+        state = self._hosts.get(address)
+        if state is None:
+            state = self._hosts[address] = _HostState(address, weight)
+        state.weight = weight
+        return state
+
+    def acquire(
+        self, hosts: HostList, policy: str = BALANCE_LEAST_OUTSTANDING, exclude: tuple[str, ...] = ()
+    ) -> Optional[str]:
+        """
+        Pick a host for one request and count it as outstanding.
+
+        Ejected hosts are skipped. If every candidate is ejected, the one
+        whose ejection ends first is returned so requests still probe it.
+
+        Args:
+            hosts: Candidate (address, weight) pairs
+            policy: One of BALANCING_POLICIES
+            exclude: Addresses already tried for this request
+
+        Returns:
+            Address, or None if every host was excluded
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [self._state(a, w) for a, w in hosts if a not in exclude]
+            if not candidates:
+                return None
+            available = [s for s in candidates if not s.ejected(now)]
+            if not available:
+                available = [min(candidates, key=lambda s: s.ejected_until)]
+
+            if policy == BALANCE_WEIGHTED_ROUND_ROBIN:
+                total = sum(s.weight for s in available)
+                for state in available:
+                    state.current_weight += state.weight
+                chosen = max(available, key=lambda s: s.current_weight)
+                chosen.current_weight -= total
+            else:
+                chosen = min(available, key=lambda s: (s.outstanding / s.weight, s.requests))
+
+            chosen.outstanding += 1
+            chosen.requests += 1
+            chosen.last_used = now
+
+        if len(hosts) > 1:
+            self._ensure_health_checks()
+        return chosen.address
+
+    def release(self, address: str, failed: bool = False, error: str = "") -> None:
+        """
+        Finish a request from acquire().
+
+        Args:
+            address: Host the request went to
+            failed: The host could not be reached (it is ejected)
+            error: Failure description for status output
+        """
+        with self._lock:
+            state = self._hosts.get(address)
+            if state is None:
+                return
+            state.outstanding = max(0, state.outstanding - 1)
+            if failed:
+                self._eject(state, error)
+            elif state.consecutive_failures:
+                state.consecutive_failures = 0
+                state.ejected_until = 0.0
+
+    def _eject(self, state: _HostState, error: str) -> None:
+        state.failures += 1
+        state.consecutive_failures += 1
+        state.last_error = error
+        seconds = min(EJECT_SECONDS * 2 ** (state.consecutive_failures - 1), MAX_EJECT_SECONDS)
+        state.ejected_until = time.monotonic() + seconds
+        logger.warning(f"Z-Forge: LLM host {state.address} ejected for {seconds:.0f}s ({error})")
+
+    def available(self, hosts: HostList) -> list[str]:
+        """Addresses of hosts that are not ejected."""
+        now = time.monotonic()
+        with self._lock:
+            return [a for a, w in hosts if not self._state(a, w).ejected(now)]
+
+    def outstanding(self, hosts: HostList) -> int:
+        """Requests currently in flight to the given hosts."""
+        with self._lock:
+            return sum(self._hosts[a].outstanding for a, _ in hosts if a in self._hosts)
+
+    def _ensure_health_checks(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._health_check_loop, name="ZForge-HostHealth", daemon=True
+            )
+            self._thread.start()
+
+    def _health_check_loop(self) -> None:
+        while True:
+            time.sleep(self.health_check_interval)
+            now = time.monotonic()
+            with self._lock:
+                for address in [
+                    a for a, s in self._hosts.items() if now - s.last_used > FORGET_AFTER_SECONDS
+                ]:
+                    del self._hosts[address]
+                if not self._hosts:
+                    self._thread = None
+                    return
+                addresses = list(self._hosts)
+
+            for address in addresses:
+                error = _probe(address)
+                with self._lock:
+                    state = self._hosts.get(address)
+                    if state is None:
+                        continue
+                    ejected = state.ejected(time.monotonic())
+                    if error is None and ejected:
+                        state.consecutive_failures = 0
+                        state.ejected_until = 0.0
+                        logger.info(f"Z-Forge: LLM host {address} is reachable again")
+                    elif error is not None and not ejected:
+                        self._eject(state, f"health check: {error}")
+
+    def format_stats(self, hosts: HostList) -> str:
+        """One-line summary of the given hosts for status output."""
+        now = time.monotonic()
+        parts = []
+        with self._lock:
+            for address, weight in hosts:
+                state = self._state(address, weight)
+                text = f"{address} {state.requests} req"
+                if state.failures:
+                    text += f", {state.failures} failed"
+                if state.ejected(now):
+                    text += f", ejected {state.ejected_until - now:.0f}s"
+                parts.append(text)
+        return "[Hosts] " + " | ".join(parts)
+
+
+# Process-wide balancer instance
+_balancer = HostBalancer()
+
+
+def get_host_balancer() -> HostBalancer:
+    """Get the process-wide host balancer."""
+    return _balancer
@@ -0,0 +1,610 @@
+"""
+Z-Forge LLM Backends
+Pluggable generation backends behind the Prompt Builder's Internal mode.
+
+Features:
+- LM Studio SDK backend (pooled clients, model residency, reconnect)
+- OpenAI-compatible HTTP backend for /v1/chat/completions (LM Studio REST,
+  llama.cpp server, vLLM, Ollama) over pooled keep-alive requests sessions
+- Streaming and non-streaming generation through one Prediction interface
+- Each backend imports its client library only when it is selected
+- Cancellation on ComfyUI interrupt and wall-clock timeouts from a watchdog
+  thread, so they also apply before the first token
+- Detection of ComfyUI's coroutine node support, so nodes can generate
+  without holding the executor
+"""
+import contextlib
+import inspect
+import json
+import logging
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from .lm_client_pool import connection_errors, get_client_pool
+from .model_fetcher import get_server_models
+from .model_residency import get_residency_manager
+
+logger = logging.getLogger("ZForge")
+
+BACKEND_LMSTUDIO = "LM Studio SDK"
+BACKEND_OPENAI = "OpenAI-compatible HTTP"
+BACKENDS = [BACKEND_LMSTUDIO, BACKEND_OPENAI]
+
+# HTTP backend timeouts (seconds) and keep-alive connections kept per server
+HTTP_CONNECT_TIMEOUT = 5.0
+HTTP_READ_TIMEOUT = 300.0
+HTTP_POOL_SIZE = 16
+WATCHDOG_INTERVAL = 0.1  # Seconds between interrupt/deadline checks
+
+
+class GenerationInterrupted(Exception):
+    """The ComfyUI prompt was cancelled while the LLM was generating."""
+
+
+class GenerationTimeout(Exception):
+    """A generation ran past the configured wall-clock limit."""
+
+
+def processing_interrupted() -> bool:
+    """Whether the user cancelled the running ComfyUI prompt (False outside ComfyUI)."""
+    try:
+        from comfy.model_management import processing_interrupted as interrupted
+    except ImportError:
+        return False
+    return interrupted()
+
+
+def raise_interrupt() -> None:
+    """Raise ComfyUI's interrupt exception so the prompt ends as cancelled, not failed."""
+    try:
+        from comfy.model_management import throw_exception_if_processing_interrupted
+    except ImportError:
+        raise GenerationInterrupted("Generation cancelled") from None
+    throw_exception_if_processing_interrupted()
+    raise GenerationInterrupted("Generation cancelled")
+
+
+class PredictionWatchdog:
+    """
+    Cancel a prediction from a helper thread on ComfyUI interrupt or timeout.
+
+    Checking between fragments alone cannot stop a generation that is still
+    processing the prompt or a server that stalled, since no fragment arrives
+    to run the check. Use as a context manager around consuming the
+    prediction, then call raise_if_fired() once iteration stops.
+    """
+
+    def __init__(
+        self,
+        prediction: "Prediction",
+        timeout: float,
+        started: Optional[float] = None,
+        interval: float = WATCHDOG_INTERVAL,
+    ):
+        """
+        Args:
+            prediction: Running prediction to cancel
+            timeout: Wall-clock limit in seconds (0 = no limit)
+            started: perf_counter() value the limit counts from (default: now)
+            interval: Seconds between checks
+        """
+        self.timeout = timeout
+        self.interval = interval
+        started = time.perf_counter() if started is None else started
+        self._deadline = started + timeout if timeout > 0 else None
+        self._prediction = prediction
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.fired: Optional[type[Exception]] = None
+
+    def __enter__(self) -> "PredictionWatchdog":
+        self._thread = threading.Thread(target=self._run, name="zforge-watchdog", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _reason(self) -> Optional[type[Exception]]:
+        if processing_interrupted():
+            return GenerationInterrupted
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            return GenerationTimeout
+        return None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            reason = self._reason()
+            if reason is None:
+                continue
+            self.fired = reason
+            try:
+                self._prediction.cancel()
+            except Exception as e:
+                logger.debug(f"Z-Forge: cancelling the prediction failed: {e}")
+            return
+
+    def raise_if_fired(self, tokens: int) -> None:
+        """
+        Raise the error for the reason the prediction was (or is due to be) cancelled.
+
+        Also checks right away, so an HTTP read timeout that ends the stream
+        at the deadline is reported as the timeout, not a lost connection.
+
+        Args:
+            tokens: Fragments received before the cancellation (for the message)
+
+        Raises:
+            GenerationInterrupted: The ComfyUI prompt was cancelled
+            GenerationTimeout: The timeout passed
+        """
+        if self.fired is None:
+            self.fired = self._reason()
+        if self.fired is GenerationInterrupted:
+            raise GenerationInterrupted(f"Cancelled after {tokens} tokens")
+        if self.fired is GenerationTimeout:
+            raise GenerationTimeout(
+                f"No complete prompt after {self.timeout}s (cancelled at {tokens} tokens)"
+            )
+
+
+def shutdown_socket(sock: Any) -> None:
+    """
+    Shut a socket down so a read blocked on it in another thread returns.
+
+    Closing the response alone does not wake a thread waiting for the first
+    byte, which is exactly where a cancelled prompt-processing phase waits.
+    """
+    if sock is not None:
+        with contextlib.suppress(OSError):
+            sock.shutdown(socket.SHUT_RDWR)
+
+
+def comfy_supports_async_nodes() -> bool:
+    """
+    Whether the running ComfyUI awaits coroutine node functions.
+
+    Async-capable ComfyUI keeps executing other ready nodes while an async
+    node is pending; older versions would pass the coroutine object along as
+    the node's output, so nodes must fall back to their blocking FUNCTION.
+    """
+    try:
+        import execution
+    except ImportError:
+        return False
+    return hasattr(execution, "_async_map_node_over_list") or inspect.iscoroutinefunction(
+        getattr(execution, "get_output_data", None)
+    )
+
+
+@dataclass
+class GenerationStats:
+    """Token counts and speed reported for one generation (None = not reported)."""
+
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    time_to_first_token: Optional[float] = None
+    tokens_per_second: Optional[float] = None
+
+
+class Prediction:
+    """
+    A running generation.
+
+    Iterate it for text fragments (streaming requests only), then call
+    result() for the full text and stats.
+    """
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(())
+
+    def result(self) -> tuple[str, GenerationStats]:
+        raise NotImplementedError
+
+    def cancel(self) -> None:
+        """Stop the generation early (no-op if not supported)."""
+
+
+class LLMBackend:
+    """Interface of a generation backend. Instances are process-wide and thread-safe."""
+
+    name = ""
+
+    def unavailable_reason(self) -> Optional[str]:
+        """Why this backend cannot be used (e.g. missing library), or None."""
+        return None
+
+    def connection_errors(self) -> tuple[type, ...]:
+        """Exception types after which a reconnect and retry is worthwhile."""
+        return (ConnectionError,)
+
+    def connect(self, config: Any) -> None:
+        """Open (or reuse) the connection to the configured server."""
+
+    def acquire(self, config: Any) -> tuple[Any, Optional[str]]:
+        """
+        Get a handle for the configured model, holding it until release().
+
+        Returns:
+            Tuple of (model handle for predict(), load status line or None)
+        """
+        raise NotImplementedError
+
+    def release(self, config: Any) -> str:
+        """Release a handle from acquire(). Returns a status line or ""."""
+        return ""
+
+    def reconnect(self, config: Any) -> Any:
+        """Drop the broken connection and return a fresh model handle."""
+        raise NotImplementedError
+
+    def discard_model(self, config: Any) -> str:
+        """
+        Forget a cached model handle after a prediction through it failed.
+
+        Returns:
+            Status line, or "" if nothing was cached
+        """
+        return ""
+
+    def predict(
+        self, model: Any, config: Any, system_prompt: str, user_message: str, stream: bool
+    ) -> Prediction:
+        """Start a generation with the config's sampling parameters."""
+        raise NotImplementedError
+
+    def format_stats(self) -> str:
+        """Connection statistics for status output ("" if none)."""
+        return ""
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LM STUDIO SDK
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+class _SDKPrediction(Prediction):
+    def __init__(self, stream: Any = None, response: Any = None):
+        self._stream = stream
+        self._response = response
+
+    def __iter__(self) -> Iterator[str]:
+        if self._stream is None:
+            return
+        for fragment in self._stream:
+            yield fragment.content
+
+    def result(self) -> tuple[str, GenerationStats]:
+        response = self._response if self._stream is None else self._stream.result()
+        stats = getattr(response, "stats", None)
+        return str(response), GenerationStats(
+            prompt_tokens=getattr(stats, "prompt_tokens_count", None),
+            completion_tokens=getattr(stats, "predicted_tokens_count", None),
+            time_to_first_token=getattr(stats, "time_to_first_token_sec", None),
+            tokens_per_second=getattr(stats, "tokens_per_second", None),
+        )
+
+    def cancel(self) -> None:
+        if self._stream is not None and hasattr(self._stream, "cancel"):
+            self._stream.cancel()
+
+
+class LMStudioSDKBackend(LLMBackend):
+    """LM Studio through the lmstudio SDK (websocket), with pooled clients and residency."""
+
+    name = BACKEND_LMSTUDIO
+
+    @staticmethod
+    def _lms() -> Any:
+        import lmstudio as lms
+
+        return lms
+
+    def unavailable_reason(self) -> Optional[str]:
+        try:
+            self._lms()
+        except ImportError:
+            return "lmstudio SDK not installed. Install with: pip install lmstudio"
+        return None
+
+    def connection_errors(self) -> tuple[type, ...]:
+        return connection_errors(self._lms())
+
+    def connect(self, config: Any) -> None:
+        get_client_pool().get_client(config.server_address)
+
+    def acquire(self, config: Any) -> tuple[Any, Optional[str]]:
+        return get_residency_manager().acquire(config.server_address, config.model_id)
+
+    def release(self, config: Any) -> str:
+        return get_residency_manager().release(
+            config.server_address,
+            config.model_id,
+            idle_ttl=config.unload_idle_seconds if config.unload else None,
+            keep_warm_while_queued=config.keep_warm_while_queued,
+        )
+
+    def reconnect(self, config: Any) -> Any:
+        pool = get_client_pool()
+        pool.invalidate(config.server_address)
+        return pool.get_model(config.server_address, config.model_id)
+
+    def discard_model(self, config: Any) -> str:
+        # The model may have been switched or unloaded in LM Studio
+        if get_client_pool().forget_model(config.server_address, config.model_id):
+            return "[Pool] Dropped the cached model handle after a failed prediction"
+        return ""
+
+    def predict(
+        self, model: Any, config: Any, system_prompt: str, user_message: str, stream: bool
+    ) -> Prediction:
+        chat = self._lms().Chat(system_prompt)
+        chat.add_user_message(user_message)
+
+        gen_config: dict[str, Any] = {
+            "temperature": config.temperature,
+            "maxTokens": config.max_tokens,
+            "contextOverflowPolicy": "truncateMiddle",
+        }
+        if config.top_p < 1.0:
+            gen_config["topPSampling"] = config.top_p
+        if config.top_k > 0:
+            gen_config["topKSampling"] = config.top_k
+        if config.repeat_penalty != 1.0:
+            gen_config["repeatPenalty"] = config.repeat_penalty
+        if config.seed >= 0:
+            gen_config["seed"] = config.seed
+
+        if stream:
+            return _SDKPrediction(stream=model.respond_stream(chat, config=gen_config))
+        return _SDKPrediction(response=model.respond(chat, config=gen_config))
+
+    def format_stats(self) -> str:
+        return f"{get_client_pool().format_stats()}\n{get_residency_manager().format_stats()}"
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# OPENAI-COMPATIBLE HTTP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+class _HTTPPrediction(Prediction):
+    def __init__(self, response: Any, stream: bool):
+        self._response = response
+        self._stream = stream
+        self._started = time.perf_counter()
+        self._fragments: list[str] = []
+        self._stats = GenerationStats()
+        self._finished = False
+        self._cancelled = False
+
+    def __iter__(self) -> Iterator[str]:
+        if not self._stream or self._finished:
+            return
+        try:
+            for line in self._response.iter_lines(decode_unicode=True):
+                if self._cancelled:
+                    break
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    self._finished = True
+                    break
+                chunk = json.loads(data)
+                self._read_usage(chunk)
+                for choice in chunk.get("choices") or []:
+                    if choice.get("finish_reason"):
+                        self._finished = True
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        if self._stats.time_to_first_token is None:
+                            self._stats.time_to_first_token = time.perf_counter() - self._started
+                        self._fragments.append(content)
+                        yield content
+        except Exception:
+            if not self._cancelled:
+                raise  # cancel() closing the response can break a read in progress
+        finally:
+            self._response.close()
+        if not self._finished and not self._cancelled:
+            raise ConnectionError("Stream ended before the completion finished")
+
+    def _read_usage(self, data: dict[str, Any]) -> None:
+        usage = data.get("usage") or {}
+        if usage.get("prompt_tokens") is not None:
+            self._stats.prompt_tokens = usage["prompt_tokens"]
+        if usage.get("completion_tokens") is not None:
+            self._stats.completion_tokens = usage["completion_tokens"]
+        # llama.cpp server reports its own decode speed
+        timings = data.get("timings") or {}
+        if timings.get("predicted_per_second"):
+            self._stats.tokens_per_second = timings["predicted_per_second"]
+
+    def result(self) -> tuple[str, GenerationStats]:
+        if not self._stream:
+            try:
+                data = self._response.json()
+            finally:
+                self._response.close()
+            self._read_usage(data)
+            choices = data.get("choices") or [{}]
+            text = (choices[0].get("message") or {}).get("content") or ""
+            return text, self._stats
+
+        for _ in self:
+            pass  # Consume whatever was not iterated yet
+        if self._stats.completion_tokens is None:
+            self._stats.completion_tokens = len(self._fragments)
+        return "".join(self._fragments), self._stats
+
+    def cancel(self) -> None:
+        self._cancelled = True
+        shutdown_socket(self._socket())
+        self._response.close()
+
+    def _socket(self) -> Any:
+        """The socket under the response (None once released)."""
+        raw = getattr(self._response, "raw", None)
+        sock = getattr(getattr(raw, "connection", None), "sock", None)
+        if sock is None:
+            # http.client detaches the socket from the connection for "Connection: close"
+            fp = getattr(getattr(raw, "_fp", None), "fp", None)
+            sock = getattr(getattr(fp, "raw", None), "_sock", None)
+        return sock
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """
+    Any server with an OpenAI-compatible /v1/chat/completions endpoint.
+
+    One requests.Session per server keeps connections alive between
+    generations. There is no model handle or residency control; servers
+    load models on demand.
+    """
+
+    name = BACKEND_OPENAI
+
+    def __init__(self, pool_size: int = HTTP_POOL_SIZE):
+        self.pool_size = pool_size
+        self._lock = threading.Lock()
+        self._sessions: dict[str, Any] = {}
+        self.session_hits = 0
+        self.session_misses = 0
+        self.resets = 0
+
+    def unavailable_reason(self) -> Optional[str]:
+        try:
+            import requests  # noqa: F401
+        except ImportError:
+            return "requests library not installed. Install with: pip install requests"
+        return None
+
+    def connection_errors(self) -> tuple[type, ...]:
+        import requests
+
+        return (
+            ConnectionError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.ChunkedEncodingError,
+        )
+
+    def _session(self, server_url: str) -> Any:
+        with self._lock:
+            session = self._sessions.get(server_url)
+            if session is not None:
+                self.session_hits += 1
+                return session
+
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._sessions[server_url] = session
+            self.session_misses += 1
+            return session
+
+    def connect(self, config: Any) -> None:
+        self._session(config.server_url)
+
+    def acquire(self, config: Any) -> tuple[Any, Optional[str]]:
+        if config.model_id:
+            return config.model_id, None
+        # Most servers require a model name; use the first one listed
+        models, _ = get_server_models(config.server_url)
+        return (models[0] if models else None), None
+
+    def reconnect(self, config: Any) -> Any:
+        with self._lock:
+            session = self._sessions.pop(config.server_url, None)
+            self.resets += 1
+        if session is not None:
+            session.close()
+        return self.acquire(config)[0]
+
+    def predict(
+        self, model: Any, config: Any, system_prompt: str, user_message: str, stream: bool
+    ) -> Prediction:
+        payload: dict[str, Any] = {
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_message},
+            ],
+            "temperature": config.temperature,
+            "max_tokens": config.max_tokens,
+            "stream": stream,
+        }
+        if model:
+            payload["model"] = model
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        if config.top_p < 1.0:
+            payload["top_p"] = config.top_p
+        # Not part of the OpenAI API, but understood by LM Studio, llama.cpp and vLLM
+        if config.top_k > 0:
+            payload["top_k"] = config.top_k
+        if config.repeat_penalty != 1.0:
+            payload["repeat_penalty"] = config.repeat_penalty
+        if config.seed >= 0:
+            payload["seed"] = config.seed
+
+        # A stalled server also counts against the generation timeout
+        read_timeout = min(config.generation_timeout or HTTP_READ_TIMEOUT, HTTP_READ_TIMEOUT)
+        response = self._session(config.server_url).post(
+            f"{config.server_url}/v1/chat/completions",
+            json=payload,
+            stream=stream,
+            timeout=(HTTP_CONNECT_TIMEOUT, read_timeout),
+        )
+        if response.status_code >= 400:
+            try:
+                error = response.json().get("error")
+                message = error.get("message") if isinstance(error, dict) else error
+            except ValueError:
+                message = None
+            response.close()
+            raise RuntimeError(f"HTTP {response.status_code}: {message or response.reason}")
+        return _HTTPPrediction(response, stream)
+
+    def format_stats(self) -> str:
+        return (
+            f"[HTTP] sessions: {self.session_hits} hit / {self.session_misses} miss, "
+            f"{self.resets} reset(s)"
+        )
+
+
+# Backend classes by name; instances are created on first use
+_BACKEND_TYPES: dict[str, type[LLMBackend]] = {
+    BACKEND_LMSTUDIO: LMStudioSDKBackend,
+    BACKEND_OPENAI: OpenAICompatibleBackend,
+}
+_backends: dict[str, LLMBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str) -> LLMBackend:
+    """
+    Get the process-wide instance of a backend.
+
+    Args:
+        name: One of BACKENDS (unknown names fall back to the LM Studio SDK)
+
+    Returns:
+        LLMBackend instance
+    """
+    if name not in _BACKEND_TYPES:
+        logger.warning(f"Z-Forge: unknown LLM backend '{name}', using {BACKEND_LMSTUDIO}")
+        name = BACKEND_LMSTUDIO
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = _backends[name] = _BACKEND_TYPES[name]()
+        return backend
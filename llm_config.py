@@ -0,0 +1,200 @@
+"""
+Z-Forge LLM Config
+Immutable LLM configuration passed between nodes as ZFORGE_LLM_CONFIG.
+
+Features:
+- Frozen, hashable dataclass (safe to share across queue items and threads)
+- System prompt referenced by content hash in the template registry, never copied
+- JSON form for export/import only (legacy JSON strings are still accepted)
+"""
+import json
+import logging
+from dataclasses import asdict, dataclass, fields, replace
+from typing import Any, Optional, Union
+
+from .host_balancer import HostList, parse_hosts
+from .template_registry import get_template_registry
+
+logger = logging.getLogger("ZForge")
+
+
+@dataclass(frozen=True)
+class LLMConfig:
+    """LLM server connection, generation, residency and cache settings."""
+
+    host: str = "127.0.0.1"
+    port: int = 1234
+    backend: str = "LM Studio SDK"  # See llm_backends.BACKENDS
+    hosts: str = ""  # Extra servers, one "host:port [weight]" per line
+    balancing: str = "Least outstanding"  # See host_balancer.BALANCING_POLICIES
+    model: str = ""  # Empty = use currently loaded model
+    temperature: float = 0.45
+    max_tokens: int = 512
+    top_p: float = 1.0
+    top_k: int = 0
+    repeat_penalty: float = 1.0
+    unload: bool = True
+    unload_idle_seconds: int = 30
+    keep_warm_while_queued: bool = True
+    lookahead: bool = False  # Pre-expand queued prompts while the current one renders
+    reservoir_depth: int = 0  # Ready prompts kept for fully randomized runs, 0 = off
+    reservoir_refill_per_minute: int = 6
+    seed: int = -1  # -1 = random
+    stream: bool = True
+    generation_timeout: int = 0  # Wall-clock seconds per generation, 0 = no limit
+    cache_mode: str = "Memory"
+    cache_ttl_minutes: int = 60
+    cache_max_entries: int = 256
+    wire_format: str = "Verbose"  # See yaml_builder.WIRE_FORMATS
+    prune_system_prompt: bool = False
+    preexpand_keywords: bool = False  # Replace preset keywords before the LLM sees them
+    offline_fallback: bool = False  # Use the rule-based expander if the LLM call fails
+    system_prompt_template: str = ""
+    system_prompt_hash: str = ""  # Content hash in the template registry ("" = default)
+    status: str = ""
+
+    @property
+    def server_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def server_address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    @property
+    def host_list(self) -> HostList:
+        """(address, weight) of every server, the main host:port first."""
+        return parse_hosts(self.hosts, self.server_address)
+
+    def for_host(self, address: str) -> "LLMConfig":
+        """Copy of this config pointing at one server of the host list."""
+        host, _, port = address.rpartition(":")
+        if host == self.host and int(port) == self.port and not self.hosts:
+            return self
+        return replace(self, host=host, port=int(port), hosts="")
+
+    @property
+    def model_id(self) -> Optional[str]:
+        """Model identifier, or None to use the currently loaded model."""
+        return self.model.strip() or None
+
+    @property
+    def metric_labels(self) -> dict[str, str]:
+        """Model and template labels for metrics (see metrics.py)."""
+        return {
+            "model": self.model_id or "current",
+            "template": self.system_prompt_template or "default",
+        }
+
+    @property
+    def system_prompt(self) -> str:
+        """The referenced system prompt text ("" = use the default)."""
+        return self.load_system_prompt()[0]
+
+    def load_system_prompt(self) -> tuple[str, Optional[str]]:
+        """
+        Look up the referenced system prompt.
+
+        If the referenced version is no longer known (e.g. the template file
+        was edited since the config was made), the current version of
+        system_prompt_template is used instead.
+
+        Returns:
+            Tuple of (system prompt text or "" for the default, warning line or None)
+        """
+        if not self.system_prompt_hash:
+            return "", None
+        registry = get_template_registry()
+        template = registry.get_by_hash(self.system_prompt_hash)
+        if template is not None:
+            return template.content, None
+
+        name = self.system_prompt_template
+        if name:
+            try:
+                content = registry.get(name).content
+            except OSError:
+                pass
+            else:
+                warning = (
+                    f"[WARNING] The config's version of template '{name}' is no longer "
+                    f"available - using the current {name}.md"
+                )
+                logger.warning(f"Z-Forge: {warning}")
+                return content, warning
+        warning = (
+            f"[WARNING] Template '{name or 'from config'}' is no longer available - "
+            "using the default"
+        )
+        logger.warning(f"Z-Forge: {warning}")
+        return "", warning
+
+    def with_changes(self, **changes: Any) -> "LLMConfig":
+        """Return a copy with some fields changed."""
+        return replace(self, **changes)
+
+    def to_dict(self, include_prompt: bool = True) -> dict[str, Any]:
+        """
+        Export as a plain dictionary.
+
+        Args:
+            include_prompt: Embed the system prompt text so the export is self-contained
+
+        Returns:
+            Config dictionary (includes server_url for readability)
+        """
+        data = asdict(self)
+        data["server_url"] = self.server_url
+        if include_prompt:
+            data["system_prompt"] = self.system_prompt
+        return data
+
+    def to_json(self, include_prompt: bool = True) -> str:
+        """Export as a JSON string (for saving/sharing; nodes pass the object itself)."""
+        return json.dumps(self.to_dict(include_prompt))
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "LLMConfig":
+        """
+        Build a config from a dictionary, ignoring unknown keys.
+
+        An embedded "system_prompt" is registered in the template registry
+        and referenced by hash.
+        """
+        known = {f.name for f in fields(cls)}
+        values = {key: value for key, value in data.items() if key in known}
+        prompt = data.get("system_prompt")
+        if prompt and not values.get("system_prompt_hash"):
+            name = values.get("system_prompt_template") or "imported"
+            values["system_prompt_hash"] = get_template_registry().register(name, prompt).content_hash
+        return cls(**values)
+
+    @classmethod
+    def from_json(cls, text: str) -> "LLMConfig":
+        """Build a config from an exported (or legacy) JSON string."""
+        return cls.from_dict(json.loads(text))
+
+
+# Default LLM config (used when no LLM Config node connected)
+DEFAULT_LLM_CONFIG = LLMConfig()
+
+
+def parse_llm_config(config: Union[LLMConfig, str, None]) -> LLMConfig:
+    """
+    Get the LLM config from a connected LLM Config node.
+
+    Args:
+        config: LLMConfig object, legacy JSON string, or None if not connected
+
+    Returns:
+        LLMConfig (defaults if not connected or invalid)
+    """
+    if isinstance(config, LLMConfig):
+        return config
+    if not config:
+        return DEFAULT_LLM_CONFIG
+    try:
+        return LLMConfig.from_json(config)
+    except (json.JSONDecodeError, TypeError, AttributeError) as e:
+        logger.warning(f"Z-Forge: ignoring invalid LLM config ({e})")
+        return DEFAULT_LLM_CONFIG
@@ -0,0 +1,257 @@
+"""
+Z-Forge LM Studio Client Pool
+Process-wide pool of lmstudio SDK clients keyed by host:port.
+
+Features:
+- One persistent client per server, reused across executions
+- Model handles cached per server and reused across executions, evicted
+  when a prediction through them fails
+- Periodic health checks with automatic reconnect
+- Clean shutdown when the interpreter exits
+"""
+import atexit
+import contextlib
+import logging
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger("ZForge")
+
+# Seconds a pooled client may sit unused before it is health-checked again
+HEALTH_CHECK_INTERVAL = 30.0
+
+
+class _PooledClient:
+    """A connected client plus the model handles obtained through it."""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.models: dict[str, Any] = {}
+        self.last_checked = time.monotonic()
+
+
+class LMStudioClientPool:
+    """
+    Thread-safe pool of lmstudio clients.
+
+    Clients are created lazily on first use and kept open until they fail
+    a health check, are invalidated after a connection error, or the pool
+    is shut down.
+    """
+
+    def __init__(self, health_check_interval: float = HEALTH_CHECK_INTERVAL):
+        self.health_check_interval = health_check_interval
+        self._lock = threading.Lock()
+        self._entries: dict[str, _PooledClient] = {}
+        self.client_hits = 0
+        self.client_misses = 0
+        self.model_hits = 0
+        self.model_misses = 0
+        self.reconnects = 0
+
+    def _connect(self, server_address: str) -> _PooledClient:
+        import lmstudio as lms
+
+        logger.info(f"Z-Forge: opening LM Studio client for {server_address}")
+        return _PooledClient(lms.Client(server_address))
+
+    def _is_healthy(self, entry: _PooledClient) -> bool:
+        try:
+            entry.client.llm.list_loaded()
+            return True
+        except Exception as e:
+            logger.warning(f"Z-Forge: pooled LM Studio client failed health check: {e}")
+            return False
+
+    @staticmethod
+    def _close(entry: _PooledClient) -> None:
+        with contextlib.suppress(Exception):
+            entry.client.close()
+
+    def _get_entry(self, server_address: str, count_hit: bool = True) -> _PooledClient:
+        """
+        Return a healthy pooled entry, connecting or reconnecting as needed.
+
+        Args:
+            server_address: "host:port" of the LM Studio server
+            count_hit: Count reuse of an open client as a hit (off for the
+                model lookup that follows get_client() in the same request)
+        """
+        entry = self._entries.get(server_address)
+
+        if entry is not None:
+            now = time.monotonic()
+            if now - entry.last_checked < self.health_check_interval or self._is_healthy(entry):
+                if count_hit:
+                    self.client_hits += 1
+                entry.last_checked = now
+                return entry
+            # Stale connection - drop it and reconnect below
+            self._close(entry)
+            del self._entries[server_address]
+            self.reconnects += 1
+
+        self.client_misses += 1
+        entry = self._connect(server_address)
+        self._entries[server_address] = entry
+        return entry
+
+    def get_client(self, server_address: str) -> Any:
+        """
+        Get a connected client for a server.
+
+        Args:
+            server_address: "host:port" of the LM Studio server
+
+        Returns:
+            lmstudio Client instance
+        """
+        with self._lock:
+            return self._get_entry(server_address).client
+
+    def get_model(self, server_address: str, model_id: Optional[str]) -> Any:
+        """
+        Get a model handle, reusing a cached handle when available.
+
+        Args:
+            server_address: "host:port" of the LM Studio server
+            model_id: Model identifier, or None/empty for the currently loaded model
+
+        Returns:
+            lmstudio LLM handle
+        """
+        key = model_id or ""
+        with self._lock:
+            entry = self._get_entry(server_address, count_hit=False)
+            model = entry.models.get(key)
+            if model is not None:
+                self.model_hits += 1
+                return model
+
+        # Resolving a handle may load the model - don't hold the pool lock for it
+        if model_id:
+            model = entry.client.llm.model(model_id)
+        else:
+            model = entry.client.llm.model()
+
+        with self._lock:
+            self.model_misses += 1
+            entry.models[key] = model
+        return model
+
+    def has_model(self, server_address: str, model_id: Optional[str]) -> bool:
+        """Check whether a model handle is cached for a server."""
+        with self._lock:
+            entry = self._entries.get(server_address)
+            return entry is not None and (model_id or "") in entry.models
+
+    def loaded_models(self, server_address: str) -> Optional[list[str]]:
+        """
+        List the models the server has loaded right now.
+
+        Args:
+            server_address: "host:port" of the LM Studio server
+
+        Returns:
+            Model identifiers, or None if the server could not be asked
+        """
+        with self._lock:
+            entry = self._get_entry(server_address, count_hit=False)
+        try:
+            return [model.identifier for model in entry.client.llm.list_loaded()]
+        except Exception as e:
+            logger.debug(f"Z-Forge: could not list loaded models on {server_address}: {e}")
+            return None
+
+    def forget_model(self, server_address: str, model_id: Optional[str]) -> bool:
+        """
+        Drop a cached model handle (e.g. after the model was unloaded or
+        switched in LM Studio), so the next request resolves it again.
+
+        Returns:
+            True if a handle was cached
+        """
+        with self._lock:
+            entry = self._entries.get(server_address)
+            if entry is None:
+                return False
+            return entry.models.pop(model_id or "", None) is not None
+
+    def unload_model(self, server_address: str, model_id: Optional[str]) -> bool:
+        """
+        Unload a model through its cached handle, if one exists.
+
+        Args:
+            server_address: "host:port" of the LM Studio server
+            model_id: Model identifier, or None/empty for the currently loaded model
+
+        Returns:
+            True if a cached handle was found and unloaded
+        """
+        with self._lock:
+            entry = self._entries.get(server_address)
+            model = entry.models.pop(model_id or "", None) if entry else None
+        if model is None:
+            return False
+        model.unload()
+        return True
+
+    def invalidate(self, server_address: str) -> None:
+        """Close and remove the client for a server after a connection failure."""
+        with self._lock:
+            entry = self._entries.pop(server_address, None)
+            if entry is not None:
+                self.reconnects += 1
+        if entry is not None:
+            self._close(entry)
+
+    def shutdown(self) -> None:
+        """Close every pooled client."""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def format_stats(self) -> str:
+        """One-line summary of pool usage for status output."""
+        return (
+            f"[Pool] clients: {self.client_hits} hit / {self.client_misses} miss, "
+            f"models: {self.model_hits} hit / {self.model_misses} miss, "
+            f"{self.reconnects} reconnect(s)"
+        )
+
+
+# Process-wide pool instance
+_pool = LMStudioClientPool()
+
+
+def get_client_pool() -> LMStudioClientPool:
+    """Get the process-wide LM Studio client pool."""
+    return _pool
+
+
+def connection_errors(lms: Any) -> tuple[type, ...]:
+    """
+    Exception types that indicate a broken connection rather than a bad request.
+
+    Args:
+        lms: The imported lmstudio module
+
+    Returns:
+        Tuple of exception classes suitable for an except clause
+    """
+    errors: list[type] = [ConnectionError, OSError]
+    websocket_error = getattr(lms, "LMStudioWebsocketError", None)
+    if isinstance(websocket_error, type):
+        errors.append(websocket_error)
+    return tuple(errors)
+
+
+def shutdown_client_pool() -> None:
+    """Close all pooled clients. Registered to run at interpreter exit."""
+    _pool.shutdown()
+
+
+atexit.register(shutdown_client_pool)
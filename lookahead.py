@@ -0,0 +1,318 @@
+"""
+Z-Forge Lookahead
+Pre-expands queued Prompt Builder executions while the current prompt renders.
+
+Features:
+- Opt-in per LLM Config node (lookahead toggle)
+- Reads the pending ComfyUI queue and finds Prompt Builder nodes whose inputs
+  are already known (widget values, LLM Config and Person nodes; randomize
+  only with a seed, never reset)
+- Expands them one at a time in a background thread, so text generation
+  overlaps with image sampling
+- Results are kept until the real execution takes them (one use each); an
+  execution that arrives mid-prefetch waits for it instead of generating twice
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+logger = logging.getLogger("ZForge")
+
+# Queued prompts (after the running one) scanned for work
+LOOKAHEAD_DEPTH = 2
+
+# Seconds between queue scans
+POLL_INTERVAL = 0.5
+
+# The worker exits after this long without a lookahead-enabled execution
+IDLE_EXIT_SECONDS = 600.0
+
+# Bounds on results waiting to be taken
+MAX_ENTRIES = 32
+ENTRY_TTL = 600.0
+
+# Nodes that may feed a Prompt Builder and are resolved ahead of execution
+_RESOLVABLE_NODES = ("ZForgeLLMConfig", "ZForgePerson")
+
+# Toggles that change a node's output when it actually runs
+_RESET_INPUTS = ("reset", "reset_all")
+_RANDOMIZE_INPUTS = ("randomize", "randomize_all_people", "randomize_person_1", "randomize_scene")
+
+_INTERNAL_MODE = "Internal (LM Studio)"
+
+
+class _Prefetch:
+    """One background expansion: pending until done is set."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.prompt = ""
+        self.info = ""
+        self.seconds = 0.0
+        self.created = time.monotonic()
+
+
+def _is_link(value: Any) -> bool:
+    """Whether an input value in the API prompt format is a link to another node's output."""
+    return (
+        isinstance(value, list)
+        and len(value) == 2
+        and isinstance(value[0], str)
+        and isinstance(value[1], int)
+    )
+
+
+def _node_classes() -> dict[str, type]:
+    from .subject_node import ZForgePerson
+    from .z_forge_llm_config import ZForgeLLMConfig
+
+    return {"ZForgeLLMConfig": ZForgeLLMConfig, "ZForgePerson": ZForgePerson}
+
+
+def _is_deterministic(inputs: dict[str, Any]) -> bool:
+    """Whether a node's output is known from its inputs (randomize only counts with a seed)."""
+    if any(inputs.get(name) for name in _RESET_INPUTS):
+        return False
+    if inputs.get("seed") is not None:
+        return True
+    return not any(inputs.get(name) for name in _RANDOMIZE_INPUTS)
+
+
+def _resolve_node(prompt: dict[str, Any], node_id: str, depth: int = 0) -> Optional[tuple]:
+    """
+    Run a resolvable upstream node of a queued prompt.
+
+    Returns:
+        The node's outputs, or None if it cannot be evaluated ahead of time
+    """
+    node = prompt.get(node_id)
+    if node is None or node.get("class_type") not in _RESOLVABLE_NODES or depth > 4:
+        return None
+    cls = _node_classes()[node["class_type"]]
+    inputs = {}
+    for name, value in node.get("inputs", {}).items():
+        if _is_link(value):
+            outputs = _resolve_node(prompt, value[0], depth + 1)
+            if outputs is None:
+                return None
+            value = outputs[value[1]]
+        inputs[name] = value
+    if not _is_deterministic(inputs):
+        return None
+    result = getattr(cls(), cls.FUNCTION)(**inputs)
+    if isinstance(result, dict):
+        result = result["result"]
+    return tuple(result)
+
+
+def _builder_inputs(prompt: dict[str, Any], node: dict[str, Any]) -> Optional[dict[str, Any]]:
+    """
+    Inputs of a queued Prompt Builder, with upstream Z-Forge nodes resolved.
+
+    Returns:
+        Keyword arguments for build_prompt(), or None if the node's output is
+        not known before it runs (links to other nodes, unseeded randomize, reset)
+    """
+    raw = node.get("inputs", {})
+    if raw.get("llm_mode") != _INTERNAL_MODE:
+        return None
+    try:
+        people = int(raw.get("people", 1))
+    except (TypeError, ValueError):
+        return None
+
+    inputs = {}
+    for name, value in raw.items():
+        if _is_link(value):
+            if name in ("person_2", "person_3") and people < int(name[-1]):
+                continue  # Unused slot
+            outputs = _resolve_node(prompt, value[0])
+            if outputs is None:
+                return None
+            value = outputs[value[1]]
+        inputs[name] = value
+    if not _is_deterministic(inputs):
+        return None
+    return inputs
+
+
+class LookaheadPrefetcher:
+    """
+    Background pre-expansion of queued Prompt Builder executions.
+
+    Executions with lookahead enabled call enable(); the worker then scans
+    the pending queue and stores expansions that take() hands back to the
+    matching execution.
+    """
+
+    def __init__(self, depth: int = LOOKAHEAD_DEPTH):
+        self.depth = depth
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, _Prefetch] = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._enabled_at = 0.0
+        self.prefetched = 0
+        self.hits = 0
+        self.failed = 0
+
+    def enable(self) -> None:
+        """Start (or keep alive) the background worker."""
+        with self._lock:
+            self._enabled_at = time.monotonic()
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._worker_loop, name="ZForge-Lookahead", daemon=True
+            )
+            self._thread.start()
+
+    def take(self, key: str, timeout: float) -> Optional[tuple[str, str, float]]:
+        """
+        Take a prefetched expansion, waiting for it if it is still generating.
+
+        Args:
+            key: Request key (expansion_cache.request_key)
+            timeout: Maximum seconds to wait for a pending prefetch
+
+        Returns:
+            Tuple of (expanded_prompt, status_info, generation_seconds), or None
+
+        Raises:
+            GenerationInterrupted: The ComfyUI prompt was cancelled while waiting
+        """
+        from .llm_backends import GenerationInterrupted, processing_interrupted
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        deadline = time.monotonic() + timeout
+        while not entry.done.wait(0.1):
+            if processing_interrupted():
+                raise GenerationInterrupted("Cancelled while waiting for lookahead")
+            if time.monotonic() > deadline:
+                return None
+
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return None  # Taken by another execution
+            del self._entries[key]
+            if not entry.prompt:
+                return None
+            self.hits += 1
+        return entry.prompt, entry.info, entry.seconds
+
+    def _claim(self, key: str) -> Optional[_Prefetch]:
+        """Register a new pending prefetch, or None if the key is already known."""
+        now = time.monotonic()
+        with self._lock:
+            for stale in [
+                k for k, e in self._entries.items() if e.done.is_set() and now - e.created > ENTRY_TTL
+            ]:
+                del self._entries[stale]
+            if key in self._entries or len(self._entries) >= MAX_ENTRIES:
+                return None
+            entry = self._entries[key] = _Prefetch()
+            return entry
+
+    def _pending_prompts(self) -> list[dict[str, Any]]:
+        """API-format prompts of the next queued (not running) items."""
+        try:
+            from server import PromptServer
+        except ImportError:
+            return []
+        try:
+            _, pending = PromptServer.instance.prompt_queue.get_current_queue()
+        except Exception:
+            return []
+        return [item[2] for item in sorted(pending, key=lambda item: item[0])[: self.depth]]
+
+    def _worker_loop(self) -> None:
+        while True:
+            time.sleep(POLL_INTERVAL)
+            with self._lock:
+                if time.monotonic() - self._enabled_at > IDLE_EXIT_SECONDS:
+                    self._thread = None
+                    return
+            for prompt in self._pending_prompts():
+                for node_id, node in list(prompt.items()):
+                    if node.get("class_type") == "ZForgePromptBuilder":
+                        try:
+                            self._prefetch(prompt, node)
+                        except Exception as e:
+                            logger.debug(f"Z-Forge: lookahead skipped node {node_id}: {e}")
+
+    def _prefetch(self, prompt: dict[str, Any], node: dict[str, Any]) -> None:
+        """Expand one queued Prompt Builder node if its request is known and not yet prefetched."""
+        from .expansion_cache import request_key
+        from .llm_backends import GenerationInterrupted
+        from .llm_config import parse_llm_config
+        from .metrics import get_metrics
+        from .z_image_prompt import ZForgePromptBuilder
+
+        inputs = _builder_inputs(prompt, node)
+        if inputs is None:
+            return
+        config = parse_llm_config(inputs.get("llm_config"))
+        if not config.lookahead:
+            return
+
+        # External mode yields exactly the variables and instructions the real run sends;
+        # its stage timings are the real run's to record
+        metrics = get_metrics()
+        builder = ZForgePromptBuilder()
+        with metrics.muted():
+            output = builder.build_prompt(**{**inputs, "llm_mode": "External (Output Only)"})
+        variables, system_prompt = output["result"][:2]
+        if not variables:
+            return
+        prepared_prompt, prepared_variables, _ = builder._prepare_request(
+            system_prompt, variables, config
+        )
+        key = request_key(prepared_prompt, prepared_variables, config)
+        entry = self._claim(key)
+        if entry is None:
+            return
+
+        # The generation's stage and token metrics are recorded here; the request itself
+        # is counted once, as prefetch_hit, by the execution that takes the result
+        started = time.perf_counter()
+        try:
+            with metrics.muted("zforge_requests_total"):
+                entry.prompt, entry.info = builder._call_lm_studio(
+                    system_prompt, variables, config, prefetch=True
+                )
+        except GenerationInterrupted:
+            entry.prompt = ""
+        finally:
+            entry.seconds = time.perf_counter() - started
+            entry.created = time.monotonic()
+            with self._lock:
+                if entry.prompt:
+                    self.prefetched += 1
+                else:
+                    self.failed += 1
+                    self._entries.pop(key, None)
+            entry.done.set()
+
+    def format_stats(self) -> str:
+        """One-line summary for status output."""
+        with self._lock:
+            waiting = sum(1 for e in self._entries.values() if e.done.is_set())
+            running = len(self._entries) - waiting
+            return (
+                f"[Lookahead] {self.hits}/{self.prefetched} prefetched expansions used, "
+                f"{waiting} waiting, {running} generating, {self.failed} failed"
+            )
+
+
+# Process-wide prefetcher instance
+_lookahead = LookaheadPrefetcher()
+
+
+def get_lookahead() -> LookaheadPrefetcher:
+    """Get the process-wide lookahead prefetcher."""
+    return _lookahead
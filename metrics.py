@@ -0,0 +1,269 @@
+"""
+Z-Forge Metrics
+Latency and throughput instrumentation in Prometheus text format.
+
+Features:
+- Per-stage duration histograms labelled by model and template
+- Token counters (in/out) and tokens/sec histograms
+- p50/p95 estimates from the histogram buckets
+- Rendered at /zforge/metrics (see server_routes)
+"""
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger("ZForge")
+
+# Pipeline stages with duration histograms
+STAGES = (
+    "config_parse",
+    "randomize",
+    "yaml_build",
+    "client_connect",
+    "model_load",
+    "ttft",
+    "generation",
+    "unload",
+)
+
+# Bucket upper bounds (seconds) for stage durations
+DURATION_BUCKETS = (
+    0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0,
+)
+
+# Bucket upper bounds for generation speed
+TOKENS_PER_SECOND_BUCKETS = (1, 2.5, 5, 10, 15, 20, 30, 40, 60, 80, 100, 150, 200, 400)
+
+_HELP = {
+    "zforge_stage_duration_seconds": ("histogram", "Duration of each prompt pipeline stage"),
+    "zforge_tokens_per_second": ("histogram", "LLM generation speed"),
+    "zforge_tokens_total": ("counter", "Tokens processed by the LLM (direction=in|out)"),
+    "zforge_requests_total": ("counter", "LLM expansion requests by outcome"),
+}
+
+LabelSet = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile by linear interpolation within buckets (like histogram_quantile)."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts, strict=True):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.buckets[-1]  # Above the largest bucket
+
+
+# muted() without names
+_ALL = frozenset({"*"})
+
+
+def _labels(**labels: Optional[str]) -> LabelSet:
+    return tuple(sorted((key, str(value or "")) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_number(value: float) -> str:
+    """Sample value or bucket bound without losing precision (integers stay integers)."""
+    if isinstance(value, int) or (math.isfinite(value) and value.is_integer()):
+        return str(int(value))
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+def _format_labels(labels: LabelSet, extra: Optional[tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class MetricsRegistry:
+    """Thread-safe store of histograms and counters keyed by metric name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: dict[str, dict[LabelSet, Histogram]] = {}
+        self._counters: dict[str, dict[LabelSet, float]] = {}
+        self._muted = threading.local()
+
+    @contextmanager
+    def muted(self, *names: str) -> Iterator[None]:
+        """
+        Drop the current thread's observations of the named metrics (all if none) in the block.
+
+        Background work that repeats what an execution records itself (the
+        lookahead's copy of a build, say) uses this so nothing is counted twice.
+        """
+        previous = getattr(self._muted, "names", None)
+        self._muted.names = frozenset(names) or _ALL
+        try:
+            yield
+        finally:
+            self._muted.names = previous
+
+    def _is_muted(self, name: str) -> bool:
+        names = getattr(self._muted, "names", None)
+        return names is not None and (names is _ALL or name in names)
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: tuple[float, ...] = DURATION_BUCKETS,
+        **labels: Optional[str],
+    ) -> None:
+        """Record a histogram observation."""
+        if self._is_muted(name):
+            return
+        key = _labels(**labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: Optional[str]) -> None:
+        """Increment a counter."""
+        if self._is_muted(name):
+            return
+        key = _labels(**labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe_stage(
+        self, stage: str, seconds: float, model: Optional[str] = None, template: Optional[str] = None
+    ) -> None:
+        """Record the duration of a pipeline stage."""
+        self.observe(
+            "zforge_stage_duration_seconds", seconds, stage=stage, model=model, template=template
+        )
+
+    @contextmanager
+    def time_stage(
+        self, stage: str, model: Optional[str] = None, template: Optional[str] = None
+    ) -> Iterator[None]:
+        """Context manager that records how long its block took as a stage."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started, model, template)
+
+    def record_generation(
+        self,
+        model: Optional[str],
+        template: Optional[str],
+        tokens_in: Optional[int],
+        tokens_out: Optional[int],
+        tokens_per_second: Optional[float],
+    ) -> None:
+        """Record token counts and speed for one generation (None values are skipped)."""
+        if tokens_in is not None:
+            self.inc("zforge_tokens_total", tokens_in, direction="in", model=model, template=template)
+        if tokens_out is not None:
+            self.inc("zforge_tokens_total", tokens_out, direction="out", model=model, template=template)
+        if tokens_per_second:
+            self.observe(
+                "zforge_tokens_per_second",
+                tokens_per_second,
+                buckets=TOKENS_PER_SECOND_BUCKETS,
+                model=model,
+                template=template,
+            )
+
+    def quantiles(self, name: str = "zforge_stage_duration_seconds") -> list[dict]:
+        """
+        p50/p95 estimates for every label set of a histogram.
+
+        Returns:
+            List of dicts with the labels plus count, p50 and p95
+        """
+        with self._lock:
+            series = dict(self._histograms.get(name, {}))
+            return [
+                {
+                    **dict(labels),
+                    "count": histogram.count,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                }
+                for labels, histogram in sorted(series.items())
+            ]
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                kind, help_text = _HELP.get(name, ("histogram", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts, strict=True):
+                        cumulative += count
+                        lines.append(
+                            f"{name}_bucket{_format_labels(labels, ('le', _format_number(bound)))} {cumulative}"
+                        )
+                    lines.append(
+                        f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}"
+                    )
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+            for name, series in sorted(self._counters.items()):
+                kind, help_text = _HELP.get(name, ("counter", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Drop all recorded metrics."""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+# Process-wide metrics instance
+_metrics = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get the process-wide metrics registry."""
+    return _metrics
@@ -3,23 +3,77 @@ Z-Forge Model Fetcher
 Fetches available models from LM Studio server using the EA_LMStudio pattern.
 
 Features:
-- Cached model list with manual refresh
+- Model lists cached per server URL with a TTL
+- Stale-while-revalidate: stale lists are returned immediately and refreshed
+  on a background thread
+- Shared keep-alive HTTP session
+- Background discovery at startup (never blocks ComfyUI loading)
 - Graceful error handling
 - Custom model fallback option
 """
 import logging
-from typing import Optional
+import threading
+import time
+from typing import Any, Optional
+
+from .server_events import MODELS_UPDATED_EVENT, send_event
 
 logger = logging.getLogger("ZForge")
 
-# Module-level cache
-_cached_models: list[str] = []
-_last_fetch_error: Optional[str] = None
+# Seconds a cached model list is considered fresh
+MODEL_CACHE_TTL = 60.0
+
+# Background discovery state
+DISCOVERY_IDLE = "idle"
+DISCOVERY_PENDING = "pending"
+DISCOVERY_READY = "ready"
+DISCOVERY_FAILED = "failed"
+
+_discovery_state = DISCOVERY_IDLE
+_discovery_thread: Optional[threading.Thread] = None
 
 # Special option for custom model input
 CUSTOM_MODEL_OPTION = ">> Custom Model <<"
 
 
+class _ServerModels:
+    """Cached /v1/models result for one server."""
+
+    def __init__(self, models: list[str], error: Optional[str]):
+        self.models = models
+        self.error = error
+        self.fetched_at = time.monotonic()
+        self.revalidating = False
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+# Per-server cache, keyed by normalised server URL
+_server_cache: dict[str, _ServerModels] = {}
+_cache_lock = threading.Lock()
+
+# Shared keep-alive session (created on first use)
+_session: Any = None
+_session_lock = threading.Lock()
+
+
+def _normalize_url(server_url: str) -> str:
+    return server_url.rstrip("/")
+
+
+def _get_session() -> Any:
+    """Get the shared requests.Session, creating it on first use."""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+        return _session
+
+
 def fetch_models_from_server(
     server_url: str, timeout: float = 5.0
 ) -> tuple[list[str], Optional[str]]:
@@ -39,8 +93,8 @@ def fetch_models_from_server(
         return [], "requests library not installed"
 
     try:
-        endpoint = f"{server_url.rstrip('/')}/v1/models"
-        response = requests.get(endpoint, timeout=timeout)
+        endpoint = f"{_normalize_url(server_url)}/v1/models"
+        response = _get_session().get(endpoint, timeout=timeout)
         response.raise_for_status()
         data = response.json()
 
@@ -58,22 +112,84 @@ def fetch_models_from_server(
         return [], str(e)
 
 
-def get_model_choices() -> list[str]:
+def _store(server_url: str, models: list[str], error: Optional[str]) -> _ServerModels:
+    """Store a fetch result. Failed refreshes keep the last good model list."""
+    key = _normalize_url(server_url)
+    with _cache_lock:
+        previous = _server_cache.get(key)
+        if error and previous is not None and previous.models:
+            models = previous.models
+        entry = _ServerModels(models, error)
+        _server_cache[key] = entry
+    return entry
+
+
+def _revalidate(server_url: str, timeout: float) -> None:
+    """Background refresh body; pushes the new list to the frontend."""
+    models, error = fetch_models_from_server(server_url, timeout)
+    _store(server_url, models, error)
+    if not error:
+        send_event(MODELS_UPDATED_EVENT, {"server_url": server_url, "models": models})
+
+
+def get_server_models(
+    server_url: str, ttl: float = MODEL_CACHE_TTL, timeout: float = 5.0
+) -> tuple[list[str], Optional[str]]:
+    """
+    Get the model list for a server, serving from cache when possible.
+
+    The first request for a server fetches synchronously. After that the
+    cached list is always returned immediately; once it is older than ttl,
+    a background refresh is started (stale-while-revalidate).
+
+    Args:
+        server_url: Base URL of LM Studio server
+        ttl: Seconds a cached list is considered fresh
+        timeout: Request timeout for fetches
+
+    Returns:
+        Tuple of (list of model IDs, last error message or None)
+    """
+    key = _normalize_url(server_url)
+    with _cache_lock:
+        entry = _server_cache.get(key)
+        stale = entry is not None and entry.age() > ttl and not entry.revalidating
+        if stale:
+            entry.revalidating = True
+
+    if entry is None:
+        models, error = fetch_models_from_server(key, timeout)
+        entry = _store(key, models, error)
+    elif stale:
+        threading.Thread(
+            target=_revalidate,
+            args=(key, timeout),
+            name="zforge-model-revalidate",
+            daemon=True,
+        ).start()
+
+    return list(entry.models), entry.error
+
+
+def get_model_choices(server_url: Optional[str] = None) -> list[str]:
     """
     Get model choices for dropdown widget.
 
+    Args:
+        server_url: Limit to one server's models. If None, models from every
+            cached server are included so any node's selection validates.
+
     Returns:
         List with custom option first, followed by cached models
     """
     choices = [CUSTOM_MODEL_OPTION]
-    if _cached_models:
-        choices.extend(_cached_models)
+    choices.extend(get_cached_models(server_url))
     return choices
 
 
 def refresh_model_cache(server_url: str, timeout: float = 5.0) -> tuple[bool, str]:
     """
-    Refresh the model cache from server.
+    Refresh the model cache for a server immediately.
 
     Args:
         server_url: Base URL of LM Studio server
@@ -82,27 +198,40 @@ def refresh_model_cache(server_url: str, timeout: float = 5.0) -> tuple[bool, st
     Returns:
         Tuple of (success boolean, status message)
     """
-    global _cached_models, _last_fetch_error
-
     models, error = fetch_models_from_server(server_url, timeout)
+    _store(server_url, models, error)
 
     if error:
-        _last_fetch_error = error
         return False, error
-
-    _cached_models = models
-    _last_fetch_error = None
     return True, f"Found {len(models)} model(s)"
 
 
-def get_last_error() -> Optional[str]:
-    """Get the last fetch error, if any."""
-    return _last_fetch_error
+def get_last_error(server_url: Optional[str] = None) -> Optional[str]:
+    """Get the last fetch error for a server (or the most recent one), if any."""
+    with _cache_lock:
+        if server_url is not None:
+            entry = _server_cache.get(_normalize_url(server_url))
+            return entry.error if entry else None
+        entries = sorted(_server_cache.values(), key=lambda e: e.fetched_at)
+    return entries[-1].error if entries else None
+
+
+def get_cached_models(server_url: Optional[str] = None) -> list[str]:
+    """
+    Get the currently cached models without any network access.
 
+    Args:
+        server_url: One server's models, or None for all servers (deduplicated)
 
-def get_cached_models() -> list[str]:
-    """Get the currently cached models."""
-    return _cached_models.copy()
+    Returns:
+        List of model IDs
+    """
+    with _cache_lock:
+        if server_url is not None:
+            entry = _server_cache.get(_normalize_url(server_url))
+            return list(entry.models) if entry else []
+        models = [m for entry in _server_cache.values() for m in entry.models]
+    return list(dict.fromkeys(models))
 
 
 def initialize_model_cache(host: str = "127.0.0.1", port: int = 1234) -> None:
@@ -125,41 +254,96 @@ def initialize_model_cache(host: str = "127.0.0.1", port: int = 1234) -> None:
         logger.warning(f"Z-Forge model fetch: {msg}")
 
 
-def test_connection(host: str, port: int, timeout: float = 5.0) -> tuple[bool, str]:
+def _run_discovery(host: str, port: int) -> None:
+    """Discovery thread body: refresh the cache and notify the frontend."""
+    global _discovery_state
+
+    server_url = f"http://{host}:{port}"
+    success, msg = refresh_model_cache(server_url, timeout=3.0)
+
+    if success:
+        _discovery_state = DISCOVERY_READY
+        logger.info(f"Z-Forge: {msg}")
+        send_event(
+            MODELS_UPDATED_EVENT,
+            {"server_url": server_url, "models": get_cached_models(server_url)},
+        )
+    else:
+        _discovery_state = DISCOVERY_FAILED
+        logger.warning(f"Z-Forge model fetch: {msg}")
+
+
+def start_model_discovery(host: str = "127.0.0.1", port: int = 1234) -> None:
+    """
+    Start model discovery on a background thread.
+
+    Called when ComfyUI loads the extension so that node registration never
+    waits on LM Studio. When discovery finishes, the model list is pushed to
+    the frontend via the zforge-models-updated event.
+
+    Args:
+        host: LM Studio server host
+        port: LM Studio server port
+    """
+    global _discovery_state, _discovery_thread
+
+    if _discovery_thread is not None and _discovery_thread.is_alive():
+        return
+
+    _discovery_state = DISCOVERY_PENDING
+    _discovery_thread = threading.Thread(
+        target=_run_discovery,
+        args=(host, port),
+        name="zforge-model-discovery",
+        daemon=True,
+    )
+    _discovery_thread.start()
+
+
+def get_discovery_state() -> str:
+    """Get the background discovery state: idle, pending, ready or failed."""
+    return _discovery_state
+
+
+def is_discovery_ready() -> bool:
+    """Check whether background discovery has populated the model cache."""
+    return _discovery_state == DISCOVERY_READY
+
+
+def test_connection(
+    host: str, port: int, timeout: float = 5.0, ttl: float = MODEL_CACHE_TTL
+) -> tuple[bool, str]:
     """
     Test connection to LM Studio server.
 
+    Successful results are served from the per-server cache (stale ones
+    trigger a background revalidation). Cached failures are re-checked
+    live, so a server that just came up is detected immediately.
+
     Args:
         host: Server host
         port: Server port
         timeout: Request timeout
+        ttl: Seconds a cached result is considered fresh
 
     Returns:
         Tuple of (success boolean, status message)
     """
-    try:
-        import requests
-    except ImportError:
-        return False, "requests library not installed"
-
     server_url = f"http://{host}:{port}"
-
-    try:
-        # Try to hit the models endpoint
-        endpoint = f"{server_url}/v1/models"
-        response = requests.get(endpoint, timeout=timeout)
-        response.raise_for_status()
-
-        data = response.json()
-        model_count = len(data.get("data", []))
-
-        return True, f"Connected! {model_count} model(s) available"
-
-    except requests.exceptions.ConnectionError:
+    with _cache_lock:
+        was_cached = _normalize_url(server_url) in _server_cache
+    models, error = get_server_models(server_url, ttl=ttl, timeout=timeout)
+    # A server seen for the first time was just fetched live - don't wait twice
+    if error is not None and was_cached:
+        models, error = fetch_models_from_server(server_url, timeout)
+        _store(server_url, models, error)
+
+    if error is None:
+        return True, f"Connected! {len(models)} model(s) available"
+    if error.startswith("Connection refused"):
         return False, f"Cannot connect to {server_url} - is LM Studio running?"
-    except requests.exceptions.Timeout:
-        return False, f"Connection timed out after {timeout}s"
-    except requests.exceptions.HTTPError as e:
-        return False, f"Server error: {e.response.status_code}"
-    except Exception as e:
-        return False, f"Error: {e}"
+    if error.startswith("HTTP error"):
+        return False, f"Server error: {error.split(': ', 1)[-1]}"
+    if error.startswith("Connection timed out") or error.endswith("not installed"):
+        return False, error
+    return False, f"Error: {error}"
@@ -0,0 +1,249 @@
+"""
+Z-Forge Model Residency Manager
+Keeps LM Studio models loaded while they are in use and unloads them once idle.
+
+Features:
+- Reference counting for concurrent users of the same model; an acquire()
+  racing an unload waits for it and then reloads
+- Idle TTL: unload only after N seconds without requests
+- Keep-warm policy while the ComfyUI queue is non-empty
+- Load status from the server's loaded-model list, so a model unloaded
+  outside Z-Forge is loaded again through a fresh handle
+- Load/unload events and reload latency for status output
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+from .lm_client_pool import get_client_pool
+from .metrics import get_metrics
+
+logger = logging.getLogger("ZForge")
+
+# Seconds between re-checks while a model is kept warm for a busy queue
+KEEP_WARM_RECHECK = 5.0
+
+
+def queue_is_busy() -> bool:
+    """Check whether ComfyUI has prompts running or pending (False outside ComfyUI)."""
+    try:
+        from server import PromptServer
+    except ImportError:
+        return False
+    try:
+        return PromptServer.instance.prompt_queue.get_tasks_remaining() > 0
+    except Exception:
+        return False
+
+
+class _Residency:
+    """Usage state for one model on one server."""
+
+    def __init__(self):
+        self.refcount = 0
+        self.timer: Optional[threading.Timer] = None
+        self.unloaded_by_us = False
+        self.unloading: Optional[threading.Event] = None  # Set while an unload is in progress
+
+
+class ModelResidencyManager:
+    """
+    Tracks who is using which model and decides when to unload it.
+
+    Callers acquire() a model before generating and release() it afterwards.
+    The model is unloaded only when nobody holds it and it has been idle for
+    the configured TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: dict[tuple[str, str], _Residency] = {}
+        self.loads = 0
+        self.reloads = 0
+        self.unloads = 0
+        self.last_load_seconds: Optional[float] = None
+        self.events: deque[str] = deque(maxlen=20)
+
+    def _state(self, key: tuple[str, str]) -> _Residency:
+        state = self._models.get(key)
+        if state is None:
+            state = self._models[key] = _Residency()
+        return state
+
+    def _record(self, message: str) -> None:
+        self.events.append(f"{time.strftime('%H:%M:%S')} {message}")
+        logger.info(f"Z-Forge: {message}")
+
+    def acquire(self, server_address: str, model_id: Optional[str]) -> tuple[Any, Optional[str]]:
+        """
+        Take a reference on a model and return its handle, loading it if needed.
+
+        Args:
+            server_address: "host:port" of the LM Studio server
+            model_id: Model identifier, or None/empty for the currently loaded model
+
+        Returns:
+            Tuple of (model handle, load status line or None if the server
+            already had the model loaded)
+        """
+        key = (server_address, model_id or "")
+        pool = get_client_pool()
+
+        while True:
+            with self._lock:
+                state = self._state(key)
+                unloading = state.unloading
+                if unloading is None:
+                    state.refcount += 1
+                    first_user = state.refcount == 1
+                    if state.timer is not None:
+                        state.timer.cancel()
+                        state.timer = None
+                    break
+            # The cached handle is being unloaded - wait, then load it again
+            unloading.wait()
+
+        try:
+            # Another holder means the model is resident; otherwise ask the server
+            was_loaded = self._is_loaded(server_address, model_id) if first_user else True
+            if was_loaded is False:
+                # A handle cached before the model was unloaded would not load it again
+                pool.forget_model(server_address, model_id)
+            started = time.perf_counter()
+            model = pool.get_model(server_address, model_id)
+        except Exception:
+            with self._lock:
+                state.refcount -= 1
+            raise
+
+        if was_loaded is not False:
+            return model, None
+
+        seconds = time.perf_counter() - started
+        name = model_id or "current model"
+        with self._lock:
+            self.loads += 1
+            self.last_load_seconds = seconds
+            reload = state.unloaded_by_us
+            state.unloaded_by_us = False
+            if reload:
+                self.reloads += 1
+        kind = "Reloaded" if reload else "Loaded"
+        self._record(f"{kind} {name} in {seconds:.2f}s")
+        return model, f"[Residency] {kind} {name} in {seconds:.2f}s"
+
+    @staticmethod
+    def _is_loaded(server_address: str, model_id: Optional[str]) -> Optional[bool]:
+        """Whether the server has the model loaded (None if its models could not be listed)."""
+        loaded = get_client_pool().loaded_models(server_address)
+        if loaded is None:
+            return None
+        return model_id in loaded if model_id else bool(loaded)
+
+    def release(
+        self,
+        server_address: str,
+        model_id: Optional[str],
+        idle_ttl: Optional[float],
+        keep_warm_while_queued: bool = True,
+    ) -> str:
+        """
+        Drop a reference and schedule an unload once the model is idle.
+
+        Args:
+            server_address: "host:port" of the LM Studio server
+            model_id: Model identifier, or None/empty for the currently loaded model
+            idle_ttl: Seconds of idleness before unloading (0 = immediately, None = never)
+            keep_warm_while_queued: Postpone the unload while ComfyUI has queued prompts
+
+        Returns:
+            Status line describing what will happen to the model
+        """
+        key = (server_address, model_id or "")
+
+        with self._lock:
+            state = self._state(key)
+            state.refcount = max(0, state.refcount - 1)
+            if state.refcount > 0:
+                return f"[Residency] Kept loaded ({state.refcount} other user(s))"
+            if idle_ttl is None:
+                return "[Residency] Kept loaded (unload disabled)"
+            if idle_ttl > 0:
+                self._schedule(key, state, idle_ttl, keep_warm_while_queued)
+                policy = ", kept warm while queue is busy" if keep_warm_while_queued else ""
+                return f"[Residency] Unload after {idle_ttl:g}s idle{policy}"
+
+        if self._unload(key):
+            return "[LLM] Model unloaded"
+        return "[Residency] Nothing to unload"
+
+    def _schedule(
+        self, key: tuple[str, str], state: _Residency, delay: float, keep_warm: bool
+    ) -> None:
+        """Start the idle timer (caller holds the lock)."""
+        timer = threading.Timer(delay, self._on_idle, args=(key, keep_warm))
+        timer.daemon = True
+        state.timer = timer
+        timer.start()
+
+    def _on_idle(self, key: tuple[str, str], keep_warm: bool) -> None:
+        with self._lock:
+            state = self._models.get(key)
+            if state is None or state.refcount > 0 or state.timer is None:
+                return
+            if state.timer is not threading.current_thread():
+                return  # Superseded by a newer timer
+            state.timer = None
+            if keep_warm and queue_is_busy():
+                self._schedule(key, state, KEEP_WARM_RECHECK, keep_warm)
+                return
+        self._unload(key)
+
+    def _unload(self, key: tuple[str, str]) -> bool:
+        """Unload a model nobody holds; acquire() calls meanwhile wait for it to finish."""
+        server_address, model_id = key
+        name = model_id or "current model"
+        with self._lock:
+            state = self._state(key)
+            if state.refcount > 0 or state.unloading is not None:
+                return False  # Acquired again (or already unloading) since the check
+            done = state.unloading = threading.Event()
+
+        unloaded = False
+        started = time.perf_counter()
+        try:
+            unloaded = get_client_pool().unload_model(server_address, model_id or None)
+        except Exception as e:
+            self._record(f"Unload of {name} failed: {e}")
+        finally:
+            with self._lock:
+                state.unloading = None
+                if unloaded:
+                    self.unloads += 1
+                    state.unloaded_by_us = True
+            done.set()
+
+        if unloaded:
+            get_metrics().observe_stage(
+                "unload", time.perf_counter() - started, model=model_id or "current"
+            )
+            self._record(f"Unloaded {name} after idle")
+        return unloaded
+
+    def format_stats(self) -> str:
+        """One-line summary of load/unload activity for status output."""
+        line = f"[Residency] {self.loads} load(s), {self.reloads} reload(s), {self.unloads} unload(s)"
+        if self.last_load_seconds is not None:
+            line += f", last load {self.last_load_seconds:.2f}s"
+        return line
+
+
+# Process-wide manager instance
+_manager = ModelResidencyManager()
+
+
+def get_residency_manager() -> ModelResidencyManager:
+    """Get the process-wide model residency manager."""
+    return _manager
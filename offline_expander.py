@@ -0,0 +1,476 @@
+"""
+Z-Forge Offline Expander
+Deterministic rule-based prompt expansion (no LLM).
+
+Features:
+- Turns the build_yaml_from_widgets fields into flowing prose
+- Body type and fantasy race presets expanded from the template tables
+  (body types missing from a template come from the other genre's template)
+- Gender-aware pronouns and verb agreement (she/he/they); non-binary,
+  unspecified and custom genders get neutral body type expansions
+- Same variables always give the same prompt, in well under a millisecond
+- Keyword pre-expansion of variables before LLM generation
+"""
+import logging
+import re
+import time
+
+from .presets import BODY_TYPES_ALL
+from .template_tables import (
+    NEUTRAL_COLUMN,
+    NEUTRAL_FORMS,
+    GenderForms,
+    TemplateTables,
+    get_template_tables,
+    parse_template_tables,
+)
+from .yaml_builder import (
+    format_value,
+    is_empty,
+    parse_variables,
+    plain_value,
+    subject_index,
+    variable_lines,
+)
+
+logger = logging.getLogger("ZForge")
+
+# Templates used for tables the selected one lacks
+FANTASY_TEMPLATE_NAME = "v3_fantasy_system_prompt"
+REALISTIC_TEMPLATE_NAME = "v3_system_prompt"
+
+# Body type keywords that must never appear literally in the prose
+_PRESET_BODY_TYPES = {body.lower() for body in BODY_TYPES_ALL}
+
+ORDINALS = {1: "first", 2: "second", 3: "third"}
+
+# Clothing words that take no article ("wears leather armor")
+MASS_NOUNS = {
+    "armor",
+    "armour",
+    "attire",
+    "clothing",
+    "feet",
+    "garb",
+    "gear",
+    "leather",
+    "paint",
+    "wear",
+}
+
+# Words that end the head noun of a clothing phrase ("hoodie and joggers")
+_GARMENT_SPLIT = re.compile(r",| and | with | over | on ")
+
+# Nouns that name a person on their own in custom gender text ("trans woman")
+_PERSON_NOUNS = {"woman", "man", "person", "girl", "boy", "lady", "guy", "individual", "figure"}
+
+_GENDERED_WORDS = re.compile(r"\b(woman|man|person|her|his|their|him|them)\b")
+
+
+def _clean(value: str) -> str:
+    """Strip YAML quoting (and line breaks) from a value."""
+    return plain_value(value)
+
+
+def _article(word: str) -> str:
+    """Indefinite article for a word ("an" before vowel sounds, including 8/11/18)."""
+    lower = word.lower()
+    if lower[:1] in "aeiou" or lower.startswith(("8", "11-", "18-")):
+        return "an"
+    return "a"
+
+
+def _with_article(phrase: str) -> str:
+    """Prefix a noun phrase with an article unless it already has a determiner."""
+    first = phrase.split(" ", 1)[0].lower()
+    if first in ("a", "an", "the", "their", "his", "her", "its"):
+        return phrase
+    return f"{_article(phrase)} {phrase}"
+
+
+def _garment(phrase: str) -> str:
+    """Article for a clothing item unless its head noun is plural or a mass noun ("boots")."""
+    head = _GARMENT_SPLIT.split(phrase, 1)[0].split()
+    last = head[-1].lower() if head else ""
+    if not last or last.endswith("s") or last in MASS_NOUNS:
+        return phrase
+    return _with_article(phrase)
+
+
+def _sentence(text: str) -> str:
+    """Capitalize and terminate a sentence."""
+    text = text.strip().rstrip(".")
+    return text[:1].upper() + text[1:] + "." if text else ""
+
+
+def _join(items: list[str]) -> str:
+    """Join phrases as "a, b and c"."""
+    items = [item for item in items if item]
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def _verb(forms: GenderForms, singular: str, plural: str) -> str:
+    return plural if forms.plural else singular
+
+
+def _adapt(text: str, forms: GenderForms) -> str:
+    """Rewrite a table expansion's nouns and pronouns for the subject's gender."""
+    replacements = {
+        "woman": forms.noun,
+        "man": forms.noun,
+        "person": forms.noun,
+        "her": forms.possessive,
+        "his": forms.possessive,
+        "their": forms.possessive,
+        "him": forms.object,
+        "them": forms.object,
+    }
+    return _GENDERED_WORDS.sub(lambda m: replacements[m.group(1)], text)
+
+
+def _gender_forms(gender: str, tables: TemplateTables) -> tuple[GenderForms, str]:
+    """Forms for a gender value and the body type column to use."""
+    gender = gender.lower()
+    forms = tables.genders.get(gender)
+    if forms is None:
+        if gender in ("female", "male"):
+            forms = GenderForms(
+                noun="woman" if gender == "female" else "man",
+                subject="she" if gender == "female" else "he",
+                object="her" if gender == "female" else "him",
+                possessive="her" if gender == "female" else "his",
+            )
+        elif is_empty(gender) or gender == "non-binary":
+            forms = NEUTRAL_FORMS
+        else:
+            # Custom gender text describes the person ("genderfluid" -> "genderfluid person")
+            noun = gender if gender.split()[-1] in _PERSON_NOUNS else f"{gender} person"
+            forms = GenderForms(noun, "they", "them", "their")
+    column = gender if gender in ("female", "male") else NEUTRAL_COLUMN
+    return forms, column
+
+
+def _gaze_clause(gaze: str, forms: GenderForms) -> str:
+    """Turn a gaze value into a clause ("eyes closed" -> "her eyes are closed")."""
+    he, his = forms.subject, forms.possessive
+    words = gaze.split()
+    if words[0].lower() == "looking":
+        return f"{he} {_verb(forms, 'is', 'are')} {gaze}"
+    if words[0].lower() == "eyes" and len(words) > 1:
+        return f"{his} eyes are {' '.join(words[1:])}"
+    if words[-1].lower() == "eyes" and len(words) > 1:
+        return f"{his} eyes are {' '.join(words[:-1])}"
+    if words[-1].lower() == "glance":
+        return f"{he} {_verb(forms, 'casts', 'cast')} {_with_article(gaze)}"
+    return f"{his} gaze is {gaze}"
+
+
+def _age_parts(age: str) -> tuple[str, str]:
+    """Split an age into an adjective ("28-year-old") or a trailing phrase ("in her late 20s")."""
+    if not age:
+        return "", ""
+    if age.isdigit():
+        return f"{age}-year-old", ""
+    return "", age
+
+
+def _describe_subject(
+    fields: dict[str, str], tables: TemplateTables, index: int, subjects: int
+) -> list[str]:
+    """Build the sentences describing one subject."""
+    get = lambda name: "" if is_empty(fields.get(name, "")) else _clean(fields[name])  # noqa: E731
+
+    forms, column = _gender_forms(get("gender"), tables)
+    he = forms.subject.capitalize()
+    his = forms.possessive
+
+    ethnicity = get("ethnicity")
+    race = tables.race(ethnicity) if ethnicity else ""
+    age_adjective, age_phrase = _age_parts(get("age"))
+    adjectives = " ".join(part for part in (age_adjective, "" if race else ethnicity) if part)
+
+    # Opening: body type expansion (or a plain noun) with age and ethnicity worked in
+    body = get("body_type")
+    expansion = tables.body_type(body, column) if body else ""
+    if expansion:
+        opening = _adapt(expansion, forms)
+        noun = re.search(rf"\b{re.escape(forms.noun)}\b", opening)
+        if noun and adjectives:
+            opening = f"{opening[:noun.start()]}{adjectives} {opening[noun.start():]}"
+        if opening.startswith(("a ", "an ")):
+            rest = opening.split(" ", 1)[1]
+            opening = f"{_article(rest)} {rest}"
+    else:
+        descriptor = " ".join(part for part in (adjectives, forms.noun) if part)
+        opening = f"{_article(descriptor)} {descriptor}"
+        if body and body.lower() not in _PRESET_BODY_TYPES:
+            # Custom text reads as a build; an unexpanded preset would leak its keyword
+            opening += f" with {_with_article(body)} build"
+    if age_phrase:
+        opening = opening.replace(
+            f" {forms.noun}", f" {forms.noun} in {his} {age_phrase}", 1
+        )
+
+    if subjects > 1:
+        sentences = [_sentence(f"The {ORDINALS.get(index, str(index))} figure is {opening}")]
+    else:
+        sentences = [_sentence(opening)]
+
+    if race:
+        sentences.append(_sentence(f"{he} {_verb(forms, 'is', 'are')} {_adapt(race, forms)}"))
+
+    # Appearance
+    appearance = []
+    if get("hair"):
+        appearance.append(get("hair"))
+    if get("skin_texture"):
+        appearance.append(f"{get('skin_texture')} skin")
+    if get("skin_details"):
+        appearance.append(get("skin_details"))
+    if appearance:
+        sentences.append(_sentence(f"{he} {_verb(forms, 'has', 'have')} {_join(appearance)}"))
+    if get("face"):
+        sentences.append(_sentence(f"{his} face is {get('face')}"))
+
+    expression = []
+    if get("expression"):
+        expression.append(f"{his} expression is {get('expression')}")
+    if get("gaze"):
+        expression.append(_gaze_clause(get("gaze"), forms))
+    if expression:
+        sentences.append(_sentence(", ".join(expression)))
+
+    # Clothing
+    outfit = _garment(get("outfit")) if get("outfit") else ""
+    extras = _join([_garment(item) for item in (get("accessories"), get("footwear")) if item])
+    if outfit or extras:
+        # "a hoodie and joggers with sneakers" - avoids chaining "and"s
+        worn = f"{outfit} with {extras}" if outfit and extras else outfit or extras
+        sentences.append(_sentence(f"{he} {_verb(forms, 'wears', 'wear')} {worn}"))
+
+    # Pose
+    pose = [f"{his} pose is {get('pose')}" if get("pose") else "", get("hands")]
+    if any(pose):
+        sentences.append(_sentence(", ".join(p for p in pose if p)))
+    if get("extras"):
+        sentences.append(_sentence(get("extras")))
+    return sentences
+
+
+def _camera_phrase(angle: str) -> str:
+    if angle.lower() == "eye level":
+        return "at eye level"
+    if angle.lower().split()[-1] in ("angle", "view", "perspective"):
+        return f"from {_article(angle)} {angle}"
+    # "bird's eye", "over-the-shoulder" and custom angles need a noun
+    return f"from {_article(angle)} {angle} view"
+
+
+def expand_variables(yaml_text: str, tables: TemplateTables) -> str:
+    """
+    Expand YAML variables into a prose prompt without an LLM.
+
+    Args:
+        yaml_text: YAML variables as produced by build_yaml_from_widgets
+        tables: Expansion tables from the system prompt template
+
+    Returns:
+        Prose prompt (one paragraph)
+    """
+    values: dict[str, str] = {}
+    subject_fields: dict[int, dict[str, str]] = {1: {}, 2: {}, 3: {}}
+    for key, value in parse_variables(yaml_text):
+        index = subject_index(key)
+        if index > 1:
+            subject_fields.setdefault(index, {})[key[3:]] = value
+        else:
+            values[key] = value
+            subject_fields[1][key] = value
+
+    get = lambda name: "" if is_empty(values.get(name, "")) else _clean(values[name])  # noqa: E731
+    try:
+        subjects = max(1, min(3, int(values.get("subjects", "1"))))
+    except ValueError:
+        subjects = 1
+
+    sentences: list[str] = []
+    for index in range(1, subjects + 1):
+        sentences.extend(_describe_subject(subject_fields.get(index, {}), tables, index, subjects))
+
+    if subjects > 1 and get("interaction"):
+        sentences.append(_sentence(get("interaction")))
+    if get("action"):
+        sentences.append(_sentence(get("action")))
+
+    # Scene
+    if get("location"):
+        sentences.append(_sentence(f"The scene unfolds in {_with_article(get('location'))}"))
+    when = []
+    if get("time"):
+        when.append(f"it is {get('time')}")
+    if get("weather"):
+        when.append(f"the weather {get('weather')}")
+    if when:
+        sentences.append(_sentence(", ".join(when)))
+    if get("era"):
+        sentences.append(_sentence(f"The setting evokes the {get('era')} era"))
+    if get("atmosphere"):
+        sentences.append(_sentence(f"The mood is {get('atmosphere')}"))
+    if get("props"):
+        sentences.append(_sentence(f"Nearby are {get('props')}"))
+    if get("background"):
+        sentences.append(_sentence(f"In the background, {get('background')}"))
+    if get("story"):
+        sentences.append(_sentence(get("story")))
+    if get("lighting"):
+        sentences.append(_sentence(f"The scene is lit by {get('lighting')}"))
+
+    # Composition
+    shot = []
+    if get("framing"):
+        framing = get("framing")
+        shot.append(framing if framing.lower().endswith("shot") else f"{framing} shot")
+    if get("camera_angle"):
+        shot.append(_camera_phrase(get("camera_angle")))
+    if shot:
+        sentences.append(_sentence(" ".join(shot)))
+
+    return " ".join(s for s in sentences if s)
+
+
+def get_offline_tables(system_prompt: str, genre: str) -> TemplateTables:
+    """
+    Get the expansion tables for offline mode.
+
+    Args:
+        system_prompt: Resolved system prompt (its tables are used when present)
+        genre: "realistic" or "fantasy" (fantasy falls back to the fantasy template's races)
+
+    Returns:
+        TemplateTables
+    """
+    tables = parse_template_tables(system_prompt)
+    fantasy = get_template_tables(FANTASY_TEMPLATE_NAME)
+    realistic = get_template_tables(REALISTIC_TEMPLATE_NAME)
+    own, other = (fantasy, realistic) if genre == "fantasy" else (realistic, fantasy)
+
+    # Body types the template lacks (e.g. dad-bod in fantasy) come from the
+    # genre's own template first, then the other genre's
+    body_types = {**other.body_types, **own.body_types, **tables.body_types}
+    races = tables.races
+    if genre == "fantasy" and not races:
+        races = fantasy.races
+    return TemplateTables(
+        genders=tables.genders or own.genders, body_types=body_types, races=races
+    )
+
+
+def expand_offline(
+    system_prompt: str, yaml_text: str, genre: str = "realistic"
+) -> tuple[str, str]:
+    """
+    Expand variables with the rule-based engine.
+
+    Args:
+        system_prompt: Resolved system prompt whose tables drive the expansion
+        yaml_text: YAML variables
+        genre: "realistic" or "fantasy"
+
+    Returns:
+        Tuple of (prompt, status line)
+    """
+    started = time.perf_counter()
+    prompt = expand_variables(yaml_text, get_offline_tables(system_prompt, genre))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return prompt, f"[Offline] Rule-based expansion: {len(prompt)} characters in {elapsed_ms:.2f}ms"
+
+
+# ═══════════════════════════════════════════════════════════════
+#                    KEYWORD PRE-EXPANSION
+# ═══════════════════════════════════════════════════════════════
+
+_VARIABLE_LINE = re.compile(r"^(\s*)([A-Za-z0-9_]+):\s*(.*)$")
+
+
+def preexpand_variables(yaml_text: str, tables: TemplateTables) -> tuple[str, list[str]]:
+    """
+    Replace preset keywords with their expansion text before the LLM sees them.
+
+    body_type keywords become the gender-specific expansion and fantasy race
+    keywords in ethnicity become the race expansion, with pronouns adapted
+    to each subject. Everything else (comments, other fields) is unchanged.
+
+    Args:
+        yaml_text: YAML variables
+        tables: Expansion tables from the system prompt template
+
+    Returns:
+        Tuple of (YAML with expanded values, keywords that were replaced)
+    """
+    variables = variable_lines(yaml_text)
+    values = dict(variables.values())
+    replaced: list[str] = []
+    lines = []
+
+    for number, line in enumerate(yaml_text.splitlines()):
+        match = _VARIABLE_LINE.match(line)
+        # Continuation lines of multi-line values are never keywords
+        if not match or number not in variables or "\n" in variables[number][1]:
+            lines.append(line)
+            continue
+        indent, key, value = match.groups()
+        index = subject_index(key)
+        prefix = key[:3] if index > 1 else ""
+        field = key[len(prefix):]
+        keyword = _clean(value)
+
+        expansion = ""
+        if field in ("body_type", "ethnicity") and not is_empty(keyword):
+            forms, column = _gender_forms(_clean(values.get(f"{prefix}gender", "")), tables)
+            if field == "body_type":
+                expansion = tables.body_type(keyword, column)
+            else:
+                expansion = tables.race(keyword)
+            expansion = _adapt(expansion, forms) if expansion else ""
+
+        if expansion:
+            replaced.append(keyword)
+            lines.append(f"{indent}{key}: {format_value(expansion)}")
+        else:
+            lines.append(line)
+
+    return "\n".join(lines), replaced
+
+
+def preset_keywords(yaml_text: str) -> list[str]:
+    """Get the body_type values of the variables (candidates for keyword leakage)."""
+    return [
+        _clean(value)
+        for key, value in parse_variables(yaml_text)
+        if key.endswith("body_type") and not is_empty(value)
+    ]
+
+
+def find_leaked_keywords(prompt: str, keywords: list[str]) -> list[str]:
+    """
+    Find preset keywords that appear literally in a generated prompt.
+
+    Only keywords that are not ordinary words are checked (e.g. "SSBBW",
+    "dad-bod"), so legitimate uses such as "elf" or "curvy" are not flagged.
+
+    Args:
+        prompt: Generated prompt
+        keywords: Preset keywords used in the variables
+
+    Returns:
+        Keywords found in the prompt
+    """
+    leaked = []
+    for keyword in dict.fromkeys(keywords):
+        if not (keyword.isupper() or "-" in keyword):
+            continue
+        if re.search(rf"(?<![\w-]){re.escape(keyword)}(?![\w-])", prompt, re.IGNORECASE):
+            leaked.append(keyword)
+    return leaked
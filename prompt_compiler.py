@@ -0,0 +1,285 @@
+"""
+Z-Forge Prompt Compiler
+Relevance-pruned system prompts.
+
+Features:
+- Parses a markdown template into sections, subsections and table rows
+- Keeps only the gender, body type and race/ethnicity rows used by the variables
+- Follows alias rows ("use supersize expansion") to the row they refer to
+- Drops Female/Male expansion columns that no subject needs
+- Compiled prompts cached per template and key combination
+"""
+import logging
+import re
+from functools import lru_cache
+
+from .yaml_builder import is_empty, parse_variables, plain_value, subject_index
+
+logger = logging.getLogger("ZForge")
+
+# Section heading markers and the variable their rows are keyed by
+SECTION_FIELDS = {
+    "GENDER": "gender",
+    "BODY TYPE": "body_type",
+    "RACE": "ethnicity",
+    "ETHNICITY": "ethnicity",
+}
+
+# Subsections without tables that only apply to one gender
+GENDER_SUBSECTIONS = {"non-binary": "non-binary"}
+
+# Genders with their own expansion column
+GENDER_COLUMNS = ("female", "male")
+
+_ALIAS_PATTERN = re.compile(r"use (\S+) expansion", re.IGNORECASE)
+_KEYWORD_PATTERN = re.compile(r"`([^`]+)`")
+_LIST_LINE_PATTERN = re.compile(r"\*\*(.+?):\*\*\s*(.*)")
+
+# Compiled prompts kept per (template, genders, body types, ethnicities)
+COMPILE_CACHE_SIZE = 256
+
+
+def extract_prompt_keys(
+    yaml_text: str,
+) -> tuple[frozenset[str], frozenset[str], frozenset[str]]:
+    """
+    Collect the gender, body_type and ethnicity values of the active subjects.
+
+    Args:
+        yaml_text: YAML variables
+
+    Returns:
+        Tuple of (genders, body types, ethnicities), lowercased
+    """
+    pairs = parse_variables(yaml_text)
+    try:
+        subjects = int(dict(pairs).get("subjects", "1"))
+    except ValueError:
+        subjects = 1
+
+    found: dict[str, set[str]] = {"gender": set(), "body_type": set(), "ethnicity": set()}
+    for key, value in pairs:
+        index = subject_index(key)
+        field = key[3:] if index > 1 else key
+        if field in found and index <= subjects and not is_empty(value):
+            found[field].add(plain_value(value).lower())
+    return (
+        frozenset(found["gender"]),
+        frozenset(found["body_type"]),
+        frozenset(found["ethnicity"]),
+    )
+
+
+def _split(lines: list[str], marker: str) -> list[list[str]]:
+    """Split lines into chunks starting at each line with the given heading marker."""
+    chunks: list[list[str]] = [[]]
+    for line in lines:
+        if line.startswith(marker):
+            chunks.append([])
+        chunks[-1].append(line)
+    return chunks
+
+
+@lru_cache(maxsize=16)
+def parse_template(template: str) -> tuple[tuple[str, ...], ...]:
+    """
+    Parse a template into "## " sections (the first entry is the preamble).
+
+    Args:
+        template: Markdown template text
+
+    Returns:
+        Tuple of sections, each a tuple of lines
+    """
+    return tuple(tuple(chunk) for chunk in _split(template.split("\n"), "## "))
+
+
+def _cells(line: str) -> list[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _row_keywords(line: str) -> set[str]:
+    """Keywords a table row or "**Label:** a, b, c" line is selected by."""
+    if line.startswith("|"):
+        return {k.strip().lower() for k in _KEYWORD_PATTERN.findall(_cells(line)[0])}
+    match = _LIST_LINE_PATTERN.match(line)
+    if not match:
+        return set()
+    label, items = match.groups()
+    items = items.split("—")[0]
+    keywords = {label.strip().lower()}
+    for item in re.split(r"[,/]", items):
+        if item.strip():
+            keywords.add(item.strip().lower())
+    return keywords
+
+
+def _is_selectable(line: str) -> bool:
+    """Table body rows and bold-label list lines can be pruned."""
+    if line.startswith("|"):
+        first = _cells(line)[0]
+        return bool(_KEYWORD_PATTERN.search(first))
+    return bool(_LIST_LINE_PATTERN.match(line))
+
+
+def _wanted_keywords(lines: tuple[str, ...], values: frozenset[str]) -> set[str]:
+    """Requested values plus the rows that matching alias rows point to."""
+    wanted = set(values)
+    for line in lines:
+        if _is_selectable(line) and _row_keywords(line) & values:
+            wanted.update(ref.strip("`").lower() for ref in _ALIAS_PATTERN.findall(line))
+    return wanted
+
+
+def _gender_columns_to_drop(header: str, genders: frozenset[str]) -> set[int]:
+    """Indexes of Female/Male expansion columns that no subject needs."""
+    if not genders or not genders <= set(GENDER_COLUMNS):
+        return set()  # Non-binary/custom subjects blend both columns
+    drop = set()
+    for index, title in enumerate(_cells(header)):
+        name = title.lower()
+        for gender in GENDER_COLUMNS:
+            if name.startswith(gender) and gender not in genders:
+                drop.add(index)
+    return drop
+
+
+def _prune_chunk(
+    lines: list[str], wanted: set[str], genders: frozenset[str]
+) -> tuple[list[str], int, int]:
+    """
+    Prune selectable rows and unneeded gender columns in one chunk.
+
+    Returns:
+        Tuple of (lines, selectable rows kept, selectable rows seen)
+    """
+    out: list[str] = []
+    kept = seen = 0
+    drop_columns: set[int] = set()
+    table: list[str] = []
+
+    def flush_table() -> None:
+        # A table with no rows left is dropped together with its header
+        if any(_is_selectable(row) for row in table[2:]):
+            for row in table:
+                if not drop_columns:
+                    out.append(row)
+                    continue
+                cells = [c for i, c in enumerate(_cells(row)) if i not in drop_columns]
+                if all(set(c) <= set("-:") for c in cells):
+                    out.append("|" + "|".join(cells) + "|")
+                else:
+                    out.append("| " + " | ".join(cells) + " |")
+        table.clear()
+
+    for line in lines:
+        if line.startswith("|"):
+            if not table:
+                drop_columns = _gender_columns_to_drop(line, genders)
+            if _is_selectable(line):
+                seen += 1
+                if not _row_keywords(line) & wanted:
+                    continue
+                kept += 1
+            table.append(line)
+            continue
+        if table:
+            flush_table()
+        if _is_selectable(line):
+            seen += 1
+            if not _row_keywords(line) & wanted:
+                continue
+            kept += 1
+        out.append(line)
+    if table:
+        flush_table()
+    return out, kept, seen
+
+
+def _prune_section(
+    lines: tuple[str, ...], values: frozenset[str], genders: frozenset[str]
+) -> tuple[list[str], int, int]:
+    """Prune one "## " section keyed by a variable."""
+    wanted = _wanted_keywords(lines, values)
+    out: list[str] = []
+    kept = seen = 0
+
+    # Keep the trailing "---" separator even if the last subsection is dropped
+    body = list(lines)
+    tail: list[str] = []
+    while body and body[-1].strip() in ("", "---"):
+        tail.insert(0, body.pop())
+
+    for chunk in _split(body, "### "):
+        title = chunk[0].lower() if chunk and chunk[0].startswith("### ") else ""
+        gender = next((g for marker, g in GENDER_SUBSECTIONS.items() if marker in title), None)
+        if gender is not None and gender not in genders:
+            continue
+        pruned, chunk_kept, chunk_seen = _prune_chunk(chunk, wanted, genders)
+        kept += chunk_kept
+        seen += chunk_seen
+        if title and chunk_seen and not chunk_kept:
+            continue  # Subsection whose rows were all pruned
+        out.extend(pruned)
+
+    if not values and not kept:
+        return [], kept, seen  # Nothing in the variables uses this section
+    return out + tail, kept, seen
+
+
+@lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _compile(
+    template: str,
+    genders: frozenset[str],
+    body_types: frozenset[str],
+    ethnicities: frozenset[str],
+) -> tuple[str, int, int]:
+    values = {"gender": genders, "body_type": body_types, "ethnicity": ethnicities}
+    out: list[str] = []
+    kept = seen = 0
+
+    for section in parse_template(template):
+        heading = section[0].upper() if section else ""
+        field = next(
+            (f for marker, f in SECTION_FIELDS.items() if heading.startswith("## ") and marker in heading),
+            None,
+        )
+        if field is None:
+            out.extend(section)
+            continue
+        pruned, section_kept, section_seen = _prune_section(section, values[field], genders)
+        kept += section_kept
+        seen += section_seen
+        out.extend(pruned)
+
+    # Collapse the blank runs left behind by removed rows
+    text = re.sub(r"\n{3,}", "\n\n", "\n".join(out))
+    return text, kept, seen
+
+
+def compile_system_prompt(template: str, yaml_text: str) -> tuple[str, str]:
+    """
+    Compile a system prompt containing only the rows relevant to the variables.
+
+    Args:
+        template: Full system prompt template
+        yaml_text: Verbose YAML variables for this request
+
+    Returns:
+        Tuple of (pruned system prompt, status line)
+    """
+    genders, body_types, ethnicities = extract_prompt_keys(yaml_text)
+    prompt, kept, seen = _compile(template, genders, body_types, ethnicities)
+    if not seen:
+        return template, "[Prompt] Nothing to prune in this template"
+    saved = 100 * (len(template) - len(prompt)) / len(template)
+    return prompt, (
+        f"[Prompt] Pruned to {kept}/{seen} preset rows, "
+        f"~{(len(prompt) + 3) // 4} tokens ({saved:.0f}% smaller)"
+    )
+
+
+def compile_cache_info() -> str:
+    """One-line summary of the compiled prompt cache."""
+    info = _compile.cache_info()
+    return f"[Prompt] compiler cache: {info.hits} hit / {info.misses} miss"
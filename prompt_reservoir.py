@@ -0,0 +1,405 @@
+"""
+Z-Forge Prompt Reservoir
+Keeps pre-expanded random prompts ready for fully randomized runs.
+
+Features:
+- One pool per genre, fixed scene fields, template and model/sampling settings
+- Background refill up to the configured depth, paced by a refill rate and
+  only while no Z-Forge request is in flight on the pool's servers
+- A randomized Internal-mode run pops a ready (variables, image_prompt) pair
+  instead of randomizing and waiting for the LLM
+- Entries are made for the seeds the next runs will use, predicted from the
+  last two (increment, decrement or fixed), and only served to a run with that
+  seed, so a seed always gives the same variables; unpredictable seeds pause
+  refilling
+- Persisted to cache/reservoir.json, so ready prompts survive restarts
+"""
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+
+logger = logging.getLogger("ZForge")
+
+_RESERVOIR_PATH = os.path.join(os.path.dirname(__file__), "cache", "reservoir.json")
+
+# Seconds between refill checks
+POLL_INTERVAL = 0.5
+
+# Pools stop refilling when nothing has popped from them for this long
+DEMAND_WINDOW_SECONDS = 3600.0
+
+# Pools kept (least recently used dropped first)
+MAX_POOLS = 32
+
+# Steps between consecutive seeds that can be predicted (decrement, fixed, increment)
+PREDICTABLE_SEED_STEPS = (-1, 0, 1)
+
+# Runs in a row whose seed was not one the pool refilled for before refilling stops
+MAX_SEED_MISSES = 3
+
+# Prompt Builder inputs that are not randomized and so select the pool
+_POOL_INPUTS = (
+    "genre",
+    "people",
+    "aspect",
+    "props",
+    "background",
+    "action",
+    "story",
+    "interaction",
+    "system_prompt_override",
+)
+
+# LLMConfig fields that change the generated text
+_POOL_CONFIG_FIELDS = (
+    "backend",
+    "model",
+    "temperature",
+    "max_tokens",
+    "top_p",
+    "top_k",
+    "repeat_penalty",
+    "wire_format",
+    "prune_system_prompt",
+    "preexpand_keywords",
+    "system_prompt_template",
+    "system_prompt_hash",
+)
+
+
+def pool_key(inputs: dict[str, Any], config: Any) -> str:
+    """
+    Hash the inputs and settings that select a reservoir pool.
+
+    Args:
+        inputs: Prompt Builder inputs
+        config: LLMConfig of the run
+
+    Returns:
+        Hex digest
+    """
+    payload = {
+        **{name: inputs.get(name) for name in _POOL_INPUTS},
+        **{field: getattr(config, field) for field in _POOL_CONFIG_FIELDS},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Pool:
+    """Ready prompts for one pool key, plus what is needed to make more."""
+
+    def __init__(self):
+        self.entries: deque[dict[str, Any]] = deque()
+        self.depth = 0
+        self.refill_interval = 10.0
+        self.inputs: Optional[dict[str, Any]] = None  # Known once a run used this pool
+        self.hosts: tuple = ()
+        self.last_seed: Optional[int] = None
+        self.seed_step: Optional[int] = None  # None = the next seed cannot be predicted
+        self.seed_misses = 0
+        self.last_demand = time.time()
+        self.last_refill = 0.0
+
+    def observe_seed(self, seed: Optional[int]) -> None:
+        """Update the seed prediction with the seed of a run."""
+        if seed is None:
+            self.last_seed = self.seed_step = None
+            self.seed_misses = 0
+            return
+        predicted = self._predicted_seeds()
+        if seed in predicted:
+            self.seed_misses = 0
+        elif predicted and self.last_seed is not None:
+            self.seed_misses += 1
+        step = seed - self.last_seed if self.last_seed is not None else None
+        self.seed_step = step if step in PREDICTABLE_SEED_STEPS else None
+        self.last_seed = seed
+
+    def wanted_seeds(self) -> list[Optional[int]]:
+        """
+        Seeds the next runs are expected to use (None for workflows without a seed).
+
+        Empty until two runs showed how the seed changes, when it changes
+        unpredictably, and after MAX_SEED_MISSES runs in a row used other seeds.
+        """
+        if self.seed_misses >= MAX_SEED_MISSES:
+            return []
+        return self._predicted_seeds()
+
+    def _predicted_seeds(self) -> list[Optional[int]]:
+        if self.last_seed is None:
+            return [None] * self.depth
+        if self.seed_step is None:
+            return []
+        return [self.last_seed + self.seed_step * offset for offset in range(1, self.depth + 1)]
+
+    def missing_seeds(self) -> list[Optional[int]]:
+        """The wanted seeds that have no entry yet, in order."""
+        ready = [entry.get("seed") for entry in self.entries]
+        missing = []
+        for seed in self.wanted_seeds():
+            if seed in ready:
+                ready.remove(seed)
+            else:
+                missing.append(seed)
+        return missing
+
+
+class PromptReservoir:
+    """
+    Thread-safe store of pre-expanded prompts with a background refill worker.
+
+    Eligible runs call pop() and then register() with their inputs; the
+    worker uses the registered inputs to refill the pool.
+    """
+
+    def __init__(self, path: str = _RESERVOIR_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pools: dict[str, _Pool] = {}
+        self._loaded = False
+        self._dirty = False
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            for key, saved in data.get("pools", {}).items():
+                pool = self._pools[key] = _Pool()
+                pool.entries.extend(saved["entries"])
+                pool.last_demand = float(saved.get("last_demand", 0))
+                pool.last_seed = saved.get("last_seed")
+                pool.seed_step = saved.get("seed_step")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Z-Forge: ignoring unreadable prompt reservoir: {e}")
+
+    def _save(self) -> None:
+        """Write the reservoir to disk if it changed (called from the worker)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            data = {
+                "pools": {
+                    key: {
+                        "last_demand": pool.last_demand,
+                        "last_seed": pool.last_seed,
+                        "seed_step": pool.seed_step,
+                        "entries": list(pool.entries),
+                    }
+                    for key, pool in self._pools.items()
+                    if pool.entries
+                }
+            }
+        temp_path = f"{self.path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Z-Forge: failed to save prompt reservoir: {e}")
+
+    def pop(self, key: str, seed: Optional[int]) -> Optional[tuple[dict[str, Any], int]]:
+        """
+        Take a ready prompt made for a seed.
+
+        Args:
+            key: Pool key from pool_key()
+            seed: The run's seed (None for workflows without a seed input)
+
+        Returns:
+            Tuple of (entry, prompts left in the pool), or None if no entry has
+            that seed. Entries hold "seed", "randomized_values", "variables",
+            "llm_instructions", "image_prompt" and "status".
+        """
+        with self._lock:
+            self._ensure_loaded()
+            pool = self._pools.get(key)
+            entry = None
+            if pool is not None:
+                entry = next((e for e in pool.entries if e.get("seed") == seed), None)
+            if entry is None:
+                self.misses += 1
+                return None
+            pool.entries.remove(entry)
+            pool.last_demand = time.time()
+            self.hits += 1
+            self._dirty = True
+            return entry, len(pool.entries)
+
+    def register(
+        self,
+        key: str,
+        inputs: dict[str, Any],
+        hosts: tuple,
+        depth: int,
+        refills_per_minute: int,
+        seed: Optional[int] = None,
+    ) -> None:
+        """
+        Record demand for a pool and how to refill it, and start the worker.
+
+        Entries for seeds the next runs will no longer use are dropped.
+
+        Args:
+            key: Pool key from pool_key()
+            inputs: Prompt Builder inputs that produce one entry (reservoir disabled in their llm_config)
+            hosts: LLM servers of the pool, checked for idleness before refilling
+            depth: Ready prompts to keep
+            refills_per_minute: Maximum refill generations per minute
+            seed: The run's seed; refills use the seeds predicted from it and the previous one
+        """
+        with self._lock:
+            self._ensure_loaded()
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _Pool()
+                self._evict_pools()
+            pool.inputs = inputs
+            pool.hosts = hosts
+            pool.depth = depth
+            pool.refill_interval = 60.0 / max(1, refills_per_minute)
+            pool.last_demand = time.time()
+            pool.observe_seed(seed)
+            wanted = pool.wanted_seeds()
+            if any(entry.get("seed") not in wanted for entry in pool.entries):
+                pool.entries = deque(e for e in pool.entries if e.get("seed") in wanted)
+                self._dirty = True
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._worker_loop, name="ZForge-Reservoir", daemon=True
+                )
+                self._thread.start()
+
+    def _evict_pools(self) -> None:
+        while len(self._pools) > MAX_POOLS:
+            oldest = min(self._pools, key=lambda k: self._pools[k].last_demand)
+            del self._pools[oldest]
+            self._dirty = True
+
+    def _next_refill(self) -> Optional[tuple[str, _Pool]]:
+        """The emptiest pool that is due for a refill while its servers are idle."""
+        from .host_balancer import get_host_balancer
+
+        now = time.time()
+        balancer = get_host_balancer()
+        with self._lock:
+            due = [
+                (key, pool)
+                for key, pool in self._pools.items()
+                if pool.inputs is not None
+                and pool.missing_seeds()
+                and now - pool.last_demand < DEMAND_WINDOW_SECONDS
+                and now - pool.last_refill >= pool.refill_interval
+            ]
+        due = [(key, pool) for key, pool in due if balancer.outstanding(pool.hosts) == 0]
+        if not due:
+            return None
+        return min(due, key=lambda item: len(item[1].entries) / item[1].depth)
+
+    def _refill(self, key: str, pool: _Pool) -> None:
+        """Generate one entry for a pool with a regular (non-reservoir) Prompt Builder run."""
+        from .llm_backends import processing_interrupted
+        from .z_image_prompt import ZForgePromptBuilder
+
+        if processing_interrupted():
+            return
+        pool.last_refill = time.time()
+        with self._lock:
+            missing = pool.missing_seeds()
+        if not missing:
+            return
+        seed = missing[0]
+        try:
+            output = ZForgePromptBuilder().build_prompt(**{**pool.inputs, "seed": seed})
+        except Exception as e:
+            logger.debug(f"Z-Forge: reservoir refill failed: {e}")
+            return
+        variables, llm_instructions, image_prompt, status = output["result"]
+        if not image_prompt:
+            return
+        entry = {
+            "seed": seed,
+            "randomized_values": output["ui"]["randomized_values"][0],
+            "variables": variables,
+            "llm_instructions": llm_instructions,
+            "image_prompt": image_prompt,
+            "status": status,
+            "created": time.time(),
+        }
+        with self._lock:
+            if (
+                self._pools.get(key) is pool
+                and seed in pool.missing_seeds()
+            ):
+                pool.entries.append(entry)
+                self.refills += 1
+                self._dirty = True
+
+    def _worker_loop(self) -> None:
+        while True:
+            time.sleep(POLL_INTERVAL)
+            job = self._next_refill()
+            if job is not None:
+                self._refill(*job)
+            self._save()
+            with self._lock:
+                now = time.time()
+                if job is None and not any(
+                    pool.inputs is not None and now - pool.last_demand < DEMAND_WINDOW_SECONDS
+                    for pool in self._pools.values()
+                ):
+                    self._thread = None
+                    return
+
+    def is_refilling(self, key: str) -> bool:
+        """Whether a pool currently knows which seeds to refill for."""
+        with self._lock:
+            pool = self._pools.get(key)
+            return pool is not None and bool(pool.wanted_seeds())
+
+    def format_stats(self, key: Optional[str] = None) -> str:
+        """One-line summary for status output (with the given pool's fill level)."""
+        with self._lock:
+            pool = self._pools.get(key) if key else None
+            level = f"{len(pool.entries)}/{pool.depth} ready, " if pool else ""
+            return (
+                f"[Reservoir] {level}{self.hits} hit / {self.misses} miss, "
+                f"{self.refills} refilled"
+            )
+
+    def clear(self) -> None:
+        """Drop all ready prompts (in memory and on disk)."""
+        with self._lock:
+            self._pools.clear()
+            self._loaded = True
+            self._dirty = False
+        with contextlib.suppress(OSError):
+            os.remove(self.path)
+
+
+# Process-wide reservoir instance
+_reservoir = PromptReservoir()
+
+
+def get_prompt_reservoir() -> PromptReservoir:
+    """Get the process-wide prompt reservoir."""
+    return _reservoir
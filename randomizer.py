@@ -1,9 +1,13 @@
 """
 Z-Forge - Randomization Logic
 Generates random values for person fields.
+
+Every randomizer takes an optional rng: a random.Random, an int seed, or None
+for the global random module. Nodes derive one generator per subject/scene
+from their seed input, so identical seeds give identical variables.
 """
 import random
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 
 from .presets import (
     BODY_TYPES_ALL,
@@ -16,6 +20,9 @@ from .presets import (
     WEATHERS,
 )
 
+# A random.Random, a seed for a new one, or None for the global random module
+RandomSource = Union[random.Random, int, None]
+
 # Random value pools
 
 AGES = [
@@ -541,46 +548,114 @@ ACCESSORIES_OPTIONS = ACCESSORIES_REALISTIC
 FOOTWEAR_OPTIONS = FOOTWEAR_REALISTIC
 
 
-def random_hair() -> str:
+def make_rng(rng: RandomSource = None) -> Any:
+    """
+    Resolve a random source.
+
+    Args:
+        rng: random.Random (used as is), int seed, or None
+
+    Returns:
+        Object with the random.Random API (the random module itself for None)
+    """
+    if rng is None:
+        return random
+    if isinstance(rng, int):
+        return random.Random(rng)
+    return rng
+
+
+def derive_rng(seed: Optional[int], stream: str) -> Optional[random.Random]:
+    """
+    Independent generator for one part of a node's output.
+
+    Seeding per stream ("person_1", "scene", ...) keeps each part stable when
+    another part's randomize toggle changes.
+
+    Args:
+        seed: Node seed, or None for unseeded randomness (see seed_input)
+        stream: Name of the part being randomized
+
+    Returns:
+        Seeded random.Random, or None if seed is None
+    """
+    if seed is None:
+        return None
+    return random.Random(f"{seed}:{stream}")
+
+
+def seed_input(tooltip: str) -> tuple[str, Dict[str, Any]]:
+    """
+    Declaration of the optional "seed" input of the nodes that randomize.
+
+    The input is optional so workflows saved before it existed still load.
+    Those runs get seed=None: derive_rng() then returns None, values come
+    from the global random module, and IS_CHANGED reports every run as
+    changed, as before seeds existed.
+
+    Args:
+        tooltip: What the seed reproduces on this node
+
+    Returns:
+        ComfyUI input type tuple for INPUT_TYPES()["optional"]
+    """
+    return (
+        "INT",
+        {
+            "default": 0,
+            "min": 0,
+            "max": 0xFFFFFFFFFFFFFFFF,
+            "control_after_generate": True,
+            "tooltip": tooltip,
+        },
+    )
+
+
+def random_hair(rng: RandomSource = None) -> str:
     """Generate random hair description."""
-    color = random.choice(HAIR_COLORS)
-    length = random.choice(HAIR_LENGTHS)
-    style = random.choice(HAIR_STYLES)
+    rng = make_rng(rng)
+    color = rng.choice(HAIR_COLORS)
+    length = rng.choice(HAIR_LENGTHS)
+    style = rng.choice(HAIR_STYLES)
     return f"{length} {color} hair, {style}"
 
 
-def random_outfit(genre: str = "realistic") -> str:
+def random_outfit(genre: str = "realistic", rng: RandomSource = None) -> str:
     """Generate random outfit based on genre."""
+    rng = make_rng(rng)
     if genre == "fantasy":
-        category = random.choice(["common", "common", "noble", "warrior", "magic"])
+        category = rng.choice(["common", "common", "noble", "warrior", "magic"])
         if category == "common":
-            return random.choice(OUTFITS_FANTASY_COMMON)
+            return rng.choice(OUTFITS_FANTASY_COMMON)
         elif category == "noble":
-            return random.choice(OUTFITS_FANTASY_NOBLE)
+            return rng.choice(OUTFITS_FANTASY_NOBLE)
         elif category == "warrior":
-            return random.choice(OUTFITS_FANTASY_WARRIOR)
+            return rng.choice(OUTFITS_FANTASY_WARRIOR)
         else:
-            return random.choice(OUTFITS_FANTASY_MAGIC)
+            return rng.choice(OUTFITS_FANTASY_MAGIC)
     else:
-        category = random.choice(["casual", "casual", "formal", "athletic"])
+        category = rng.choice(["casual", "casual", "formal", "athletic"])
         if category == "casual":
-            return random.choice(OUTFITS_CASUAL)
+            return rng.choice(OUTFITS_CASUAL)
         elif category == "formal":
-            return random.choice(OUTFITS_FORMAL)
+            return rng.choice(OUTFITS_FORMAL)
         else:
-            return random.choice(OUTFITS_ATHLETIC)
+            return rng.choice(OUTFITS_ATHLETIC)
 
 
-def randomize_subject(genre: str = "realistic") -> Dict[str, Any]:
+def randomize_subject(genre: str = "realistic", rng: RandomSource = None) -> Dict[str, Any]:
     """
     Generate random values for all subject fields.
 
     Args:
         genre: "realistic" for real-world ethnicities, "fantasy" for fantasy races
+        rng: Random source (random.Random, seed, or None for the global generator)
 
     Returns:
         Dictionary with randomized field values
     """
+    rng = make_rng(rng)
+
     # Filter out NA and custom from body types for random selection
     valid_body_types = [bt for bt in BODY_TYPES_ALL if bt not in ("NA", "custom")]
 
@@ -598,36 +673,39 @@ def randomize_subject(genre: str = "realistic") -> Dict[str, Any]:
         footwear_choices = FOOTWEAR_REALISTIC
 
     return {
-        "age": random.choice(AGES),
-        "gender": random.choice(valid_genders),
-        "ethnicity": random.choice(ethnicity_choices),
-        "body_type": random.choice(valid_body_types),
+        "age": rng.choice(AGES),
+        "gender": rng.choice(valid_genders),
+        "ethnicity": rng.choice(ethnicity_choices),
+        "body_type": rng.choice(valid_body_types),
         "body_type_custom": "",
-        "hair": random_hair(),
+        "hair": random_hair(rng),
         "face": "",  # Leave for user - too complex to randomize well
-        "expression": random.choice(EXPRESSIONS),
-        "gaze": random.choice(GAZES),
-        "hands": random.choice(HAND_POSITIONS),
-        "skin_texture": random.choice(SKIN_TEXTURES),
-        "skin_details": random.choice(SKIN_DETAILS_OPTIONS),
+        "expression": rng.choice(EXPRESSIONS),
+        "gaze": rng.choice(GAZES),
+        "hands": rng.choice(HAND_POSITIONS),
+        "skin_texture": rng.choice(SKIN_TEXTURES),
+        "skin_details": rng.choice(SKIN_DETAILS_OPTIONS),
         "extras": "",  # Leave for user
-        "outfit": random_outfit(genre=genre),
-        "accessories": random.choice(accessories_choices),
-        "footwear": random.choice(footwear_choices),
-        "pose": random.choice(POSES),
+        "outfit": random_outfit(genre=genre, rng=rng),
+        "accessories": rng.choice(accessories_choices),
+        "footwear": rng.choice(footwear_choices),
+        "pose": rng.choice(POSES),
     }
 
 
-def randomize_scene(genre: str = "realistic") -> Dict[str, Any]:
+def randomize_scene(genre: str = "realistic", rng: RandomSource = None) -> Dict[str, Any]:
     """
     Generate random values for scene fields.
 
     Args:
         genre: "realistic" for real-world locations, "fantasy" for magical locations
+        rng: Random source (random.Random, seed, or None for the global generator)
 
     Returns:
         Dictionary with randomized scene values
     """
+    rng = make_rng(rng)
+
     # Filter out NA and custom from dropdowns
     valid_times = [t for t in TIMES if t not in ("NA", "custom")]
     valid_weathers = [w for w in WEATHERS if w not in ("NA", "custom")]
@@ -636,23 +714,23 @@ def randomize_scene(genre: str = "realistic") -> Dict[str, Any]:
 
     # Select location based on genre
     if genre == "fantasy":
-        location = random.choice(LOCATIONS_FANTASY)
+        location = rng.choice(LOCATIONS_FANTASY)
         era = "fantasy"
     else:
-        location = random.choice(LOCATIONS_REALISTIC)
+        location = rng.choice(LOCATIONS_REALISTIC)
         era = "modern"
 
     return {
         "location": location,
-        "time": random.choice(valid_times),
-        "weather": random.choice(valid_weathers),
-        "atmosphere": random.choice(ATMOSPHERES),
+        "time": rng.choice(valid_times),
+        "weather": rng.choice(valid_weathers),
+        "atmosphere": rng.choice(ATMOSPHERES),
         "props": "",  # Leave for user
         "background": "",  # Leave for user
         "era": era,
         "action": "",  # Leave for user
         "story": "",  # Leave for user
-        "lighting": random.choice(LIGHTINGS),
-        "framing": random.choice(valid_framings),
-        "camera_angle": random.choice(valid_angles),
+        "lighting": rng.choice(LIGHTINGS),
+        "framing": rng.choice(valid_framings),
+        "camera_angle": rng.choice(valid_angles),
     }
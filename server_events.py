@@ -0,0 +1,44 @@
+"""
+Z-Forge Server Events
+Push messages from Python to the ComfyUI frontend.
+
+Events are delivered over ComfyUI's websocket via PromptServer. Outside of
+ComfyUI (scripts, benchmarks) sending is a silent no-op.
+"""
+import logging
+from typing import Any, Optional
+
+logger = logging.getLogger("ZForge")
+
+# Event names (listened for in web/z_forge.js)
+STREAM_EVENT = "zforge-stream"
+MODELS_UPDATED_EVENT = "zforge-models-updated"
+
+
+def send_event(event: str, data: dict[str, Any], sid: Optional[str] = None) -> bool:
+    """
+    Send an event to connected ComfyUI clients.
+
+    Args:
+        event: Event name
+        data: JSON-serialisable payload
+        sid: Client session ID, or None to broadcast
+
+    Returns:
+        True if the event was handed to the server
+    """
+    try:
+        from server import PromptServer
+    except ImportError:
+        return False
+
+    instance = getattr(PromptServer, "instance", None)
+    if instance is None:
+        return False
+
+    try:
+        instance.send_sync(event, data, sid)
+        return True
+    except Exception as e:
+        logger.debug(f"Z-Forge: failed to send {event} event: {e}")
+        return False
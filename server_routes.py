@@ -0,0 +1,92 @@
+"""
+Z-Forge Server Routes
+REST endpoints registered on ComfyUI's PromptServer.
+
+Routes:
+- GET /zforge/models?host=&port=&refresh=1 - Model list for one server (refresh=1 re-fetches)
+- GET /zforge/test?host=&port= - Connection test
+- GET /zforge/metrics - Stage latency and token metrics (Prometheus text format)
+- GET /zforge/metrics?format=json - p50/p95 per stage, model and template
+
+These run outside the execution graph, so checking connectivity or refreshing
+the model dropdown never re-queues the workflow.
+"""
+import asyncio
+import logging
+from typing import Any
+
+from .metrics import get_metrics
+from .model_fetcher import (
+    get_cached_models,
+    get_server_models,
+    refresh_model_cache,
+    test_connection,
+)
+
+logger = logging.getLogger("ZForge")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 1234
+
+
+def _server_from_query(query: Any) -> tuple[str, int]:
+    """Read host/port query parameters, falling back to LM Studio defaults."""
+    host = query.get("host", "").strip() or DEFAULT_HOST
+    try:
+        port = int(query.get("port", DEFAULT_PORT))
+    except (TypeError, ValueError):
+        port = DEFAULT_PORT
+    return host, port
+
+
+def register_routes() -> bool:
+    """
+    Register Z-Forge routes on ComfyUI's PromptServer.
+
+    Returns:
+        True if the routes were registered (False outside ComfyUI)
+    """
+    try:
+        from aiohttp import web
+        from server import PromptServer
+    except ImportError:
+        return False
+
+    routes = PromptServer.instance.routes
+
+    @routes.get("/zforge/models")
+    async def zforge_models(request):
+        host, port = _server_from_query(request.rel_url.query)
+        server_url = f"http://{host}:{port}"
+        loop = asyncio.get_running_loop()
+        if request.rel_url.query.get("refresh") in ("1", "true"):
+            success, message = await loop.run_in_executor(None, refresh_model_cache, server_url)
+            models = get_cached_models(server_url)
+        else:
+            # Served from the per-server cache (stale entries revalidate in the background)
+            models, error = await loop.run_in_executor(None, get_server_models, server_url)
+            success, message = error is None, error or f"Found {len(models)} model(s)"
+        return web.json_response(
+            {"success": success, "message": message, "server_url": server_url, "models": models}
+        )
+
+    @routes.get("/zforge/test")
+    async def zforge_test(request):
+        host, port = _server_from_query(request.rel_url.query)
+        loop = asyncio.get_running_loop()
+        success, message = await loop.run_in_executor(None, test_connection, host, port)
+        return web.json_response({"success": success, "message": message})
+
+    @routes.get("/zforge/metrics")
+    async def zforge_metrics(request):
+        metrics = get_metrics()
+        if request.rel_url.query.get("format") == "json":
+            return web.json_response(
+                {
+                    "stages": metrics.quantiles("zforge_stage_duration_seconds"),
+                    "tokens_per_second": metrics.quantiles("zforge_tokens_per_second"),
+                }
+            )
+        return web.Response(text=metrics.render_prometheus(), content_type="text/plain")
+
+    return True
@@ -0,0 +1,100 @@
+"""
+Z-Forge Single-Flight
+Coalesces identical concurrent LLM expansion requests.
+
+Features:
+- The first caller for a key runs the generation; callers arriving while it
+  is in flight wait and share its result (or its exception)
+- Only fixed-seed requests are coalesced (a random seed asks for a new sample)
+- Follower counts for status output and metrics
+"""
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger("ZForge")
+
+
+class _Flight:
+    """One in-flight call and its outcome."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Thread-safe duplicate-call suppression keyed by request.
+
+    Unlike the expansion cache, nothing is kept once a call finishes: it only
+    covers requests that overlap in time, whatever the cache mode.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[str, _Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def do(self, key: str, func: Callable[[], Any]) -> tuple[Any, bool]:
+        """
+        Run func() once for all concurrent callers with the same key.
+
+        Args:
+            key: Request key (e.g. expansion_cache.make_cache_key)
+            func: Produces the result; runs in the first caller's thread
+
+        Returns:
+            Tuple of (result, shared) - shared is True for followers
+
+        Raises:
+            Whatever func() raised, in the leader and every follower
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+                leader = True
+            else:
+                flight.followers += 1
+                self.followers += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+            if flight.followers:
+                logger.info(
+                    f"Z-Forge: shared one expansion with {flight.followers} identical request(s)"
+                )
+        return flight.result, False
+
+    def in_flight(self) -> int:
+        """Number of keys currently being generated."""
+        with self._lock:
+            return len(self._flights)
+
+
+# Process-wide single-flight instance
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get the process-wide single-flight group."""
+    return _single_flight
@@ -4,6 +4,7 @@ Separate node for Person 2 and Person 3 data.
 """
 import json
 import logging
+from typing import Optional
 
 from .presets import (
     BODY_TYPES_ALL,
@@ -15,7 +16,7 @@ from .presets import (
     EXPRESSION_HINTS,
     POSE_HINTS,
 )
-from .randomizer import randomize_subject
+from .randomizer import derive_rng, randomize_subject, seed_input
 
 logger = logging.getLogger("ZForge")
 
@@ -142,14 +143,19 @@ class ZForgePerson:
                     "tooltip": POSE_HINTS
                 }),
             },
+            "optional": {
+                "seed": seed_input("Seed for randomize - the same seed gives the same person"),
+            },
         }
 
     @classmethod
-    def IS_CHANGED(cls, genre, reset, randomize, **kwargs):
-        """Force re-execution when reset or randomize is True."""
-        if reset or randomize:
+    def IS_CHANGED(cls, genre, reset, randomize, seed=None, **kwargs):
+        """Re-execute on reset, and when randomizing with a different seed."""
+        if reset or (randomize and seed is None):
             import time
             return str(time.time())
+        if randomize:
+            return f"seed:{seed}"
         return ""
 
     def build_person(
@@ -174,6 +180,7 @@ class ZForgePerson:
         accessories: str,
         footwear: str,
         pose: str,
+        seed: Optional[int] = None,
     ) -> dict:
         """
         Build person data.
@@ -212,7 +219,7 @@ class ZForgePerson:
             status_lines.append("[RESET] All fields cleared")
         elif randomize:
             # Use randomized values
-            data = randomize_subject(genre=genre)
+            data = randomize_subject(genre=genre, rng=derive_rng(seed, "person"))
             # Copy data to widget_updates for widget update
             widget_updates = data.copy()
             status_lines.append("[RANDOMIZED]")
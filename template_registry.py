@@ -0,0 +1,165 @@
+"""
+Z-Forge Template Registry
+mtime-aware cache of the system prompt templates in system_prompts/.
+
+Features:
+- Directory listing re-scanned only when the folder changes
+- Template files re-read only when their mtime or size changes (hot reload)
+- Interned content and a content hash for every template
+- Lookup by content hash, so configs can reference a template instead of copying it;
+  older versions and imported templates are kept least-recently-used up to a limit
+"""
+import hashlib
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger("ZForge")
+
+# System prompts directory
+SYSTEM_PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "system_prompts")
+
+# Template versions kept for lookup by hash (the current version of each file is always kept)
+MAX_VERSIONS = 64
+
+
+@dataclass(frozen=True)
+class Template:
+    """A loaded system prompt template."""
+
+    name: str
+    content: str
+    content_hash: str
+
+
+def hash_content(content: str) -> str:
+    """Content hash used to identify a template version."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+class TemplateRegistry:
+    """
+    Stat-based cache of .md templates in a directory.
+
+    Listing and loading only touch the disk when something changed, so
+    callers such as INPUT_TYPES and per-execution loads stay cheap while
+    edits to a template are still picked up on the next call.
+    """
+
+    def __init__(self, directory: str = SYSTEM_PROMPTS_DIR, max_versions: int = MAX_VERSIONS):
+        self.directory = directory
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._dir_mtime: Optional[int] = None
+        self._names: list[str] = []
+        self._templates: dict[str, tuple[tuple[int, int], Template]] = {}
+        self._by_hash: OrderedDict[str, Template] = OrderedDict()
+
+    def list_templates(self) -> list[str]:
+        """
+        List template names (without .md), re-scanning only if the folder changed.
+
+        Returns:
+            Sorted template names
+        """
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return []
+
+        with self._lock:
+            if dir_mtime != self._dir_mtime:
+                try:
+                    self._names = sorted(
+                        filename[:-3]
+                        for filename in os.listdir(self.directory)
+                        if filename.endswith(".md")
+                    )
+                except OSError:
+                    self._names = []
+                self._dir_mtime = dir_mtime
+            return list(self._names)
+
+    def get(self, name: str) -> Template:
+        """
+        Load a template, re-reading the file only if it changed.
+
+        Args:
+            name: Template name (without .md extension)
+
+        Returns:
+            The loaded Template
+
+        Raises:
+            OSError: If the file cannot be read (FileNotFoundError if missing)
+        """
+        path = os.path.join(self.directory, f"{name}.md")
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._templates.get(name)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+
+        with open(path, encoding="utf-8") as f:
+            content = sys.intern(f.read())
+        template = Template(name=name, content=content, content_hash=hash_content(content))
+
+        with self._lock:
+            self._templates[name] = (signature, template)
+            self._remember(template)
+        if cached is not None:
+            logger.info(f"Z-Forge: reloaded system prompt template {name}")
+        return template
+
+    def register(self, name: str, content: str) -> Template:
+        """
+        Register template content that did not come from a file (e.g. an imported config).
+
+        Args:
+            name: Display name for the template
+            content: Template text
+
+        Returns:
+            The registered Template (shared if identical content is already known)
+        """
+        content_hash = hash_content(content)
+        with self._lock:
+            template = self._by_hash.get(content_hash)
+            if template is None:
+                template = Template(name=name, content=sys.intern(content), content_hash=content_hash)
+            self._remember(template)
+            return template
+
+    def get_by_hash(self, content_hash: str) -> Optional[Template]:
+        """Look up a template version loaded or registered recently by its content hash."""
+        with self._lock:
+            template = self._by_hash.get(content_hash)
+            if template is not None:
+                self._by_hash.move_to_end(content_hash)
+            return template
+
+    def _remember(self, template: Template) -> None:
+        """Make a version available by hash, dropping the least recently used (caller holds the lock)."""
+        self._by_hash[template.content_hash] = template
+        self._by_hash.move_to_end(template.content_hash)
+        excess = len(self._by_hash) - self.max_versions
+        if excess <= 0:
+            return
+        current = {cached.content_hash for _, cached in self._templates.values()}
+        for content_hash in [h for h in self._by_hash if h not in current][:excess]:
+            del self._by_hash[content_hash]
+
+
+# Process-wide registry instance
+_registry = TemplateRegistry()
+
+
+def get_template_registry() -> TemplateRegistry:
+    """Get the process-wide template registry."""
+    return _registry
@@ -0,0 +1,246 @@
+"""
+Z-Forge Template Tables
+Structured data parsed from the keyword-expansion tables in system prompt templates.
+
+Features:
+- Gender table: noun and pronouns per gender
+- Body type table: female/male expansions per keyword, alias rows resolved;
+  a neutral expansion for non-binary subjects (own column or derived)
+- Fantasy race tables: expansion per race, variants built from "Additional Features"
+- Parsed once per template content (precompiled for all templates at load)
+"""
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from .prompt_compiler import parse_template
+from .template_registry import get_template_registry
+
+_KEYWORD_PATTERN = re.compile(r"`([^`]+)`")
+_QUOTED_PATTERN = re.compile(r'"([^"]+)"')
+_ALIAS_PATTERN = re.compile(r"use (\S+) expansion", re.IGNORECASE)
+
+# Object pronouns for the subject pronouns used in the gender table
+OBJECT_PRONOUNS = {"she": "her", "he": "him", "they": "them"}
+
+# Placeholder cells for "not applicable" in expansion tables
+_EMPTY_CELLS = ("", "—", "-")
+
+# Body type column for non-binary and unspecified genders ("Non-Binary Expansion" also counts)
+NEUTRAL_COLUMN = "neutral"
+
+# Gendered anatomy left out when a neutral expansion is derived from the female/male text
+_BUST_PHRASE = re.compile(r"\bbust and | and bust\b")
+_GENDERED_CLAUSE = re.compile(r"\b(breasts?|bust|cleavage|beard|masculine|feminine)\b", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class GenderForms:
+    """How to refer to a subject of one gender."""
+
+    noun: str  # "woman"
+    subject: str  # "she"
+    object: str  # "her"
+    possessive: str  # "her"
+
+    @property
+    def plural(self) -> bool:
+        """Whether verbs take the plural form ("they are")."""
+        return self.subject == "they"
+
+
+# Used when the template has no gender table or the gender is NA/custom
+NEUTRAL_FORMS = GenderForms(noun="person", subject="they", object="them", possessive="their")
+
+
+@dataclass(frozen=True)
+class TemplateTables:
+    """Keyword expansion tables of one template."""
+
+    genders: dict[str, GenderForms] = field(default_factory=dict)
+    body_types: dict[str, dict[str, str]] = field(default_factory=dict)
+    races: dict[str, str] = field(default_factory=dict)
+
+    def body_type(self, keyword: str, gender: str) -> str:
+        """
+        Get the body type expansion for a gender.
+
+        Args:
+            keyword: body_type value (case-insensitive)
+            gender: "female", "male" or NEUTRAL_COLUMN column to prefer
+
+        Returns:
+            Expansion text, or "" if the keyword is not a preset. Without a
+            neutral column, the neutral text is the female (else male)
+            expansion without its gendered anatomy.
+        """
+        columns = self.body_types.get(keyword.strip().lower())
+        if not columns:
+            return ""
+        if gender in columns:
+            return columns[gender]
+        if gender == NEUTRAL_COLUMN:
+            return neutral_expansion(columns.get("female") or next(iter(columns.values())))
+        return next(iter(columns.values()))
+
+    def race(self, keyword: str) -> str:
+        """Get the race expansion, or "" if the keyword is not a preset."""
+        return self.races.get(keyword.strip().lower(), "")
+
+
+def neutral_expansion(text: str) -> str:
+    """
+    Drop gendered anatomy from a body type expansion.
+
+    "a woman with pronounced curves, full breasts, defined waist" becomes
+    "a woman with pronounced curves, defined waist" (nouns and pronouns are
+    adapted separately). The first clause, which names the subject, is kept.
+    """
+    first, *rest = _BUST_PHRASE.sub("", text).split(", ")
+    return ", ".join([first] + [clause for clause in rest if not _GENDERED_CLAUSE.search(clause)])
+
+
+def _column_name(title: str) -> str:
+    """Body type table column key ("Female Expansion" -> "female")."""
+    name = title.split()[0].lower() if title.split() else ""
+    return NEUTRAL_COLUMN if name == "non-binary" else name
+
+
+def _cells(line: str) -> list[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _tables(section: tuple[str, ...]) -> list[tuple[list[str], list[list[str]]]]:
+    """Extract (header cells, body rows) for every table in a section."""
+    tables = []
+    current: list[str] = []
+    for line in section + ("",):
+        if line.startswith("|"):
+            current.append(line)
+            continue
+        if len(current) > 2:
+            tables.append((_cells(current[0]), [_cells(row) for row in current[2:]]))
+        current = []
+    return tables
+
+
+def _keywords(cell: str) -> list[str]:
+    return [k.strip().lower() for k in _KEYWORD_PATTERN.findall(cell)]
+
+
+def _parse_genders(section: tuple[str, ...]) -> dict[str, GenderForms]:
+    genders = {}
+    for _header, rows in _tables(section):
+        for row in rows:
+            quoted = _QUOTED_PATTERN.findall(row[-1]) if len(row) > 1 else []
+            if len(quoted) < 3:
+                continue
+            noun = quoted[0].split()[-1]
+            subject, possessive = quoted[1], quoted[2]
+            forms = GenderForms(
+                noun=noun,
+                subject=subject,
+                object=OBJECT_PRONOUNS.get(subject, possessive),
+                possessive=possessive,
+            )
+            for keyword in _keywords(row[0]):
+                genders[keyword] = forms
+    return genders
+
+
+def _parse_body_types(section: tuple[str, ...]) -> dict[str, dict[str, str]]:
+    body_types: dict[str, dict[str, str]] = {}
+    aliases: dict[str, str] = {}
+    for header, rows in _tables(section):
+        columns = [_column_name(title) for title in header]
+        for row in rows:
+            keywords = _keywords(row[0])
+            alias = _ALIAS_PATTERN.search(" ".join(row[1:]))
+            if alias:
+                for keyword in keywords:
+                    aliases[keyword] = alias.group(1).strip("`").lower()
+                continue
+            expansions = {
+                columns[i]: cell
+                for i, cell in enumerate(row[1:], start=1)
+                if i < len(columns) and cell not in _EMPTY_CELLS
+            }
+            for keyword in keywords:
+                body_types[keyword] = expansions
+    for keyword, target in aliases.items():
+        if target in body_types:
+            body_types[keyword] = body_types[target]
+    return body_types
+
+
+def _parse_races(section: tuple[str, ...]) -> dict[str, str]:
+    races = {}
+    for header, rows in _tables(section):
+        variants = len(header) > 1 and header[1].lower().startswith("additional")
+        for row in rows:
+            if len(row) < 2 or row[1] in _EMPTY_CELLS:
+                continue
+            for keyword in _keywords(row[0]):
+                if variants:
+                    article = "an" if keyword[0] in "aeiou" else "a"
+                    races[keyword] = f"{article} {keyword} with {row[1]}"
+                else:
+                    races[keyword] = row[1]
+    return races
+
+
+@lru_cache(maxsize=16)
+def parse_template_tables(template: str) -> TemplateTables:
+    """
+    Parse the gender, body type and race tables of a template.
+
+    Args:
+        template: Markdown template text
+
+    Returns:
+        TemplateTables (empty tables for sections the template lacks)
+    """
+    genders: dict[str, GenderForms] = {}
+    body_types: dict[str, dict[str, str]] = {}
+    races: dict[str, str] = {}
+    for section in parse_template(template):
+        heading = section[0].upper() if section and section[0].startswith("## ") else ""
+        if "GENDER" in heading:
+            genders.update(_parse_genders(section))
+        elif "BODY TYPE" in heading:
+            body_types.update(_parse_body_types(section))
+        elif "RACE" in heading:
+            races.update(_parse_races(section))
+    return TemplateTables(genders=genders, body_types=body_types, races=races)
+
+
+def get_template_tables(name: str) -> TemplateTables:
+    """
+    Get the tables of a template in system_prompts/ (hot-reloaded with the file).
+
+    Args:
+        name: Template name (without .md extension)
+
+    Returns:
+        TemplateTables, empty if the template cannot be read
+    """
+    try:
+        return parse_template_tables(get_template_registry().get(name).content)
+    except OSError:
+        return TemplateTables()
+
+
+def precompile_template_tables() -> int:
+    """
+    Parse the tables of every template in system_prompts/ ahead of time.
+
+    Called when ComfyUI loads the extension so the first expansion does not
+    pay the parsing cost.
+
+    Returns:
+        Number of templates parsed
+    """
+    names = get_template_registry().list_templates()
+    for name in names:
+        get_template_tables(name)
+    return len(names)
@@ -0,0 +1,83 @@
+"""
+Shared fixtures for the Z-Forge tests.
+
+The repository is registered as the `z_forge` package without running its
+__init__ (no ComfyUI route registration or model discovery), and
+`import lmstudio` resolves to the fake SDK from fake_lm_server.
+"""
+import importlib.util
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "z_forge"
+
+if PACKAGE not in sys.modules:
+    _spec = importlib.util.spec_from_file_location(
+        PACKAGE, ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+    )
+    sys.modules[PACKAGE] = importlib.util.module_from_spec(_spec)
+
+from z_forge.expansion_cache import ExpansionCache  # noqa: E402
+from z_forge.fake_lm_server import FakeLMServer, install_fake_lmstudio  # noqa: E402
+from z_forge.llm_config import LLMConfig  # noqa: E402
+
+install_fake_lmstudio()
+
+SYSTEM_PROMPT = "Expand the YAML variables into one paragraph of prose."
+VARIABLES = "subjects: 1\ngender: female\nage: 30\nlocation: harbor"
+
+
+@pytest.fixture
+def fake_server():
+    """A fresh fake LM Studio server with no artificial delays (new port per test)."""
+    with FakeLMServer(
+        latency=0.0,
+        tokens_per_second=0,
+        completion_tokens=40,
+        parallel=0,
+        load_delay=0.0,
+        unload_delay=0.0,
+        seed=1,
+    ) as server:
+        yield server
+
+
+@pytest.fixture
+def dead_address():
+    """ "host:port" with nothing listening."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"127.0.0.1:{port}"
+
+
+@pytest.fixture
+def config(fake_server):
+    """Fixed-seed config for the fake server (models stay loaded between requests)."""
+    return LLMConfig(port=fake_server.port, seed=7, unload=False)
+
+
+@pytest.fixture
+def expansion_cache(monkeypatch, tmp_path):
+    """Replace the process-wide expansion cache with an empty one."""
+    from z_forge import z_image_prompt
+
+    cache = ExpansionCache(disk_dir=str(tmp_path))
+    monkeypatch.setattr(z_image_prompt, "get_expansion_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def expand():
+    """Run one Internal-mode expansion of the sample variables; returns (prompt, status)."""
+    from z_forge.z_image_prompt import ZForgePromptBuilder
+
+    def run(config, variables=VARIABLES, builder=None, **kwargs):
+        builder = builder or ZForgePromptBuilder()
+        return builder._call_lm_studio(SYSTEM_PROMPT, variables, config, **kwargs)
+
+    return run
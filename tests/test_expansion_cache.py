@@ -0,0 +1,71 @@
+"""Expansion cache: hits, misses and bypass through the Prompt Builder."""
+import time
+
+from z_forge.expansion_cache import ExpansionCache, make_cache_key
+from z_forge.llm_config import LLMConfig
+
+
+def test_repeated_fixed_seed_request_is_a_hit(fake_server, config, expansion_cache, expand):
+    first, first_info = expand(config)
+    second, second_info = expand(config)
+
+    assert first and second == first
+    assert "[Cache] MISS" in first_info
+    assert "[Cache] HIT" in second_info
+    assert fake_server.stats()["completions"] == 1
+    assert (expansion_cache.hits, expansion_cache.misses) == (1, 1)
+
+
+def test_different_variables_miss(fake_server, config, expansion_cache, expand):
+    expand(config)
+    expand(config, variables="subjects: 1\ngender: male\nage: 40")
+
+    assert fake_server.stats()["completions"] == 2
+    assert expansion_cache.misses == 2
+
+
+def test_random_seed_bypasses_cache(fake_server, config, expansion_cache, expand):
+    config = config.with_changes(seed=-1)
+    _, info = expand(config)
+    expand(config)
+
+    assert "[Cache] Bypassed (seed -1)" in info
+    assert fake_server.stats()["completions"] == 2
+    assert (expansion_cache.hits, expansion_cache.misses) == (0, 0)
+
+
+def test_cache_off_generates_every_time(fake_server, config, expansion_cache, expand):
+    config = config.with_changes(cache_mode="Off")
+    expand(config)
+    expand(config)
+
+    assert fake_server.stats()["completions"] == 2
+
+
+def test_make_cache_key_depends_on_sampling_settings():
+    config = LLMConfig(seed=1)
+
+    assert make_cache_key("sp", "vars", config) == make_cache_key("sp", "vars", config)
+    assert make_cache_key("sp", "vars", config) != make_cache_key(
+        "sp", "vars", config.with_changes(temperature=0.9)
+    )
+    assert make_cache_key("sp", "vars", config.with_changes(seed=-1)) is None
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = ExpansionCache(ttl=0.01, disk_dir=str(tmp_path))
+    cache.put("key", "prompt", 1.0)
+    time.sleep(0.05)
+
+    assert cache.get("key") is None
+
+
+def test_disk_tier_survives_a_new_instance(tmp_path):
+    cache = ExpansionCache(disk_dir=str(tmp_path))
+    cache.configure(max_entries=8, ttl=3600, disk_enabled=True)
+    cache.put("key", "prompt", 2.0)
+
+    reopened = ExpansionCache(disk_dir=str(tmp_path))
+    reopened.configure(max_entries=8, ttl=3600, disk_enabled=True)
+    assert reopened.get("key") == "prompt"
+    assert reopened.seconds_saved == 2.0
@@ -0,0 +1,80 @@
+"""Fake LM Studio server and SDK: completions, streaming, failures and model state."""
+import json
+import urllib.error
+import urllib.request
+
+import lmstudio
+import pytest
+
+from z_forge.fake_lm_server import FakeLMServer
+
+
+def _post(server, path, payload):
+    request = urllib.request.Request(
+        f"{server.url}{path}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def _respond(server, seed=3, **config):
+    chat = lmstudio.Chat("system")
+    chat.add_user_message("subjects: 1")
+    with lmstudio.Client(server.address) as client:
+        return client.llm.model("fake-model-7b").respond(chat, config={"seed": seed, **config})
+
+
+def test_non_streaming_completion(fake_server):
+    body = _post(
+        fake_server,
+        "/v1/chat/completions",
+        {"model": "fake-model-7b", "messages": [{"role": "user", "content": "hi"}], "max_tokens": 5},
+    )
+
+    assert body["choices"][0]["finish_reason"] == "length"
+    assert body["usage"]["completion_tokens"] == 5
+    assert body["choices"][0]["message"]["content"]
+
+
+def test_sdk_stream_is_deterministic_for_a_seed(fake_server):
+    first = _respond(fake_server)
+    second = _respond(fake_server)
+    other = _respond(fake_server, seed=4)
+
+    assert first.content and first.content == second.content
+    assert other.content != first.content
+    assert first.stats.predicted_tokens_count == 40
+
+
+def test_fail_next_raises_sdk_errors(fake_server):
+    fake_server.fail_next()
+    with pytest.raises(lmstudio.LMStudioServerError):
+        _respond(fake_server)
+
+    fake_server.configure(failure_mode="disconnect")
+    fake_server.fail_next()
+    with pytest.raises(lmstudio.LMStudioWebsocketError):
+        _respond(fake_server)
+
+    assert _respond(fake_server).content
+
+
+def test_models_load_on_demand_and_unload(fake_server):
+    with lmstudio.Client(fake_server.address) as client:
+        client.llm.model("fake-model-1b")
+        assert [m.identifier for m in client.llm.list_loaded()] == ["fake-model-7b", "fake-model-1b"]
+
+        client.llm.unload("fake-model-7b")
+        assert fake_server.stats()["loaded"] == ["fake-model-1b"]
+        with pytest.raises(lmstudio.LMStudioModelNotFoundError):
+            client.llm.model("missing-model")
+
+
+def test_runtime_config_route_rejects_unknown_settings():
+    with FakeLMServer(latency=0.0, load_delay=0.0) as server:
+        assert _post(server, "/_fake/config", {"completion_tokens": 3})["completion_tokens"] == 3
+        with pytest.raises(urllib.error.HTTPError) as raised:
+            _post(server, "/_fake/config", {"warp_speed": 9})
+    assert raised.value.code == 400
@@ -0,0 +1,69 @@
+"""Host balancer: routing, ejection and failover across LLM servers."""
+from z_forge.host_balancer import (
+    BALANCE_WEIGHTED_ROUND_ROBIN,
+    HostBalancer,
+    get_host_balancer,
+    parse_hosts,
+)
+from z_forge.llm_config import LLMConfig
+
+
+def test_parse_hosts_keeps_primary_first_and_applies_weights():
+    hosts = parse_hosts("10.0.0.2 3\nhttp://10.0.0.3:5678/  # spare\n10.0.0.4 0", "127.0.0.1:1234")
+
+    assert hosts == (("127.0.0.1:1234", 1), ("10.0.0.2:1234", 3), ("10.0.0.3:5678", 1))
+
+
+def test_least_outstanding_spreads_concurrent_requests():
+    balancer = HostBalancer()
+    hosts = (("a:1", 1), ("b:1", 1))
+
+    first = balancer.acquire(hosts)
+    second = balancer.acquire(hosts)
+
+    assert {first, second} == {"a:1", "b:1"}
+    assert balancer.outstanding(hosts) == 2
+
+
+def test_weighted_round_robin_follows_weights():
+    balancer = HostBalancer()
+    hosts = (("a:1", 3), ("b:1", 1))
+
+    picks = []
+    for _ in range(8):
+        address = balancer.acquire(hosts, BALANCE_WEIGHTED_ROUND_ROBIN)
+        balancer.release(address)
+        picks.append(address)
+
+    assert picks.count("a:1") == 6
+    assert picks.count("b:1") == 2
+
+
+def test_failed_host_is_ejected_until_it_recovers():
+    balancer = HostBalancer()
+    hosts = (("a:1", 1), ("b:1", 1))
+
+    balancer.release(balancer.acquire(hosts, exclude=("b:1",)), failed=True, error="refused")
+
+    assert balancer.available(hosts) == ["b:1"]
+    assert balancer.acquire(hosts) == "b:1"
+
+
+def test_unreachable_host_fails_over(fake_server, dead_address, config, expansion_cache, expand):
+    host, port = dead_address.split(":")
+    config = config.with_changes(host=host, port=int(port), hosts=fake_server.address)
+
+    prompt, info = expand(config)
+
+    assert prompt
+    assert f"[Hosts] {dead_address} unreachable" in info
+    assert fake_server.stats()["completions"] == 1
+    assert get_host_balancer().available(config.host_list) == [fake_server.address]
+
+
+def test_all_hosts_down_reports_an_error(dead_address, expansion_cache, expand):
+    host, port = dead_address.split(":")
+    prompt, info = expand(LLMConfig(host=host, port=int(port), seed=7, unload=False))
+
+    assert prompt == ""
+    assert "[ERROR]" in info
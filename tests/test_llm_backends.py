@@ -0,0 +1,195 @@
+"""LLM backends: the OpenAI-compatible HTTP client (SSE parsing) and the LM Studio SDK wrapper."""
+import json
+import time
+from dataclasses import replace
+
+import pytest
+
+from z_forge.llm_backends import (
+    BACKEND_LMSTUDIO,
+    BACKEND_OPENAI,
+    GenerationInterrupted,
+    GenerationTimeout,
+    OpenAICompatibleBackend,
+    PredictionWatchdog,
+    _HTTPPrediction,
+    get_backend,
+)
+
+SYSTEM = "Write one sentence."
+MESSAGE = "subjects: 1"
+
+
+class _Response:
+    """Minimal requests.Response stand-in that yields fixed SSE lines."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.closed = False
+
+    def iter_lines(self, decode_unicode=False):
+        yield from self._lines
+
+    def close(self):
+        self.closed = True
+
+
+def _event(**chunk):
+    return "data: " + json.dumps(chunk)
+
+
+@pytest.fixture
+def http_config(config):
+    return replace(config, backend=BACKEND_OPENAI, model="fake-model-7b")
+
+
+def test_sse_parse_collects_content_usage_and_timings():
+    response = _Response(
+        [
+            ": keep-alive comment",
+            "",
+            _event(choices=[{"delta": {"role": "assistant"}}]),
+            _event(choices=[{"delta": {"content": "Hello"}}]),
+            _event(choices=[{"delta": {"content": " world"}}]),
+            _event(
+                choices=[{"delta": {}, "finish_reason": "stop"}],
+                usage={"prompt_tokens": 12, "completion_tokens": 2},
+                timings={"predicted_per_second": 42.5},
+            ),
+            "data: [DONE]",
+        ]
+    )
+    prediction = _HTTPPrediction(response, stream=True)
+
+    assert list(prediction) == ["Hello", " world"]
+    text, stats = prediction.result()
+    assert text == "Hello world"
+    assert (stats.prompt_tokens, stats.completion_tokens, stats.tokens_per_second) == (12, 2, 42.5)
+    assert stats.time_to_first_token is not None
+    assert response.closed
+
+
+def test_sse_stream_cut_short_is_a_connection_error():
+    response = _Response([_event(choices=[{"delta": {"content": "Hel"}}])])
+
+    with pytest.raises(ConnectionError):
+        _HTTPPrediction(response, stream=True).result()
+
+
+def test_http_stream_matches_the_non_streamed_text(fake_server, http_config):
+    backend = OpenAICompatibleBackend()
+    model, _ = backend.acquire(http_config)
+
+    streamed = backend.predict(model, http_config, SYSTEM, MESSAGE, stream=True)
+    fragments = list(streamed)
+    text, stats = streamed.result()
+    whole, whole_stats = backend.predict(model, http_config, SYSTEM, MESSAGE, stream=False).result()
+
+    assert len(fragments) == stats.completion_tokens == 40
+    assert text == "".join(fragments) == whole
+    assert stats.prompt_tokens == whole_stats.prompt_tokens > 0
+
+
+def test_http_session_is_reused_per_server(fake_server, http_config):
+    backend = OpenAICompatibleBackend()
+    for _ in range(3):
+        backend.predict("fake-model-7b", http_config, SYSTEM, MESSAGE, stream=False).result()
+
+    assert (backend.session_misses, backend.session_hits) == (1, 2)
+    backend.reconnect(http_config)
+    assert backend.resets == 1
+    assert "1 reset(s)" in backend.format_stats()
+
+
+def test_http_acquire_without_model_uses_the_first_listed(fake_server, http_config):
+    model, status = OpenAICompatibleBackend().acquire(replace(http_config, model=""))
+
+    assert (model, status) == ("fake-model-7b", None)
+
+
+def test_http_errors_carry_the_server_message(fake_server, http_config):
+    backend = OpenAICompatibleBackend()
+
+    with pytest.raises(RuntimeError, match="HTTP 404: Model not found: missing"):
+        backend.predict("missing", http_config, SYSTEM, MESSAGE, stream=True)
+
+
+def test_http_disconnect_mid_stream_is_a_connection_error(fake_server, http_config):
+    backend = OpenAICompatibleBackend()
+    fake_server.configure(failure_mode="disconnect")
+    fake_server.fail_next()
+
+    prediction = backend.predict("fake-model-7b", http_config, SYSTEM, MESSAGE, stream=True)
+    with pytest.raises(backend.connection_errors()):
+        prediction.result()
+
+
+def test_sdk_stream_and_response_agree(fake_server, config):
+    backend = get_backend(BACKEND_LMSTUDIO)
+    model, _ = backend.acquire(config)
+    try:
+        streamed = backend.predict(model, config, SYSTEM, MESSAGE, stream=True)
+        fragments = list(streamed)
+        text, stats = streamed.result()
+        whole, _ = backend.predict(model, config, SYSTEM, MESSAGE, stream=False).result()
+    finally:
+        backend.release(config)
+
+    assert text == "".join(fragments) == whole
+    assert stats.completion_tokens == 40
+
+
+def test_unknown_backend_falls_back_to_the_sdk():
+    assert get_backend("nonsense") is get_backend(BACKEND_LMSTUDIO)
+
+
+@pytest.mark.parametrize("backend_name", [BACKEND_LMSTUDIO, BACKEND_OPENAI])
+def test_timeout_cancels_before_the_first_token(fake_server, config, backend_name):
+    from z_forge.z_image_prompt import ZForgePromptBuilder
+
+    fake_server.configure(latency=5.0)
+    config = replace(config, backend=backend_name, model="fake-model-7b", generation_timeout=1)
+    backend = get_backend(backend_name)
+    model, _ = backend.acquire(config)
+    started = time.perf_counter()
+    try:
+        with pytest.raises(GenerationTimeout, match="after 1s"):
+            ZForgePromptBuilder()._generate(backend, model, config, SYSTEM, MESSAGE, None)
+    finally:
+        backend.release(config)
+
+    assert time.perf_counter() - started < 2.5
+
+
+@pytest.mark.parametrize("backend_name", [BACKEND_LMSTUDIO, BACKEND_OPENAI])
+def test_interrupt_cancels_before_the_first_token(fake_server, config, monkeypatch, backend_name):
+    from z_forge import llm_backends
+    from z_forge.z_image_prompt import ZForgePromptBuilder
+
+    fake_server.configure(latency=5.0)
+    config = replace(config, backend=backend_name, model="fake-model-7b")
+    backend = get_backend(backend_name)
+    model, _ = backend.acquire(config)
+    interrupt_at = time.perf_counter() + 0.3
+    monkeypatch.setattr(llm_backends, "processing_interrupted", lambda: time.perf_counter() > interrupt_at)
+    try:
+        with pytest.raises(GenerationInterrupted, match="after 0 tokens"):
+            ZForgePromptBuilder()._generate(backend, model, config, SYSTEM, MESSAGE, None)
+    finally:
+        backend.release(config)
+
+    assert time.perf_counter() < interrupt_at + 1.5
+
+
+def test_watchdog_stays_quiet_without_limits():
+    cancelled = []
+
+    class _Prediction:
+        def cancel(self):
+            cancelled.append(True)
+
+    with PredictionWatchdog(_Prediction(), timeout=0, interval=0.01) as watchdog:
+        time.sleep(0.05)
+
+    watchdog.raise_if_fired(0)
+    assert watchdog.fired is None and not cancelled
@@ -0,0 +1,59 @@
+"""LLM config: template references by hash and the fallback when a version is gone."""
+import pytest
+
+from z_forge import llm_config
+from z_forge.llm_config import LLMConfig, parse_llm_config
+from z_forge.template_registry import TemplateRegistry
+
+
+@pytest.fixture
+def registry(monkeypatch, tmp_path):
+    registry = TemplateRegistry(directory=str(tmp_path))
+    monkeypatch.setattr(llm_config, "get_template_registry", lambda: registry)
+    (tmp_path / "portrait.md").write_text("current portrait prompt", encoding="utf-8")
+    return registry
+
+
+def test_known_hash_resolves_without_warning(registry):
+    template = registry.get("portrait")
+    config = LLMConfig(system_prompt_template="portrait", system_prompt_hash=template.content_hash)
+
+    assert config.load_system_prompt() == ("current portrait prompt", None)
+
+
+def test_unknown_hash_falls_back_to_the_template_by_name(registry):
+    config = LLMConfig(system_prompt_template="portrait", system_prompt_hash="0123456789abcdef")
+
+    prompt, warning = config.load_system_prompt()
+
+    assert prompt == "current portrait prompt"
+    assert warning.startswith("[WARNING] The config's version of template 'portrait'")
+
+
+def test_unknown_hash_and_missing_file_use_the_default_with_a_warning(registry):
+    config = LLMConfig(system_prompt_template="deleted", system_prompt_hash="0123456789abcdef")
+
+    prompt, warning = config.load_system_prompt()
+
+    assert prompt == ""
+    assert "'deleted' is no longer available" in warning
+
+
+def test_resolve_system_prompt_puts_the_warning_in_the_status(registry):
+    from z_forge.z_image_prompt import resolve_system_prompt
+
+    config = LLMConfig(system_prompt_template="portrait", system_prompt_hash="0123456789abcdef")
+    prompt, info = resolve_system_prompt("", config)
+
+    assert prompt == "current portrait prompt"
+    assert info.splitlines()[0].startswith("[WARNING]")
+    assert info.splitlines()[1] == "[Prompt] Using template: portrait"
+
+
+def test_legacy_json_with_an_embedded_prompt_is_registered_by_hash(registry):
+    config = parse_llm_config('{"port": 5678, "system_prompt": "legacy prompt"}')
+
+    assert config.port == 5678
+    assert config.system_prompt_hash
+    assert config.system_prompt == "legacy prompt"
+    assert LLMConfig.from_json(config.to_json()) == config
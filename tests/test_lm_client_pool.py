@@ -0,0 +1,52 @@
+"""LM Studio client pool: reuse, hit counting and stale model handles."""
+import pytest
+
+from z_forge.lm_client_pool import LMStudioClientPool, get_client_pool
+
+MODEL = "fake-model-7b"
+
+
+@pytest.fixture
+def pool():
+    pool = LMStudioClientPool()
+    yield pool
+    pool.shutdown()
+
+
+def test_client_and_model_handles_are_reused(fake_server, pool):
+    client = pool.get_client(fake_server.address)
+    model = pool.get_model(fake_server.address, MODEL)
+
+    assert pool.get_client(fake_server.address) is client
+    assert pool.get_model(fake_server.address, MODEL) is model
+    assert (pool.model_hits, pool.model_misses) == (1, 1)
+
+
+def test_a_request_counts_one_client_hit(fake_server, pool):
+    for _ in range(3):
+        pool.get_client(fake_server.address)
+        pool.get_model(fake_server.address, MODEL)
+
+    assert (pool.client_hits, pool.client_misses) == (2, 1)
+
+
+def test_unload_drops_the_cached_handle(fake_server, pool):
+    pool.get_model(fake_server.address, MODEL)
+
+    assert pool.unload_model(fake_server.address, MODEL)
+    assert not pool.has_model(fake_server.address, MODEL)
+    assert MODEL not in fake_server.stats()["loaded"]
+    assert not pool.unload_model(fake_server.address, MODEL)
+
+
+def test_failed_prediction_drops_the_model_handle(fake_server, config, expansion_cache, expand):
+    expand(config.with_changes(seed=1))
+    assert get_client_pool().has_model(fake_server.address, None)
+
+    fake_server.fail_next(1)
+    prompt, info = expand(config.with_changes(seed=2))
+
+    assert prompt == ""
+    assert "[Pool] Dropped the cached model handle" in info
+    assert not get_client_pool().has_model(fake_server.address, None)
+    assert expand(config.with_changes(seed=3))[0]
@@ -0,0 +1,82 @@
+"""Lookahead: queued Prompt Builder runs are expanded once and counted once."""
+from dataclasses import replace
+
+import pytest
+
+from z_forge import z_image_prompt
+from z_forge.lookahead import LookaheadPrefetcher, _builder_inputs
+from z_forge.metrics import get_metrics
+from z_forge.z_image_prompt import ZForgePromptBuilder
+
+
+def _defaults(node_class):
+    """Widget defaults of a node, like a freshly added node in the graph."""
+    inputs = {}
+    for name, (kind, *options) in node_class.INPUT_TYPES()["required"].items():
+        spec = options[0] if options else {}
+        inputs[name] = spec.get("default", kind[0] if isinstance(kind, list) else None)
+    return inputs
+
+
+@pytest.fixture
+def metrics():
+    registry = get_metrics()
+    registry.reset()
+    yield registry
+    registry.reset()
+
+
+@pytest.fixture
+def prefetcher(monkeypatch):
+    prefetcher = LookaheadPrefetcher()
+    monkeypatch.setattr(z_image_prompt, "get_lookahead", lambda: prefetcher)
+    return prefetcher
+
+
+@pytest.fixture
+def node(config):
+    inputs = {
+        **_defaults(ZForgePromptBuilder),
+        "llm_mode": "Internal (LM Studio)",
+        "llm_config": replace(config, lookahead=True, cache_mode="Off"),
+        "seed": 11,
+    }
+    return {"class_type": "ZForgePromptBuilder", "inputs": inputs}
+
+
+def _stage_counts(metrics):
+    return {row["stage"]: row["count"] for row in metrics.quantiles()}
+
+
+def _requests(metrics):
+    text = metrics.render_prometheus()
+    return sorted(
+        line.split("outcome=")[1].split('"')[1]
+        for line in text.splitlines()
+        if line.startswith("zforge_requests_total{")
+    )
+
+
+def test_prefetched_run_is_counted_once(fake_server, metrics, prefetcher, node):
+    prefetcher._prefetch({"1": node}, node)
+    assert prefetcher.prefetched == 1
+
+    output = ZForgePromptBuilder().build_prompt(**node["inputs"])
+
+    assert "[Lookahead] HIT" in output["result"][-1]
+    assert fake_server.stats()["completions"] == 1
+    assert _requests(metrics) == ["prefetch_hit"]
+    counts = _stage_counts(metrics)
+    assert counts["generation"] == counts["config_parse"] == counts["yaml_build"] == 1
+
+
+def test_unseeded_randomize_is_not_prefetched(node):
+    node["inputs"].update(randomize_scene=True, seed=None)
+
+    assert _builder_inputs({"1": node}, node) is None
+
+
+def test_linked_builder_inputs_are_not_prefetched(node):
+    node["inputs"]["location"] = ["9", 0]
+
+    assert _builder_inputs({"1": node, "9": {"class_type": "PrimitiveNode"}}, node) is None
@@ -0,0 +1,83 @@
+"""Metrics: histograms, quantiles and the Prometheus text rendering."""
+import pytest
+
+from z_forge.metrics import Histogram, MetricsRegistry
+
+
+@pytest.fixture
+def metrics():
+    return MetricsRegistry()
+
+
+def test_large_counters_keep_every_digit(metrics):
+    metrics.record_generation("m", "t", tokens_in=1234567, tokens_out=98765432, tokens_per_second=None)
+    metrics.inc("zforge_requests_total", outcome="ok")
+    metrics.inc("zforge_requests_total", 0.25, outcome="partial")
+    text = metrics.render_prometheus()
+
+    assert 'zforge_tokens_total{direction="in",model="m",template="t"} 1234567\n' in text
+    assert 'zforge_tokens_total{direction="out",model="m",template="t"} 98765432\n' in text
+    assert 'zforge_requests_total{outcome="ok"} 1\n' in text
+    assert 'zforge_requests_total{outcome="partial"} 0.25\n' in text
+    assert "e+" not in text
+
+
+def test_histogram_rendering(metrics):
+    metrics.observe_stage("generation", 0.3, model="m", template="t")
+    metrics.observe_stage("generation", 1234567.125, model="m", template="t")
+    lines = metrics.render_prometheus().splitlines()
+    labels = 'model="m",stage="generation",template="t"'
+
+    assert lines[:2] == [
+        "# HELP zforge_stage_duration_seconds Duration of each prompt pipeline stage",
+        "# TYPE zforge_stage_duration_seconds histogram",
+    ]
+    assert f'zforge_stage_duration_seconds_bucket{{{labels},le="0.0005"}} 0' in lines
+    assert f'zforge_stage_duration_seconds_bucket{{{labels},le="0.5"}} 1' in lines
+    assert f'zforge_stage_duration_seconds_bucket{{{labels},le="120"}} 1' in lines
+    assert f'zforge_stage_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+    assert f"zforge_stage_duration_seconds_sum{{{labels}}} 1234567.425" in lines
+    assert f"zforge_stage_duration_seconds_count{{{labels}}} 2" in lines
+
+
+def test_label_values_are_escaped(metrics):
+    metrics.inc("zforge_requests_total", model='a "quoted"\\model\n')
+
+    assert 'model="a \\"quoted\\"\\\\model\\n"' in metrics.render_prometheus()
+
+
+def test_quantiles_interpolate_within_buckets():
+    histogram = Histogram((1.0, 2.0, 4.0))
+    for value in (0.5, 1.5, 1.5, 3.0):
+        histogram.observe(value)
+
+    assert histogram.quantile(0.5) == 1.5
+    assert histogram.quantile(1.0) == 4.0
+    assert Histogram((1.0,)).quantile(0.5) is None
+
+
+def test_time_stage_records_even_when_the_block_fails(metrics):
+    with pytest.raises(ValueError), metrics.time_stage("yaml_build"):
+        raise ValueError
+
+    (row,) = metrics.quantiles()
+    assert (row["stage"], row["count"]) == ("yaml_build", 1)
+
+
+def test_muted_drops_only_this_threads_named_metrics(metrics):
+    import threading
+
+    with metrics.muted("zforge_requests_total"):
+        metrics.inc("zforge_requests_total", outcome="ok")
+        metrics.observe_stage("generation", 0.1)
+        worker = threading.Thread(target=metrics.inc, args=("zforge_requests_total",), kwargs={"outcome": "other"})
+        worker.start()
+        worker.join()
+    with metrics.muted():
+        metrics.observe_stage("yaml_build", 0.1)
+    metrics.inc("zforge_requests_total", outcome="after")
+
+    text = metrics.render_prometheus()
+    assert 'outcome="ok"' not in text
+    assert 'outcome="other"' in text and 'outcome="after"' in text
+    assert [row["stage"] for row in metrics.quantiles()] == ["generation"]
@@ -0,0 +1,58 @@
+"""Model list fetching and the connection test against the fake server."""
+import pytest
+
+from z_forge import model_fetcher
+
+
+@pytest.fixture
+def fetch_calls(monkeypatch):
+    """Count live fetches (the connection test must not repeat them needlessly)."""
+    calls = []
+    fetch = model_fetcher.fetch_models_from_server
+
+    def counted(server_url, timeout=5.0):
+        calls.append(server_url)
+        return fetch(server_url, timeout)
+
+    monkeypatch.setattr(model_fetcher, "fetch_models_from_server", counted)
+    return calls
+
+
+def test_fetch_lists_the_servers_models(fake_server):
+    models, error = model_fetcher.fetch_models_from_server(fake_server.url)
+
+    assert error is None
+    assert models == ["fake-model-7b", "fake-model-1b"]
+
+
+def test_connection_to_a_running_server(fake_server, fetch_calls):
+    success, message = model_fetcher.test_connection(fake_server.host, fake_server.port)
+
+    assert success
+    assert message == "Connected! 2 model(s) available"
+    assert len(fetch_calls) == 1
+
+
+def test_connection_result_is_served_from_cache(fake_server, fetch_calls):
+    model_fetcher.test_connection(fake_server.host, fake_server.port)
+    success, _ = model_fetcher.test_connection(fake_server.host, fake_server.port)
+
+    assert success
+    assert len(fetch_calls) == 1
+
+
+def test_unseen_dead_server_is_fetched_once(dead_address, fetch_calls):
+    host, port = dead_address.split(":")
+    success, message = model_fetcher.test_connection(host, int(port), timeout=1.0)
+
+    assert not success
+    assert message == f"Cannot connect to http://{dead_address} - is LM Studio running?"
+    assert len(fetch_calls) == 1
+
+
+def test_cached_failure_is_rechecked_live(dead_address, fetch_calls):
+    host, port = dead_address.split(":")
+    model_fetcher.test_connection(host, int(port), timeout=1.0)
+    model_fetcher.test_connection(host, int(port), timeout=1.0)
+
+    assert len(fetch_calls) == 2  # First sight, then one live re-check of the cached error
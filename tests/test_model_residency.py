@@ -0,0 +1,120 @@
+"""Model residency: reference counting, idle unloads and the acquire/unload race."""
+import threading
+import time
+
+import pytest
+
+from z_forge.lm_client_pool import get_client_pool
+from z_forge.model_residency import ModelResidencyManager
+
+MODEL = "fake-model-7b"  # Loaded when the fake server starts
+OTHER_MODEL = "fake-model-1b"
+
+
+@pytest.fixture
+def residency():
+    return ModelResidencyManager()
+
+
+def test_first_acquire_loads_and_second_reuses(fake_server, residency):
+    first, load_info = residency.acquire(fake_server.address, OTHER_MODEL)
+    second, reuse_info = residency.acquire(fake_server.address, OTHER_MODEL)
+
+    assert load_info.startswith(f"[Residency] Loaded {OTHER_MODEL}")
+    assert reuse_info is None
+    assert second is first
+    assert residency.loads == 1
+    assert fake_server.stats()["loads"] == 1
+
+
+def test_model_already_loaded_on_the_server_is_not_reported(fake_server, residency):
+    _, info = residency.acquire(fake_server.address, MODEL)
+
+    assert info is None
+    assert residency.loads == 0
+
+
+def test_model_unloaded_outside_z_forge_is_loaded_through_a_fresh_handle(fake_server, residency):
+    old, _ = residency.acquire(fake_server.address, OTHER_MODEL)
+    residency.release(fake_server.address, OTHER_MODEL, idle_ttl=None)
+    fake_server.unload(OTHER_MODEL)
+
+    new, info = residency.acquire(fake_server.address, OTHER_MODEL)
+
+    assert info.startswith(f"[Residency] Loaded {OTHER_MODEL}")
+    assert new is not old
+    assert OTHER_MODEL in fake_server.stats()["loaded"]
+    assert residency.reloads == 0
+
+
+def test_model_stays_loaded_while_another_user_holds_it(fake_server, residency):
+    residency.acquire(fake_server.address, MODEL)
+    residency.acquire(fake_server.address, MODEL)
+
+    assert residency.release(fake_server.address, MODEL, idle_ttl=0).startswith(
+        "[Residency] Kept loaded (1 other"
+    )
+    assert MODEL in fake_server.stats()["loaded"]
+    assert residency.release(fake_server.address, MODEL, idle_ttl=0) == "[LLM] Model unloaded"
+    assert MODEL not in fake_server.stats()["loaded"]
+
+
+def test_idle_ttl_unloads_after_the_delay(fake_server, residency):
+    residency.acquire(fake_server.address, MODEL)
+    info = residency.release(
+        fake_server.address, MODEL, idle_ttl=0.1, keep_warm_while_queued=False
+    )
+
+    assert info.startswith("[Residency] Unload after 0.1s idle")
+    assert MODEL in fake_server.stats()["loaded"]
+    deadline = time.monotonic() + 5
+    while residency.unloads == 0 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert residency.unloads == 1
+    assert MODEL not in fake_server.stats()["loaded"]
+
+
+def test_acquire_during_idle_wait_cancels_the_unload(fake_server, residency):
+    residency.acquire(fake_server.address, MODEL)
+    residency.release(fake_server.address, MODEL, idle_ttl=0.1, keep_warm_while_queued=False)
+    residency.acquire(fake_server.address, MODEL)
+    time.sleep(0.3)
+
+    assert residency.unloads == 0
+    assert MODEL in fake_server.stats()["loaded"]
+
+
+def test_unload_disabled_keeps_the_model(fake_server, residency):
+    residency.acquire(fake_server.address, MODEL)
+
+    assert residency.release(fake_server.address, MODEL, idle_ttl=None) == (
+        "[Residency] Kept loaded (unload disabled)"
+    )
+    assert get_client_pool().has_model(fake_server.address, MODEL)
+
+
+def test_acquire_during_an_unload_gets_a_fresh_handle(fake_server, residency, monkeypatch):
+    old, _ = residency.acquire(fake_server.address, MODEL)
+    unloading = threading.Event()
+    unload = type(old).unload
+
+    def slow_unload(handle):
+        unloading.set()
+        time.sleep(0.3)
+        unload(handle)
+        handle.unloaded = True
+
+    monkeypatch.setattr(type(old), "unload", slow_unload)
+    releaser = threading.Thread(
+        target=residency.release, args=(fake_server.address, MODEL, 0)
+    )
+    releaser.start()
+    unloading.wait(5)
+    new, info = residency.acquire(fake_server.address, MODEL)
+    releaser.join(5)
+
+    assert new is not old
+    assert not getattr(new, "unloaded", False)
+    assert info.startswith("[Residency] Reloaded")
+    assert residency._models[(fake_server.address, MODEL)].refcount == 1
+    assert get_client_pool().has_model(fake_server.address, MODEL)
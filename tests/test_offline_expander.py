@@ -0,0 +1,133 @@
+"""Offline expander and template tables: deterministic prose from the preset tables."""
+from pathlib import Path
+
+import pytest
+
+from z_forge.offline_expander import expand_offline
+from z_forge.template_tables import NEUTRAL_COLUMN, neutral_expansion, parse_template_tables
+
+PROMPTS = Path(__file__).resolve().parent.parent / "system_prompts"
+
+
+@pytest.fixture(scope="module")
+def realistic():
+    return (PROMPTS / "v3_system_prompt.md").read_text(encoding="utf-8")
+
+
+@pytest.fixture(scope="module")
+def fantasy():
+    return (PROMPTS / "v3_fantasy_system_prompt.md").read_text(encoding="utf-8")
+
+
+def test_female_subject_with_scene_and_composition(realistic):
+    prompt, info = expand_offline(
+        realistic,
+        "subjects: 1\nage: 28\ngender: female\nethnicity: Japanese\nbody_type: athletic\n"
+        "hair: short black hair\nexpression: calm\ngaze: eyes closed\n"
+        "outfit: hoodie and joggers\nfootwear: sneakers\nlocation: harbor\ntime: dusk\n"
+        "framing: close-up\ncamera_angle: low angle",
+    )
+
+    assert prompt == (
+        "A 28-year-old Japanese woman with toned defined muscles, strong shoulders, visible abs, "
+        "powerful thighs, her fit physique showing strength and discipline. She has short black "
+        "hair. Her expression is calm, her eyes are closed. She wears a hoodie and joggers with "
+        "sneakers. The scene unfolds in a harbor. It is dusk. Close-up shot from a low angle."
+    )
+    assert info.startswith("[Offline] Rule-based expansion:")
+
+
+def test_non_binary_subject_gets_neutral_body_text_and_plural_verbs(realistic):
+    prompt, _ = expand_offline(
+        realistic,
+        "subjects: 1\nage: late 20s\ngender: non-binary\nbody_type: SSBBW\n"
+        "gaze: looking at the camera\noutfit: leather armor",
+    )
+
+    assert prompt == (
+        "An immensely large person in their late 20s with a massive soft belly that hangs "
+        "heavily, thick arms with deep fat folds, wide hips spreading generously, multiple chin "
+        "rolls, their overwhelming size commanding the frame. They are looking at the camera. "
+        "They wear leather armor."
+    )
+
+
+def test_unspecified_gender_is_neutral(realistic):
+    prompt, _ = expand_offline(
+        realistic,
+        "subjects: 1\ngender: NA\nbody_type: curvy\nhair: long red hair\npose: leaning on a railing",
+    )
+
+    assert prompt == (
+        "A person with pronounced curves, defined waist flowing into wide hips, soft thighs, "
+        "their hourglass figure creating elegant lines. They have long red hair. Their pose is "
+        "leaning on a railing."
+    )
+
+
+def test_custom_gender_text_gets_a_noun_and_custom_build(realistic):
+    prompt, _ = expand_offline(
+        realistic, "subjects: 1\ngender: genderfluid\nage: 40\nbody_type: lanky\noutfit: trench coat"
+    )
+
+    assert prompt == "A 40-year-old genderfluid person with a lanky build. They wear a trench coat."
+
+
+def test_fantasy_races_and_multiple_subjects(fantasy):
+    prompt, _ = expand_offline(
+        fantasy,
+        "subjects: 2\ngender: male\nethnicity: dwarf\nbody_type: stocky\n"
+        "s2_gender: non-binary\ns2_ethnicity: elf\ns2_body_type: hourglass\n"
+        "interaction: they share a map",
+        genre="fantasy",
+    )
+
+    assert prompt.startswith(
+        "The first figure is a man with a compact powerful build, broad shoulders, thick waist, "
+        "strong legs, his dense frame close to the ground. He is a dwarf with "
+    )
+    assert (
+        "The second figure is a person with balanced proportions, full hips with a dramatically "
+        "narrower waist, creating the classic hourglass silhouette. They are an elf with "
+    ) in prompt
+    assert prompt.endswith("their ageless beauty carrying an otherworldly grace. They share a map.")
+
+
+def test_preset_keywords_never_appear_literally(realistic):
+    for body_type in ("SSBBW", "dad-bod", "superchub"):
+        prompt, _ = expand_offline(realistic, f"subjects: 1\ngender: female\nbody_type: {body_type}")
+        assert body_type not in prompt
+
+
+def test_same_variables_give_the_same_prompt(realistic):
+    yaml_text = "subjects: 1\ngender: male\nbody_type: dad-bod\nhair: grey stubble"
+
+    assert expand_offline(realistic, yaml_text)[0] == expand_offline(realistic, yaml_text)[0]
+
+
+def test_template_tables_are_parsed_with_aliases(realistic):
+    tables = parse_template_tables(realistic)
+
+    assert tables.genders["non-binary"].subject == "they"
+    assert tables.genders["female"].object == "her"
+    assert tables.body_types["ssbbw"] is tables.body_types["supersize"]
+    assert tables.body_type("dad-bod", "female").startswith("a man with a relaxed build")
+    assert tables.body_type("not-a-preset", "female") == ""
+
+
+def test_neutral_column_is_used_when_the_template_has_one():
+    tables = parse_template_tables(
+        "## BODY TYPE PRESETS\n\n"
+        "| Keyword | Female Expansion | Male Expansion | Non-Binary Expansion |\n"
+        "|---|---|---|---|\n"
+        "| `lithe` | a lithe woman | a lithe man | a lithe person with an easy stride |\n"
+    )
+
+    assert tables.body_type("lithe", NEUTRAL_COLUMN) == "a lithe person with an easy stride"
+
+
+def test_neutral_expansion_drops_gendered_anatomy():
+    assert neutral_expansion(
+        "a woman with a smaller bust and waist but noticeably wider hips and full thighs, "
+        "full breasts, her weight carried in her lower body"
+    ) == "a woman with a smaller waist but noticeably wider hips and full thighs, her weight carried in her lower body"
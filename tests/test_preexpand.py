@@ -0,0 +1,60 @@
+"""Keyword pre-expansion: preset keywords replaced before the LLM sees them."""
+from pathlib import Path
+
+import pytest
+
+from z_forge.llm_config import LLMConfig
+from z_forge.offline_expander import find_leaked_keywords, preexpand_variables, preset_keywords
+from z_forge.template_tables import parse_template_tables
+
+PROMPTS = Path(__file__).resolve().parent.parent / "system_prompts"
+
+
+@pytest.fixture(scope="module")
+def template():
+    return (PROMPTS / "v3_fantasy_system_prompt.md").read_text(encoding="utf-8")
+
+
+VARIABLES = (
+    "# === SUBJECT 1 ===\n"
+    "subjects: 2\n"
+    "gender: male\n"
+    "body_type: SSBBW\n"
+    "ethnicity: orc\n"
+    "# === SUBJECT 2 ===\n"
+    "s2_gender: female\n"
+    "s2_body_type: broad-shouldered\n"
+    "s2_ethnicity: NA\n"
+    'story: "She waits.\nbody_type: SSBBW is what she calls him."'
+)
+
+
+def test_keywords_become_gendered_expansions(template):
+    expanded, replaced = preexpand_variables(VARIABLES, parse_template_tables(template))
+    lines = expanded.splitlines()
+
+    assert replaced == ["SSBBW", "orc"]
+    assert lines[3].startswith("body_type: an immensely large man with a massive soft belly")
+    assert "SSBBW" not in "\n".join(lines[:6])
+    assert lines[4].startswith("ethnicity: an orc with greenish-grey skin")
+    # Custom text, NA fields, comments and multi-line values are left alone
+    assert lines[0] == "# === SUBJECT 1 ==="
+    assert lines[6:] == VARIABLES.splitlines()[6:]
+
+
+def test_ordinary_words_are_not_reported_as_leaks():
+    keywords = preset_keywords(VARIABLES)
+
+    assert keywords == ["SSBBW", "broad-shouldered"]
+    assert find_leaked_keywords("an immensely large ssbbw man", keywords) == ["SSBBW"]
+    assert find_leaked_keywords("a curvy elf", ["curvy", "elf"]) == []
+
+
+def test_prepare_request_reports_the_expansion(template):
+    from z_forge.z_image_prompt import ZForgePromptBuilder
+
+    config = LLMConfig(preexpand_keywords=True)
+    _, user_message, status = ZForgePromptBuilder()._prepare_request(template, VARIABLES, config)
+
+    assert "body_type: SSBBW\n" not in user_message
+    assert status == ["[Pre-expand] Expanded 2 keyword(s): SSBBW, orc"]
@@ -0,0 +1,87 @@
+"""Prompt compiler: relevance pruning of the preset tables in a system prompt."""
+from pathlib import Path
+
+import pytest
+
+from z_forge.prompt_compiler import _compile, compile_system_prompt, extract_prompt_keys
+
+TEMPLATE_PATH = Path(__file__).resolve().parent.parent / "system_prompts" / "v3_system_prompt.md"
+
+
+@pytest.fixture(scope="module")
+def template():
+    return TEMPLATE_PATH.read_text(encoding="utf-8")
+
+
+def variables(*subjects, count=None):
+    lines = [f"subjects: {count or len(subjects)}"]
+    for index, (gender, body_type, ethnicity) in enumerate(subjects, 1):
+        prefix = f"s{index}_" if index > 1 else ""
+        lines += [
+            f"{prefix}gender: {gender}",
+            f"{prefix}body_type: {body_type}",
+            f"{prefix}ethnicity: {ethnicity}",
+        ]
+    return "\n".join(lines)
+
+
+def test_keys_come_from_active_subjects_only():
+    yaml_text = variables(("female", '"SSBBW"', "Japanese"), ("male", "lean", "NA"), count=1)
+
+    assert extract_prompt_keys(yaml_text) == (
+        frozenset({"female"}),
+        frozenset({"ssbbw"}),
+        frozenset({"japanese"}),
+    )
+
+
+def test_alias_row_brings_in_the_row_it_points_to(template):
+    prompt, info = compile_system_prompt(template, variables(("female", "SSBBW", "NA")))
+
+    assert "| `SSBBW` / `superchub` |" in prompt
+    assert "| `supersize` |" in prompt
+    assert "`curvy`" not in prompt and "### Medium Build" not in prompt
+    assert info.startswith("[Prompt] Pruned to 3/")  # female, SSBBW and supersize
+    assert len(prompt) < len(template) / 2
+
+
+def test_unneeded_gender_column_and_subsection_are_dropped(template):
+    prompt, _ = compile_system_prompt(template, variables(("female", "athletic", "NA")))
+
+    assert "| Keyword | Female Expansion |" in prompt
+    assert "Male Expansion" not in prompt
+    assert "an athletic" not in prompt and "a woman with toned defined muscles" in prompt
+    assert "### Non-Binary Handling" not in prompt
+
+
+def test_non_binary_subjects_keep_both_columns_and_their_guidance(template):
+    prompt, _ = compile_system_prompt(template, variables(("non-binary", "slim", "NA")))
+
+    assert "| Keyword | Female Expansion | Male Expansion |" in prompt
+    assert "### Non-Binary Handling" in prompt
+
+
+def test_rules_outside_the_preset_sections_are_kept(template):
+    prompt, _ = compile_system_prompt(template, variables(("male", "lean", "Korean")))
+
+    for heading in ("## GENDER HANDLING", "## WRITING STYLE RULES", "## OUTPUT FORMAT"):
+        assert heading in prompt
+    assert "**Asian:**" in prompt and "**European:**" not in prompt
+
+
+def test_template_without_presets_is_returned_unchanged():
+    template = "# Plain\n\nDescribe the variables as prose."
+
+    assert compile_system_prompt(template, variables(("female", "curvy", "NA"))) == (
+        template,
+        "[Prompt] Nothing to prune in this template",
+    )
+
+
+def test_compiled_prompts_are_cached(template):
+    yaml_text = variables(("male", "stocky", "Nigerian"))
+    compile_system_prompt(template, yaml_text)
+    hits = _compile.cache_info().hits
+    compile_system_prompt(template, yaml_text.replace("stocky", "Stocky"))
+
+    assert _compile.cache_info().hits == hits + 1
@@ -0,0 +1,168 @@
+"""Prompt reservoir: seed prediction, pop, pruning and refill selection."""
+import pytest
+
+from z_forge import prompt_reservoir
+from z_forge.llm_config import LLMConfig
+from z_forge.prompt_reservoir import MAX_SEED_MISSES, PromptReservoir, pool_key
+from z_forge.z_image_prompt import ZForgePromptBuilder
+
+INPUTS = {"genre": "Realistic", "people": "1", "llm_mode": "Internal (LM Studio)"}
+
+
+@pytest.fixture
+def reservoir(monkeypatch, tmp_path):
+    # Refills are driven by the tests, not the background worker
+    monkeypatch.setattr(PromptReservoir, "_worker_loop", lambda self: None)
+    return PromptReservoir(path=str(tmp_path / "reservoir.json"))
+
+
+@pytest.fixture
+def refills(monkeypatch):
+    """Replace the Prompt Builder run of a refill; returns the seeds it was called with."""
+    seeds = []
+
+    def build_prompt(self, **inputs):
+        seeds.append(inputs["seed"])
+        return {
+            "ui": {"randomized_values": [{"seed": inputs["seed"]}]},
+            "result": ("vars", "instructions", f"prompt {inputs['seed']}", "status"),
+        }
+
+    monkeypatch.setattr(ZForgePromptBuilder, "build_prompt", build_prompt)
+    return seeds
+
+
+def _register(reservoir, seed, key="pool", depth=3):
+    reservoir.register(key, INPUTS, hosts=(), depth=depth, refills_per_minute=60, seed=seed)
+
+
+def _wanted(reservoir, key="pool"):
+    return reservoir._pools[key].wanted_seeds()
+
+
+def _fill(reservoir, key="pool"):
+    while reservoir._pools[key].missing_seeds():
+        reservoir._refill(key, reservoir._pools[key])
+
+
+def test_pool_key_follows_fixed_inputs_and_generation_settings():
+    config = LLMConfig()
+
+    assert pool_key(INPUTS, config) == pool_key({**INPUTS, "person_1_hair": "red"}, config)
+    assert pool_key(INPUTS, config) != pool_key({**INPUTS, "people": "2"}, config)
+    assert pool_key(INPUTS, config) != pool_key(INPUTS, LLMConfig(temperature=0.9))
+
+
+@pytest.mark.parametrize(
+    ("seeds", "wanted"),
+    [
+        ((5,), []),  # One run does not show how the seed changes
+        ((5, 6), [7, 8, 9]),  # increment
+        ((5, 4), [3, 2, 1]),  # decrement
+        ((5, 5), [5, 5, 5]),  # fixed
+        ((5, 912), []),  # randomize
+        ((None,), [None, None, None]),  # No seed input
+    ],
+)
+def test_wanted_seeds_are_predicted_from_the_last_two(reservoir, seeds, wanted):
+    for seed in seeds:
+        _register(reservoir, seed)
+
+    assert _wanted(reservoir) == wanted
+    assert reservoir.is_refilling("pool") == bool(wanted)
+
+
+def test_refilling_stops_after_repeated_misses_and_resumes_on_a_hit(reservoir):
+    # Pairs of consecutive seeds that always jump away from the prediction
+    for first in range(100, 100 * (MAX_SEED_MISSES + 2), 100):
+        _register(reservoir, first)
+        _register(reservoir, first + 1)
+    assert _wanted(reservoir) == []
+
+    _register(reservoir, 1000)
+    _register(reservoir, 1001)
+    _register(reservoir, 1002)
+    assert _wanted(reservoir) == [1003, 1004, 1005]
+
+
+def test_pop_only_serves_the_runs_seed(reservoir, refills):
+    _register(reservoir, 1)
+    _register(reservoir, 2)
+    _fill(reservoir)
+    assert refills == [3, 4, 5]
+
+    assert reservoir.pop("pool", 9) is None
+    assert reservoir.pop("other", 3) is None
+    entry, left = reservoir.pop("pool", 3)
+    assert (entry["seed"], entry["image_prompt"], left) == (3, "prompt 3", 2)
+    assert reservoir.pop("pool", 3) is None
+    assert (reservoir.hits, reservoir.misses) == (1, 3)
+
+
+def test_register_drops_entries_the_next_runs_will_not_use(reservoir, refills):
+    _register(reservoir, 1)
+    _register(reservoir, 2)
+    _fill(reservoir)
+
+    reservoir.pop("pool", 3)
+    _register(reservoir, 3)
+    assert [e["seed"] for e in reservoir._pools["pool"].entries] == [4, 5]
+    assert reservoir._pools["pool"].missing_seeds() == [6]
+
+    _register(reservoir, 77)  # randomize
+    assert not reservoir._pools["pool"].entries
+
+
+def test_refill_picks_the_emptiest_predictable_pool(reservoir, refills):
+    for key in ("a", "b", "random"):
+        _register(reservoir, 1, key=key)
+    _register(reservoir, 2, key="a")
+    _register(reservoir, 2, key="b")
+    _register(reservoir, 50, key="random")
+    reservoir._refill("a", reservoir._pools["a"])
+    for pool in reservoir._pools.values():
+        pool.last_refill = 0.0
+
+    key, _ = reservoir._next_refill()
+    assert key == "b"
+    _fill(reservoir, "a")
+    _fill(reservoir, "b")
+    assert reservoir._next_refill() is None
+    assert sorted(refills) == [3, 3, 4, 4, 5, 5]
+
+
+def test_refill_result_is_dropped_when_the_seed_is_no_longer_wanted(reservoir, monkeypatch):
+    _register(reservoir, 1)
+    _register(reservoir, 2)
+
+    def build_prompt(self, **inputs):
+        _register(reservoir, 40)  # A run with an unrelated seed arrives meanwhile
+        return {"ui": {"randomized_values": [{}]}, "result": ("v", "i", "prompt", "s")}
+
+    monkeypatch.setattr(ZForgePromptBuilder, "build_prompt", build_prompt)
+    reservoir._refill("pool", reservoir._pools["pool"])
+
+    assert not reservoir._pools["pool"].entries
+    assert reservoir.refills == 0
+
+
+def test_entries_and_seed_prediction_survive_a_restart(reservoir, refills, tmp_path):
+    _register(reservoir, 1)
+    _register(reservoir, 2)
+    _fill(reservoir)
+    reservoir._save()
+
+    restarted = PromptReservoir(path=reservoir.path)
+    entry, left = restarted.pop("pool", 3)
+    _register(restarted, 3)
+
+    assert (entry["seed"], left) == (3, 2)
+    assert restarted._pools["pool"].missing_seeds() == [6]
+
+
+def test_pools_beyond_the_limit_drop_the_least_recently_used(reservoir, monkeypatch):
+    monkeypatch.setattr(prompt_reservoir, "MAX_POOLS", 2)
+    for key in ("a", "b", "c"):
+        _register(reservoir, None, key=key)
+
+    assert sorted(reservoir._pools) == ["b", "c"]
@@ -0,0 +1,74 @@
+"""Seeded randomization: derive_rng streams and the seed input of the randomizing nodes."""
+import pytest
+
+from z_forge.batch_node import ZForgeBatchPromptBuilder, build_random_variables
+from z_forge.randomizer import derive_rng, randomize_subject
+from z_forge.subject_node import ZForgePerson
+from z_forge.z_image_prompt import ZForgePromptBuilder
+
+NODES = (ZForgePromptBuilder, ZForgeBatchPromptBuilder, ZForgePerson)
+
+
+def test_same_seed_and_stream_give_the_same_values():
+    first = randomize_subject(genre="Realistic", rng=derive_rng(42, "person_1"))
+    again = randomize_subject(genre="Realistic", rng=derive_rng(42, "person_1"))
+
+    assert first == again
+
+
+def test_streams_and_seeds_are_independent():
+    draws = {
+        (seed, stream): derive_rng(seed, stream).random()
+        for seed in (1, 2)
+        for stream in ("person_1", "scene")
+    }
+
+    assert len(set(draws.values())) == 4
+
+
+def test_no_seed_falls_back_to_global_randomness():
+    assert derive_rng(None, "scene") is None
+
+
+def test_batch_items_do_not_depend_on_each_other():
+    items = [build_random_variables("Realistic", 1, "1:1", derive_rng(7, f"item_{i}")) for i in range(3)]
+
+    assert build_random_variables("Realistic", 1, "1:1", derive_rng(7, "item_2")) == items[2]
+
+
+@pytest.mark.parametrize("node", NODES, ids=lambda node: node.__name__)
+def test_seed_is_declared_the_same_way_on_every_node(node):
+    inputs = node.INPUT_TYPES()
+    kind, options = inputs["optional"]["seed"]
+
+    assert "seed" not in inputs["required"]
+    assert kind == "INT"
+    assert {k: v for k, v in options.items() if k != "tooltip"} == {
+        "default": 0,
+        "min": 0,
+        "max": 0xFFFFFFFFFFFFFFFF,
+        "control_after_generate": True,
+    }
+
+
+def test_is_changed_follows_the_seed():
+    person = {"genre": "Realistic", "reset": False, "randomize": True}
+    builder = {
+        "reset_all": False,
+        "randomize_all_people": False,
+        "randomize_person_1": True,
+        "randomize_scene": False,
+    }
+
+    assert ZForgePerson.IS_CHANGED(**person, seed=3) == ZForgePerson.IS_CHANGED(**person, seed=3)
+    assert ZForgePerson.IS_CHANGED(**person, seed=3) != ZForgePerson.IS_CHANGED(**person, seed=4)
+    assert ZForgePromptBuilder.IS_CHANGED(**builder, seed=3) == "seed:3"
+    assert ZForgeBatchPromptBuilder.IS_CHANGED(seed=3) == "seed:3"
+    assert ZForgeBatchPromptBuilder.IS_CHANGED(variable_sets="age: 30", seed=3) == ""
+    # Without a seed (older workflows) every randomized run is new
+    for changed in (
+        ZForgePerson.IS_CHANGED(**person),
+        ZForgePromptBuilder.IS_CHANGED(**builder),
+        ZForgeBatchPromptBuilder.IS_CHANGED(),
+    ):
+        assert not changed.startswith("seed:") and changed != ""
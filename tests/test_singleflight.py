@@ -0,0 +1,136 @@
+"""Single-flight: identical concurrent expansions share one generation."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from z_forge.llm_backends import GenerationInterrupted
+from z_forge.singleflight import SingleFlight
+from z_forge.z_image_prompt import ZForgePromptBuilder
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(flight.do, "key", work)
+        started.wait(5)
+        followers = [pool.submit(flight.do, "key", work) for _ in range(3)]
+        while flight.followers < 3:
+            threading.Event().wait(0.01)
+        release.set()
+
+        assert leader.result() == ("result", False)
+        assert [f.result() for f in followers] == [("result", True)] * 3
+    assert len(calls) == 1
+    assert flight.in_flight() == 0
+
+
+def test_leader_error_reaches_followers():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "key", fail)
+        started.wait(5)
+        follower = pool.submit(flight.do, "key", fail)
+        while flight.followers < 1:
+            threading.Event().wait(0.01)
+        release.set()
+
+        with pytest.raises(ValueError):
+            leader.result()
+        with pytest.raises(ValueError):
+            follower.result()
+
+
+def test_concurrent_identical_requests_generate_once(fake_server, config, expansion_cache, expand):
+    fake_server.configure(latency=0.3)
+    config = config.with_changes(cache_mode="Off")
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: expand(config), range(4)))
+
+    assert fake_server.stats()["completions"] == 1
+    assert len({prompt for prompt, _ in results}) == 1
+    shared = [info for _, info in results if "[Single-flight] Shared" in info]
+    assert len(shared) == 3
+    # Every caller keeps the generation's status lines
+    assert all("[LLM] Generated" in info for _, info in results)
+
+
+def test_random_seed_requests_are_not_coalesced(fake_server, config, expansion_cache, expand):
+    fake_server.configure(latency=0.2)
+    config = config.with_changes(seed=-1)
+
+    with ThreadPoolExecutor(3) as pool:
+        list(pool.map(lambda _: expand(config), range(3)))
+
+    assert fake_server.stats()["completions"] == 3
+
+
+def test_request_after_a_finished_flight_uses_the_cache(
+    fake_server, config, expansion_cache, expand, monkeypatch
+):
+    first, _ = expand(config)
+
+    # Miss the first lookup, as a caller that checked just before the leader stored its result
+    lookup = expansion_cache.get
+    lookups = []
+
+    def late_get(key, count_miss=True):
+        lookups.append(key)
+        return None if len(lookups) == 1 else lookup(key, count_miss)
+
+    monkeypatch.setattr(expansion_cache, "get", late_get)
+    second, info = expand(config)
+
+    assert second == first
+    assert "(stored by an identical request)" in info
+    assert fake_server.stats()["completions"] == 1
+
+
+def test_interrupted_lookahead_leader_does_not_fail_followers(
+    fake_server, config, expansion_cache, expand
+):
+    started = threading.Event()
+
+    def interrupted_expand(*args, **kwargs):
+        started.set()
+        threading.Event().wait(0.2)
+        raise GenerationInterrupted("Cancelled")
+
+    prefetcher = ZForgePromptBuilder()
+    prefetcher._expand = interrupted_expand
+    outcome = {}
+
+    def prefetch():
+        try:
+            expand(config, builder=prefetcher, prefetch=True)
+        except GenerationInterrupted:
+            outcome["prefetch"] = "interrupted"
+
+    worker = threading.Thread(target=prefetch)
+    worker.start()
+    started.wait(5)
+    prompt, info = expand(config)
+    worker.join(5)
+
+    assert outcome == {"prefetch": "interrupted"}
+    assert prompt
+    assert "Lookahead generation cancelled - generating here" in info
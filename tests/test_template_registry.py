@@ -0,0 +1,51 @@
+"""Template registry: hot reload and the bounded lookup by content hash."""
+import os
+
+import pytest
+
+from z_forge.template_registry import TemplateRegistry, hash_content
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return TemplateRegistry(directory=str(tmp_path), max_versions=3)
+
+
+def write(directory, name, content):
+    path = directory / f"{name}.md"
+    path.write_text(content, encoding="utf-8")
+    # Distinct mtimes even on filesystems with coarse timestamps
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_edited_template_is_reloaded_and_old_version_stays_addressable(tmp_path, registry):
+    write(tmp_path, "v3", "first")
+    first = registry.get("v3")
+    write(tmp_path, "v3", "second version")
+    second = registry.get("v3")
+
+    assert second.content == "second version"
+    assert registry.list_templates() == ["v3"]
+    assert registry.get_by_hash(first.content_hash).content == "first"
+
+
+def test_old_versions_are_dropped_least_recently_used(tmp_path, registry):
+    write(tmp_path, "current", "on disk")
+    current = registry.get("current")
+    old = [registry.register("imported", f"config prompt {i}") for i in range(4)]
+
+    assert registry.get_by_hash(old[0].content_hash) is None
+    assert registry.get_by_hash(old[1].content_hash) is None
+    assert registry.get_by_hash(old[3].content_hash) is old[3]
+    assert registry.get_by_hash(current.content_hash) is current
+
+
+def test_lookup_keeps_a_version_alive(registry):
+    kept = registry.register("imported", "kept")
+    for i in range(5):
+        registry.get_by_hash(kept.content_hash)
+        registry.register("imported", f"other {i}")
+
+    assert registry.get_by_hash(hash_content("kept")) is kept
+    assert len(registry._by_hash) == 3
@@ -0,0 +1,134 @@
+"""Compact wire format: dropped fields, aliases and values that span lines."""
+import pytest
+
+from z_forge.yaml_builder import (
+    COMPACT_FORMAT_NOTE,
+    build_yaml_from_widgets,
+    choose_aliases,
+    compact_variables,
+    parse_variables,
+    plain_value,
+    to_wire_format,
+)
+
+SUBJECT = {
+    "s1_age": 30,
+    "s1_gender": "female",
+    "s1_ethnicity": "Japanese",
+    "s1_body_type": "athletic",
+    "s1_body_type_custom": "",
+    "s1_hair": "short black hair",
+    "s1_face": "",
+    "s1_expression": "calm",
+    "s1_gaze": "",
+    "s1_hands": "",
+    "s1_skin_texture": "",
+    "s1_skin_details": "",
+    "s1_extras": "",
+    "s1_outfit": "linen suit",
+    "s1_accessories": "",
+    "s1_footwear": "",
+    "s1_pose": "",
+}
+
+
+def widgets_yaml(**scene):
+    return build_yaml_from_widgets(subjects=1, aspect="portrait", **SUBJECT, **scene)
+
+
+def test_compact_drops_na_fields_and_unused_subjects():
+    compact = compact_variables(widgets_yaml(location="harbor", interaction="they hug"))
+
+    assert compact.splitlines() == [
+        "subjects: 1",
+        "aspect: portrait",
+        "age: 30",
+        "gender: female",
+        "ethnicity: Japanese",
+        "body_type: athletic",
+        "hair: short black hair",
+        "expression: calm",
+        "outfit: linen suit",
+        "location: harbor",
+    ]
+
+
+def test_multi_line_widget_value_is_sent_whole():
+    verbose = widgets_yaml(story="She waits.\nThe train never comes.")
+    compact = compact_variables(verbose)
+
+    assert 'story: "She waits.\nThe train never comes."' in compact
+    assert dict(parse_variables(verbose))["story"] == '"She waits.\nThe train never comes."'
+    assert plain_value(dict(parse_variables(compact))["story"]) == (
+        "She waits. The train never comes."
+    )
+
+
+def test_block_scalars_keep_their_content():
+    yaml_text = (
+        "subjects: 1\n"
+        "story: |\n"
+        "  She waits on the platform.\n"
+        "\n"
+        "  The train never comes.\n"
+        "# === SCENE ===\n"
+        "location: station\n"
+        "weather: NA\n"
+    )
+
+    pairs = dict(parse_variables(yaml_text))
+
+    assert pairs["story"] == (
+        "|\n  She waits on the platform.\n\n  The train never comes."
+    )
+    assert pairs["location"] == "station"
+    assert plain_value(pairs["story"]) == "She waits on the platform. The train never comes."
+    assert compact_variables(yaml_text) == (
+        "subjects: 1\n"
+        "story: |\n"
+        "  She waits on the platform.\n"
+        "\n"
+        "  The train never comes.\n"
+        "location: station"
+    )
+
+
+def test_values_containing_colons():
+    verbose = widgets_yaml(location="platform 9: north end", era='1920s "jazz age"')
+    pairs = dict(parse_variables(compact_variables(verbose)))
+
+    assert plain_value(pairs["location"]) == "platform 9: north end"
+    assert plain_value(pairs["era"]) == '1920s "jazz age"'
+
+
+def test_compact_output_is_valid_yaml_with_the_same_values():
+    yaml = pytest.importorskip("yaml")
+    verbose = widgets_yaml(
+        story="She waits.\nThe train never comes.", location="platform 9: north end"
+    )
+
+    loaded = yaml.safe_load(compact_variables(verbose))
+
+    assert loaded["story"] == "She waits. The train never comes."
+    assert loaded["location"] == "platform 9: north end"
+    assert yaml.safe_load(verbose)["story"] == loaded["story"]
+
+
+def test_aliases_are_used_only_when_they_save_characters():
+    verbose = widgets_yaml(atmosphere="hushed", lighting="sodium lamps", camera_angle="low angle")
+    aliased, note = to_wire_format(verbose, "Compact + Aliases")
+
+    # One subject never repeats a key often enough to pay for the legend
+    assert (aliased, note) == (compact_variables(verbose), COMPACT_FORMAT_NOTE)
+
+    repeated = "\n".join(f"{prefix}accessories: ring" for prefix in ("", "s2_", "s3_") * 4)
+    assert choose_aliases(repeated) == {"accessories": "acc"}
+    compact = compact_variables("subjects: 3\n" + repeated, {"accessories": "acc"})
+    assert compact.count("acc: ring") == 12
+    assert "accessories" not in compact
+
+
+def test_verbose_is_unchanged():
+    verbose = widgets_yaml(story="two\nlines")
+
+    assert to_wire_format(verbose, "Verbose") == (verbose, "")
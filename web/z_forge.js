@@ -5,9 +5,12 @@
  * When the node is executed with randomize enabled, the server returns
  * randomized values that this script uses to update the widget display.
  *
- * Also handles dynamic dropdown filtering for genre-based ethnicity options.
+ * Also handles dynamic dropdown filtering for genre-based ethnicity options,
+ * live previews of prompts streamed from LM Studio, and the LLM Config
+ * node's connection test / model refresh buttons.
  */
 import { app } from "../../scripts/app.js";
+import { ComfyWidgets } from "../../scripts/widgets.js";
 
 // Ethnicity preset lists (must match presets.py)
 const ETHNICITIES_REALISTIC = [
@@ -165,19 +168,41 @@ app.registerExtension({
     async setup() {
         // Listen for model list updates from server
         app.api.addEventListener("zforge-models-updated", (event) => {
-            const { models } = event.detail;
+            const { models, server_url } = event.detail;
             if (!models) return;
 
-            // Find all LLM Config nodes and update their dropdowns
+            // Update LLM Config nodes pointing at the server the list came from
             for (const node of app.graph._nodes) {
-                if (node.comfyClass === "ZForgeLLMConfig") {
-                    updateModelDropdown(node, models);
-                }
+                if (node.comfyClass !== "ZForgeLLMConfig") continue;
+                if (server_url && getNodeServerUrl(node) !== server_url) continue;
+                updateModelDropdown(node, models);
             }
         });
+    },
+
+    async nodeCreated(node) {
+        if (node.comfyClass !== "ZForgeLLMConfig") return;
+
+        // Load this node's own server list once its widget values are restored
+        setTimeout(async () => {
+            const result = await fetchZForge(node, "/zforge/models");
+            if (result.success && result.models) {
+                updateModelDropdown(node, result.models);
+            }
+        }, 0);
     }
 });
 
+/**
+ * Server URL an LLM Config node points at (matches model_fetcher's keys)
+ * @param {Object} node - The LLM Config node
+ */
+function getNodeServerUrl(node) {
+    const host = node.widgets?.find(w => w.name === "lm_server_host")?.value;
+    const port = node.widgets?.find(w => w.name === "lm_server_port")?.value;
+    return `http://${host}:${port}`;
+}
+
 /**
  * Update model dropdown with new model list
  * @param {Object} node - The LLM Config node
@@ -194,3 +219,106 @@ function updateModelDropdown(node, models) {
         node.setDirtyCanvas(true, true);
     }
 }
+
+/**
+ * Live preview of prompts streamed from LM Studio
+ * The Prompt Builder sends zforge-stream events while Internal mode generates
+ */
+app.registerExtension({
+    name: "ZForge.StreamPreview",
+
+    async setup() {
+        app.api.addEventListener("zforge-stream", (event) => {
+            const { node: nodeId, text, ttft, tps, done } = event.detail;
+            const node = findNodeById(nodeId);
+            if (!node) return;
+
+            const widget = getStreamPreviewWidget(node);
+            const state = done ? "done" : "generating";
+            widget.value = `[${state} | first token ${ttft}s | ${tps} tok/s]\n\n${text}`;
+            node.setDirtyCanvas(true, true);
+        });
+    }
+});
+
+/**
+ * Find a graph node from a server-side node id
+ * Subgraph and group node ids ("5:12") are not numbers, so look up the raw id first
+ * @param {string|number} nodeId - UNIQUE_ID sent by the node
+ */
+function findNodeById(nodeId) {
+    return app.graph.getNodeById(nodeId) ?? app.graph.getNodeById(Number(nodeId));
+}
+
+/**
+ * Get (or lazily create) the read-only preview widget on a node
+ * @param {Object} node - The Prompt Builder node
+ */
+function getStreamPreviewWidget(node) {
+    return getReadOnlyTextWidget(node, "stream_preview");
+}
+
+/**
+ * Get (or lazily create) a read-only, non-serialised text widget
+ * @param {Object} node - The ComfyUI node
+ * @param {string} name - Widget name
+ */
+function getReadOnlyTextWidget(node, name) {
+    let widget = node.widgets?.find(w => w.name === name);
+    if (!widget) {
+        widget = ComfyWidgets["STRING"](node, name, ["STRING", { multiline: true }], app).widget;
+        widget.inputEl.readOnly = true;
+        widget.inputEl.style.opacity = 0.7;
+        widget.serialize = false;  // Display only, never saved into the workflow
+    }
+    return widget;
+}
+
+/**
+ * Connection test and model refresh buttons for LLM Config nodes
+ * Backed by /zforge/test and /zforge/models so the graph is never re-queued
+ */
+app.registerExtension({
+    name: "ZForge.ConnectionButtons",
+
+    async nodeCreated(node) {
+        if (node.comfyClass !== "ZForgeLLMConfig") return;
+
+        node.addWidget("button", "Test connection", null, async () => {
+            const status = getReadOnlyTextWidget(node, "connection_status");
+            status.value = "Testing...";
+            const result = await fetchZForge(node, "/zforge/test");
+            status.value = result.message;
+            node.setDirtyCanvas(true, true);
+        });
+
+        node.addWidget("button", "Refresh models", null, async () => {
+            const status = getReadOnlyTextWidget(node, "connection_status");
+            status.value = "Refreshing...";
+            const result = await fetchZForge(node, "/zforge/models", { refresh: "1" });
+            if (result.success && result.models) {
+                updateModelDropdown(node, result.models);
+            }
+            status.value = `Models: ${result.message}`;
+            node.setDirtyCanvas(true, true);
+        });
+    }
+});
+
+/**
+ * Call a Z-Forge route with the node's host/port settings
+ * @param {Object} node - The LLM Config node
+ * @param {string} route - Route path
+ * @param {Object} extra - Additional query parameters
+ */
+async function fetchZForge(node, route, extra = {}) {
+    const host = node.widgets.find(w => w.name === "lm_server_host")?.value ?? "";
+    const port = node.widgets.find(w => w.name === "lm_server_port")?.value ?? "";
+    const params = new URLSearchParams({ host, port, ...extra });
+    try {
+        const response = await app.api.fetchApi(`${route}?${params}`);
+        return await response.json();
+    } catch (error) {
+        return { success: false, message: `Request failed: ${error}` };
+    }
+}
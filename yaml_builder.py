@@ -280,3 +280,228 @@ def build_yaml_from_widgets(
         yaml_parts.append(f"camera_angle: {format_value(camera_angle)}")
 
     return "\n".join(yaml_parts)
+
+
+# ═══════════════════════════════════════════════════════════════
+#                      COMPACT WIRE FORMAT
+# ═══════════════════════════════════════════════════════════════
+
+# How variables are serialised for the LLM (the variables output stays verbose)
+WIRE_FORMATS = ["Verbose", "Compact", "Compact + Aliases"]
+
+# Short keys used by "Compact + Aliases" (subject prefixes like s2_ are kept)
+KEY_ALIASES = {
+    "ethnicity": "eth",
+    "body_type": "body",
+    "expression": "expr",
+    "skin_texture": "skin",
+    "skin_details": "marks",
+    "accessories": "acc",
+    "footwear": "shoes",
+    "interaction": "interact",
+    "atmosphere": "mood",
+    "background": "bg",
+    "lighting": "light",
+    "camera_angle": "angle",
+}
+
+COMPACT_FORMAT_NOTE = (
+    "\n\n---\n\n## COMPACT VARIABLE FORMAT\n\n"
+    "Variables arrive in compact form: fields that are NA and subjects beyond "
+    "`subjects` are omitted entirely. A missing field means NA — ignore it."
+)
+
+
+def parse_variables(yaml_text: str) -> list[tuple[str, str]]:
+    """
+    Parse top-level "key: value" YAML variables, preserving order.
+
+    Comments, blank lines and lines without a key are skipped. Values are
+    kept exactly as written (including quotes), together with their
+    continuation lines: indented lines (block scalars such as `story: |`)
+    and the rest of a double-quoted string that spans lines. A value can
+    therefore be written back as `key: value` unchanged.
+
+    Args:
+        yaml_text: YAML variables as produced by build_yaml_from_widgets
+
+    Returns:
+        List of (key, value) pairs; see plain_value() for the text of a value
+    """
+    return list(variable_lines(yaml_text).values())
+
+
+def variable_lines(yaml_text: str) -> dict[int, tuple[str, str]]:
+    """
+    Find the lines that start a variable (see parse_variables).
+
+    Returns:
+        Line index -> (key, value) for each variable, in order
+    """
+    variables: dict[int, list[str]] = {}
+    current: Optional[list[str]] = None
+    blank_lines = 0  # Blank lines since the last line of the current value
+    for index, line in enumerate(yaml_text.splitlines()):
+        stripped = line.strip()
+        if current is not None and (
+            _unclosed_quote(current[1]) or (stripped and line[0].isspace())
+        ):
+            current[1] += "\n" * (blank_lines + 1) + line
+            blank_lines = 0
+            continue
+        if not stripped:
+            blank_lines += 1
+            continue
+        blank_lines = 0
+        if stripped.startswith("#") or ":" not in stripped:
+            continue
+        key, value = stripped.split(":", 1)
+        current = variables[index] = [key.strip(), value.strip()]
+    return {index: (key, value) for index, (key, value) in variables.items()}
+
+
+def _unclosed_quote(value: str) -> bool:
+    """Whether a raw value opens a double-quoted string that has not ended yet."""
+    if not value.startswith('"'):
+        return False
+    index = 1
+    while index < len(value):
+        if value[index] == "\\":
+            index += 2
+            continue
+        if value[index] == '"':
+            return False
+        index += 1
+    return True
+
+
+def plain_value(value: str) -> str:
+    """
+    Text of a raw value from parse_variables() on one line.
+
+    Quotes and block scalar indicators are removed and line breaks folded
+    into spaces.
+    """
+    value = value.strip()
+    if value[:1] in ("|", ">"):
+        value = value.partition("\n")[2]
+    elif len(value) > 1 and value[0] == value[-1] == '"':
+        value = value[1:-1].replace('\\"', '"')
+    elif len(value) > 1 and value[0] == value[-1] == "'":
+        value = value[1:-1].replace("''", "'")
+    return " ".join(value.split()) if "\n" in value else value
+
+
+def subject_index(key: str) -> int:
+    """Subject number a key belongs to (s2_/s3_ prefixes, otherwise 1)."""
+    if len(key) > 3 and key[0] == "s" and key[1].isdigit() and key[2] == "_":
+        return int(key[1])
+    return 1
+
+
+def _split_subject(key: str) -> tuple[str, str]:
+    """Split a key into its subject prefix ("" or "s2_"/"s3_") and field name."""
+    prefix = key[:3] if subject_index(key) > 1 else ""
+    return prefix, key[len(prefix):]
+
+
+def compact_variables(yaml_text: str, aliases: Optional[dict[str, str]] = None) -> str:
+    """
+    Serialise variables compactly for the LLM.
+
+    Drops NA/empty fields, section comments, and every field of subjects
+    beyond the `subjects` count (including interaction for a single subject).
+
+    Args:
+        yaml_text: Verbose YAML variables
+        aliases: Field name -> short key replacements (see choose_aliases)
+
+    Returns:
+        Compact "key: value" lines
+    """
+    pairs = parse_variables(yaml_text)
+    values = dict(pairs)
+    try:
+        subjects = int(values.get("subjects", "1"))
+    except ValueError:
+        subjects = 1
+
+    lines = []
+    for key, value in pairs:
+        if is_empty(value) or subject_index(key) > subjects:
+            continue
+        if key == "interaction" and subjects < 2:
+            continue
+        if aliases:
+            prefix, field = _split_subject(key)
+            key = prefix + aliases.get(field, field)
+        lines.append(f"{key}: {value}")
+    return "\n".join(lines)
+
+
+def choose_aliases(compact_text: str) -> dict[str, str]:
+    """
+    Pick the KEY_ALIASES worth using for a compact payload.
+
+    An alias is kept only if shortening its field everywhere saves more
+    characters than its legend entry costs, and the set only if it also
+    covers the legend's fixed text - so aliasing never grows the request.
+
+    Args:
+        compact_text: Output of compact_variables() without aliases
+
+    Returns:
+        Field name -> short key for the aliases to apply (empty if none pay off)
+    """
+    uses: dict[str, int] = {}
+    for key, _ in parse_variables(compact_text):
+        field = _split_subject(key)[1]
+        if field in KEY_ALIASES:
+            uses[field] = uses.get(field, 0) + 1
+
+    chosen = {}
+    saved = 0
+    for field, count in uses.items():
+        short = KEY_ALIASES[field]
+        gain = count * (len(field) - len(short)) - len(f"{short} = {field}, ")
+        if gain > 0:
+            chosen[field] = short
+            saved += gain
+    if saved <= len(alias_note({})):
+        return {}
+    return chosen
+
+
+def alias_note(aliases: dict[str, str]) -> str:
+    """System prompt note describing the given short key aliases."""
+    mapping = ", ".join(f"{short} = {field}" for field, short in aliases.items())
+    return f"\n\nShort keys: {mapping}."
+
+
+def to_wire_format(yaml_text: str, wire_format: str) -> tuple[str, str]:
+    """
+    Convert verbose variables to the selected wire format.
+
+    "Compact + Aliases" shortens only the keys that pay for their legend
+    entry, so it is never larger than plain "Compact".
+
+    Args:
+        yaml_text: Verbose YAML variables
+        wire_format: One of WIRE_FORMATS
+
+    Returns:
+        Tuple of (variables to send, note to append to the system prompt)
+    """
+    if wire_format == "Compact":
+        return compact_variables(yaml_text), COMPACT_FORMAT_NOTE
+    if wire_format == "Compact + Aliases":
+        aliases = choose_aliases(compact_variables(yaml_text))
+        if not aliases:
+            return compact_variables(yaml_text), COMPACT_FORMAT_NOTE
+        return compact_variables(yaml_text, aliases), COMPACT_FORMAT_NOTE + alias_note(aliases)
+    return yaml_text, ""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English/YAML)."""
+    return (len(text) + 3) // 4
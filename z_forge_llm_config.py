@@ -5,67 +5,42 @@ Separate node for LM Studio connection and generation settings.
 This node outputs a ZFORGE_LLM_CONFIG that can be connected to the
 main Z-Forge Prompt Builder node for Internal mode LLM generation.
 """
-import json
-import os
-
-from .model_fetcher import (
-    CUSTOM_MODEL_OPTION,
-    get_model_choices,
-    refresh_model_cache,
-    test_connection,
-)
-
-# System prompts directory
-_SYSTEM_PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "system_prompts")
-
-# Cache for system prompt templates
-_cached_templates: list[str] = []
+from .expansion_cache import CACHE_MODES
+from .host_balancer import BALANCE_LEAST_OUTSTANDING, BALANCING_POLICIES
+from .llm_backends import BACKEND_LMSTUDIO, BACKENDS
+from .llm_config import LLMConfig
+from .model_fetcher import CUSTOM_MODEL_OPTION, get_model_choices
+from .template_registry import get_template_registry
+from .yaml_builder import WIRE_FORMATS
 
 
 def get_system_prompt_templates() -> list[str]:
     """
-    Scan system_prompts directory for .md files.
+    List system prompt templates in the system_prompts directory.
+
+    The directory is only re-scanned when it changes (see TemplateRegistry).
 
     Returns:
         List of template names (without .md extension)
     """
-    global _cached_templates
-
-    if not os.path.isdir(_SYSTEM_PROMPTS_DIR):
-        return ["v3_system_prompt"]
-
-    templates = []
-    try:
-        for filename in os.listdir(_SYSTEM_PROMPTS_DIR):
-            if filename.endswith(".md"):
-                # Remove .md extension for display
-                name = filename[:-3]
-                templates.append(name)
-    except OSError:
-        pass
-
-    if not templates:
-        templates = ["v3_system_prompt"]
-
-    _cached_templates = sorted(templates)
-    return _cached_templates
+    return get_template_registry().list_templates() or ["v3_system_prompt"]
 
 
 def load_system_prompt(template_name: str) -> str:
     """
     Load a system prompt template by name.
 
+    The file is only re-read when its mtime or size changes, so edits are
+    picked up without re-reading unchanged templates on every execution.
+
     Args:
         template_name: Template name (without .md extension)
 
     Returns:
         Template content or error message
     """
-    filepath = os.path.join(_SYSTEM_PROMPTS_DIR, f"{template_name}.md")
-
     try:
-        with open(filepath, encoding="utf-8") as f:
-            return f.read()
+        return get_template_registry().get(template_name).content
     except FileNotFoundError:
         return f"[ERROR] Template not found: {template_name}.md"
     except OSError as e:
@@ -77,7 +52,9 @@ class ZForgeLLMConfig:
     LLM Configuration node for Z-Forge.
 
     Provides LM Studio connection settings, generation parameters,
-    and system prompt template selection.
+    and system prompt template selection. Connection tests and model
+    refreshes are served by the /zforge/test and /zforge/models routes
+    (buttons on the node), so they never re-execute the graph.
     """
 
     CATEGORY = "Z-Forge"
@@ -85,11 +62,31 @@ class ZForgeLLMConfig:
     RETURN_NAMES = ("llm_config",)
     FUNCTION = "build_config"
 
+    # Memoized INPUT_TYPES, rebuilt only when the model or template lists change
+    _input_types_key: tuple = ()
+    _input_types: dict = {}
+
     @classmethod
     def INPUT_TYPES(cls):
         model_choices = get_model_choices()
         template_choices = get_system_prompt_templates()
 
+        key = (tuple(model_choices), tuple(template_choices))
+        if key != cls._input_types_key:
+            cls._input_types = cls._build_input_types(model_choices, template_choices)
+            cls._input_types_key = key
+        return cls._input_types
+
+    @classmethod
+    def IS_CHANGED(cls, system_prompt_template="", **kwargs):
+        """Re-execute when the selected template file is edited."""
+        try:
+            return get_template_registry().get(system_prompt_template).content_hash
+        except OSError:
+            return ""
+
+    @staticmethod
+    def _build_input_types(model_choices: list[str], template_choices: list[str]) -> dict:
         return {
             "required": {
                 # ═══════════════════════════════════════════════════════════════
@@ -121,18 +118,21 @@ class ZForgeLLMConfig:
                         "tooltip": "LM Studio server port",
                     },
                 ),
+                # Deprecated toggles, kept so the positional widget values of
+                # saved workflows still line up. Ignored - use the node's
+                # Test connection / Refresh models buttons instead.
                 "test_connection": (
                     "BOOLEAN",
                     {
                         "default": False,
-                        "tooltip": "Test connection to LM Studio server",
+                        "tooltip": "Deprecated and ignored - use the Test connection button",
                     },
                 ),
                 "refresh_models": (
                     "BOOLEAN",
                     {
                         "default": False,
-                        "tooltip": "Refresh the model list from server",
+                        "tooltip": "Deprecated and ignored - use the Refresh models button",
                     },
                 ),
                 # ═══════════════════════════════════════════════════════════════
@@ -207,7 +207,7 @@ class ZForgeLLMConfig:
                     "BOOLEAN",
                     {
                         "default": True,
-                        "tooltip": "Unload model after generation to free VRAM",
+                        "tooltip": "Unload model once it has been idle for unload_idle_seconds to free VRAM",
                     },
                 ),
                 # ═══════════════════════════════════════════════════════════════
@@ -222,18 +222,197 @@ class ZForgeLLMConfig:
                         "tooltip": "Random seed (-1 = random each time). Note: LLM seeds are less reliable than image seeds.",
                     },
                 ),
-            }
+            },
+            "optional": {
+                # ═══════════════════════════════════════════════════════════════
+                #                            BACKEND
+                # ═══════════════════════════════════════════════════════════════
+                "backend": (
+                    BACKENDS,
+                    {
+                        "default": BACKEND_LMSTUDIO,
+                        "tooltip": (
+                            "LM Studio SDK, or any OpenAI-compatible /v1/chat/completions server "
+                            "(LM Studio REST, llama.cpp, vLLM, Ollama) at host:port"
+                        ),
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                         LOAD BALANCING
+                # ═══════════════════════════════════════════════════════════════
+                "lm_server_hosts": (
+                    "STRING",
+                    {
+                        "default": "",
+                        "multiline": True,
+                        "tooltip": (
+                            "Extra LLM servers to spread requests over, one host:port per line "
+                            "with an optional weight (e.g. 192.168.1.20:1234 2)"
+                        ),
+                    },
+                ),
+                "balancing": (
+                    BALANCING_POLICIES,
+                    {
+                        "default": BALANCE_LEAST_OUTSTANDING,
+                        "tooltip": "How requests are spread when lm_server_hosts lists extra servers",
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                        MODEL RESIDENCY
+                # ═══════════════════════════════════════════════════════════════
+                "unload_idle_seconds": (
+                    "INT",
+                    {
+                        "default": 30,
+                        "min": 0,
+                        "max": 3600,
+                        "tooltip": "Seconds without requests before the model is unloaded (0 = right after each generation)",
+                    },
+                ),
+                "keep_warm_while_queued": (
+                    "BOOLEAN",
+                    {
+                        "default": True,
+                        "tooltip": "Keep the model loaded while ComfyUI still has prompts queued",
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                           LOOKAHEAD
+                # ═══════════════════════════════════════════════════════════════
+                "lookahead": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "Expand queued prompts in the background while the current one "
+                            "renders, so their Prompt Builder returns immediately"
+                        ),
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                        PROMPT RESERVOIR
+                # ═══════════════════════════════════════════════════════════════
+                "reservoir_depth": (
+                    "INT",
+                    {
+                        "default": 0,
+                        "min": 0,
+                        "max": 64,
+                        "tooltip": (
+                            "Pre-expanded prompts kept ready for runs with randomize_all_people "
+                            "and randomize_scene on (0 = off)"
+                        ),
+                    },
+                ),
+                "reservoir_refill_per_minute": (
+                    "INT",
+                    {
+                        "default": 6,
+                        "min": 1,
+                        "max": 120,
+                        "tooltip": "Maximum background expansions per minute while refilling the reservoir",
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                           STREAMING
+                # ═══════════════════════════════════════════════════════════════
+                "stream_tokens": (
+                    "BOOLEAN",
+                    {
+                        "default": True,
+                        "tooltip": "Show a live preview of the prompt on the Prompt Builder node while it generates",
+                    },
+                ),
+                "generation_timeout": (
+                    "INT",
+                    {
+                        "default": 0,
+                        "min": 0,
+                        "max": 3600,
+                        "tooltip": "Stop a generation that takes longer than this many seconds (0 = no limit)",
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                        EXPANSION CACHE
+                # ═══════════════════════════════════════════════════════════════
+                "cache_mode": (
+                    CACHE_MODES,
+                    {
+                        "default": "Memory",
+                        "tooltip": (
+                            "Reuse expansions for identical requests with a fixed seed. "
+                            "Memory + Disk also keeps them across restarts."
+                        ),
+                    },
+                ),
+                "cache_ttl_minutes": (
+                    "INT",
+                    {
+                        "default": 60,
+                        "min": 0,
+                        "max": 10080,
+                        "tooltip": "Expire cached expansions after this many minutes (0 = never)",
+                    },
+                ),
+                "cache_max_entries": (
+                    "INT",
+                    {
+                        "default": 256,
+                        "min": 1,
+                        "max": 100000,
+                        "tooltip": "Maximum expansions kept in memory (least recently used are evicted)",
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                          PROMPT SIZE
+                # ═══════════════════════════════════════════════════════════════
+                "wire_format": (
+                    WIRE_FORMATS,
+                    {
+                        "default": "Verbose",
+                        "tooltip": (
+                            "How variables are sent to the LLM. Compact drops NA fields and "
+                            "unused subjects; Aliases also shortens keys. The variables output stays verbose."
+                        ),
+                    },
+                ),
+                "prune_system_prompt": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "Send only the gender, body type and race/ethnicity preset rows "
+                            "these variables use. Cuts prompt size and time-to-first-token."
+                        ),
+                    },
+                ),
+                "preexpand_keywords": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "Replace body type and fantasy race keywords (SSBBW, dad-bod, elf...) with "
+                            "their expansion text before sending, so small models cannot leak them"
+                        ),
+                    },
+                ),
+                # ═══════════════════════════════════════════════════════════════
+                #                           FALLBACK
+                # ═══════════════════════════════════════════════════════════════
+                "offline_fallback": (
+                    "BOOLEAN",
+                    {
+                        "default": False,
+                        "tooltip": (
+                            "If LM Studio fails or is unreachable, fill image_prompt with the "
+                            "rule-based Offline expansion instead of leaving it empty"
+                        ),
+                    },
+                ),
+            },
         }
 
-    @classmethod
-    def IS_CHANGED(cls, refresh_models, test_connection, **kwargs):
-        """Force re-execution when refresh or test is requested."""
-        if refresh_models or test_connection:
-            import time
-
-            return str(time.time())
-        return ""
-
     def build_config(
         self,
         system_prompt_template: str,
@@ -250,29 +429,43 @@ class ZForgeLLMConfig:
         repeat_penalty: float,
         unload_llm: bool,
         seed: int,
-    ) -> tuple[str]:
+        unload_idle_seconds: int = 30,
+        keep_warm_while_queued: bool = True,
+        stream_tokens: bool = True,
+        cache_mode: str = "Memory",
+        cache_ttl_minutes: int = 60,
+        cache_max_entries: int = 256,
+        wire_format: str = "Verbose",
+        prune_system_prompt: bool = False,
+        preexpand_keywords: bool = False,
+        offline_fallback: bool = False,
+        backend: str = BACKEND_LMSTUDIO,
+        lm_server_hosts: str = "",
+        balancing: str = BALANCE_LEAST_OUTSTANDING,
+        generation_timeout: int = 0,
+        lookahead: bool = False,
+        reservoir_depth: int = 0,
+        reservoir_refill_per_minute: int = 6,
+    ) -> tuple[LLMConfig]:
         """
         Build the LLM configuration.
 
         Returns:
-            Tuple containing JSON-encoded config string
+            Tuple containing an immutable LLMConfig (use LLMConfig.to_json() to export)
         """
         status_lines = []
-        server_url = f"http://{lm_server_host}:{lm_server_port}"
-
-        # Load the selected system prompt template
-        system_prompt = load_system_prompt(system_prompt_template)
-        status_lines.append(f"Template: {system_prompt_template}")
 
-        # Handle test connection request
-        if test_connection:
-            success, msg = test_connection_func(lm_server_host, lm_server_port)
-            status_lines.append(f"Connection: {msg}")
-
-        # Handle refresh models request
-        if refresh_models:
-            success, msg = refresh_model_cache(server_url)
-            status_lines.append(f"Models: {msg}")
+        # Reference the selected template by content hash instead of copying it
+        try:
+            template = get_template_registry().get(system_prompt_template)
+            system_prompt_hash = template.content_hash
+            status_lines.append(f"Template: {system_prompt_template}")
+        except FileNotFoundError:
+            system_prompt_hash = ""
+            status_lines.append(f"[ERROR] Template not found: {system_prompt_template}.md")
+        except OSError as e:
+            system_prompt_hash = ""
+            status_lines.append(f"[ERROR] Failed to load template: {e}")
 
         # Determine which model to use
         if model_selection == CUSTOM_MODEL_OPTION:
@@ -280,29 +473,40 @@ class ZForgeLLMConfig:
         else:
             model = model_selection
 
-        # Build config dictionary
-        config = {
-            "host": lm_server_host,
-            "port": lm_server_port,
-            "server_url": server_url,
-            "model": model,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "top_p": top_p,
-            "top_k": top_k,
-            "repeat_penalty": repeat_penalty,
-            "unload": unload_llm,
-            "seed": seed,
-            "system_prompt": system_prompt,
-            "system_prompt_template": system_prompt_template,
-            "status": "\n".join(status_lines) if status_lines else "Ready",
-        }
-
-        return (json.dumps(config),)
-
-
-# Alias to avoid name collision with parameter
-test_connection_func = test_connection
+        config = LLMConfig(
+            host=lm_server_host,
+            port=lm_server_port,
+            backend=backend,
+            hosts=lm_server_hosts,
+            balancing=balancing,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            top_k=top_k,
+            repeat_penalty=repeat_penalty,
+            unload=unload_llm,
+            unload_idle_seconds=unload_idle_seconds,
+            keep_warm_while_queued=keep_warm_while_queued,
+            lookahead=lookahead,
+            reservoir_depth=reservoir_depth,
+            reservoir_refill_per_minute=reservoir_refill_per_minute,
+            seed=seed,
+            stream=stream_tokens,
+            generation_timeout=generation_timeout,
+            cache_mode=cache_mode,
+            cache_ttl_minutes=cache_ttl_minutes,
+            cache_max_entries=cache_max_entries,
+            wire_format=wire_format,
+            prune_system_prompt=prune_system_prompt,
+            preexpand_keywords=preexpand_keywords,
+            offline_fallback=offline_fallback,
+            system_prompt_template=system_prompt_template,
+            system_prompt_hash=system_prompt_hash,
+            status="\n".join(status_lines) if status_lines else "Ready",
+        )
+
+        return (config,)
 
 
 # Node registration
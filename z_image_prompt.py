@@ -4,11 +4,35 @@ ComfyUI custom node for building structured prompts.
 
 v0.0.3: LLM settings moved to separate ZForgeLLMConfig node.
 """
+import asyncio
 import json
 import logging
-import os
+import time
 from typing import Any, Optional
 
+from .expansion_cache import get_expansion_cache, make_cache_key, request_key
+from .host_balancer import get_host_balancer
+from .llm_backends import (
+    HTTP_READ_TIMEOUT,
+    GenerationInterrupted,
+    GenerationStats,
+    GenerationTimeout,
+    LLMBackend,
+    PredictionWatchdog,
+    comfy_supports_async_nodes,
+    get_backend,
+    processing_interrupted,
+    raise_interrupt,
+)
+from .llm_config import LLMConfig, parse_llm_config
+from .lookahead import get_lookahead
+from .metrics import get_metrics
+from .offline_expander import (
+    expand_offline,
+    find_leaked_keywords,
+    preexpand_variables,
+    preset_keywords,
+)
 from .presets import (
     ASPECTS,
     BODY_TYPES_ALL,
@@ -24,46 +48,46 @@ from .presets import (
     TIMES,
     WEATHERS,
 )
+from .prompt_compiler import compile_system_prompt
+from .prompt_reservoir import get_prompt_reservoir, pool_key
+from .randomizer import derive_rng, randomize_subject, seed_input
 from .randomizer import randomize_scene as generate_random_scene
-from .randomizer import randomize_subject
-from .yaml_builder import build_yaml_from_widgets
+from .server_events import STREAM_EVENT, send_event
+from .singleflight import get_single_flight
+from .template_registry import get_template_registry
+from .template_tables import parse_template_tables
+from .yaml_builder import build_yaml_from_widgets, estimate_tokens, to_wire_format
 
 logger = logging.getLogger("ZForge")
 
-# System prompts directory
-_SYSTEM_PROMPTS_DIR = os.path.join(os.path.dirname(__file__), "system_prompts")
-
-# Load default system prompt at module load
-_SYSTEM_PROMPT_PATH = os.path.join(_SYSTEM_PROMPTS_DIR, "v3_system_prompt.md")
-
-try:
-    with open(_SYSTEM_PROMPT_PATH, encoding="utf-8") as f:
-        DEFAULT_SYSTEM_PROMPT = f.read()
-except Exception as e:
-    logger.error(f"Failed to load system prompt: {e}")
-    DEFAULT_SYSTEM_PROMPT = (
-        "You are a cinematic image prompt engineer. "
-        "Expand the YAML variables into flowing prose."
-    )
-
-# Default LLM config values (used when no LLM Config node connected)
-DEFAULT_LLM_CONFIG = {
-    "host": "127.0.0.1",
-    "port": 1234,
-    "server_url": "http://127.0.0.1:1234",
-    "model": "",  # Empty = use currently loaded model
-    "temperature": 0.45,
-    "max_tokens": 512,
-    "top_p": 1.0,
-    "top_k": 0,
-    "repeat_penalty": 1.0,
-    "unload": True,
-    "seed": -1,  # -1 = random
-}
+# Default system prompt template (hot-reloaded through the template registry)
+DEFAULT_TEMPLATE_NAME = "v3_system_prompt"
+
+# Used only if the default template cannot be read
+FALLBACK_SYSTEM_PROMPT = (
+    "You are a cinematic image prompt engineer. "
+    "Expand the YAML variables into flowing prose."
+)
+
+
+def get_default_system_prompt() -> str:
+    """Get the default v3 system prompt, re-reading it only if the file changed."""
+    try:
+        return get_template_registry().get(DEFAULT_TEMPLATE_NAME).content
+    except OSError as e:
+        logger.error(f"Failed to load system prompt: {e}")
+        return FALLBACK_SYSTEM_PROMPT
+
+
+# Loaded at module load (kept for backwards compatibility)
+DEFAULT_SYSTEM_PROMPT = get_default_system_prompt()
+
+# Minimum seconds between live preview events while streaming
+STREAM_EVENT_INTERVAL = 0.1
 
 # Mode options
 INPUT_MODES = ["Widget Mode", "YAML Mode"]
-LLM_MODES = ["External (Output Only)", "Internal (LM Studio)"]
+LLM_MODES = ["External (Output Only)", "Internal (LM Studio)", "Offline (rule-based)"]
 PERSON_COUNTS = ["1", "2", "3"]
 
 
@@ -101,18 +125,26 @@ def parse_person_input(person_json: Optional[str]) -> dict[str, Any]:
         return {}
 
 
-def parse_llm_config(config_json: Optional[str]) -> dict[str, Any]:
-    """Parse LLM config JSON from connected LLM Config node."""
-    if not config_json:
-        return DEFAULT_LLM_CONFIG.copy()
-    try:
-        config = json.loads(config_json)
-        # Merge with defaults for any missing keys
-        result = DEFAULT_LLM_CONFIG.copy()
-        result.update(config)
-        return result
-    except (json.JSONDecodeError, TypeError):
-        return DEFAULT_LLM_CONFIG.copy()
+def resolve_system_prompt(override: str, config: LLMConfig) -> tuple[str, str]:
+    """
+    Determine the system prompt (priority: override > config > default).
+
+    Args:
+        override: System prompt override text from the node
+        config: Parsed LLM configuration
+
+    Returns:
+        Tuple of (system_prompt, status line)
+    """
+    if override.strip():
+        return override.strip(), "[Prompt] Using override"
+    system_prompt, warning = config.load_system_prompt()
+    if system_prompt:
+        template_name = config.system_prompt_template or "from config"
+        info = f"[Prompt] Using template: {template_name}"
+    else:
+        system_prompt, info = get_default_system_prompt(), "[Prompt] Using default v3"
+    return system_prompt, f"{warning}\n{info}" if warning else info
 
 
 def format_randomized_person(data: dict[str, Any], label: str) -> list:
@@ -142,7 +174,9 @@ class ZForgePromptBuilder:
     RETURN_TYPES = ("STRING", "STRING", "STRING", "STRING")
     RETURN_NAMES = ("variables", "llm_instructions", "image_prompt", "status")
     OUTPUT_NODE = True
-    FUNCTION = "build_prompt"
+    # Coroutine entry point where ComfyUI supports it, so other nodes keep
+    # executing while the LLM expansion is in flight
+    FUNCTION = "build_prompt_async" if comfy_supports_async_nodes() else "build_prompt"
 
     @classmethod
     def INPUT_TYPES(cls):
@@ -164,7 +198,8 @@ class ZForgePromptBuilder:
                         "default": "External (Output Only)",
                         "tooltip": (
                             "External: output for another LLM node. "
-                            "Internal: call LM Studio directly."
+                            "Internal: call LM Studio directly. "
+                            "Offline: rule-based expansion from the template tables (no LLM)."
                         ),
                     },
                 ),
@@ -382,103 +417,479 @@ class ZForgePromptBuilder:
                         "tooltip": "Replace default prompt expansion instructions",
                     },
                 ),
+                "seed": seed_input(
+                    "Seed for the randomize toggles - the same seed gives the same variables"
+                ),
             },
+            "hidden": {"unique_id": "UNIQUE_ID"},
         }
 
     @classmethod
-    def IS_CHANGED(cls, reset_all, randomize_all_people, randomize_person_1, randomize_scene, **kwargs):
-        """Force re-execution when reset or randomize is True."""
-        if reset_all or randomize_all_people or randomize_person_1 or randomize_scene:
-            import time
-
+    def IS_CHANGED(
+        cls, reset_all, randomize_all_people, randomize_person_1, randomize_scene, seed=None, **kwargs
+    ):
+        """Re-execute on reset, and when randomizing with a different seed."""
+        if reset_all:
             return str(time.time())
+        if randomize_all_people or randomize_person_1 or randomize_scene:
+            if seed is None:
+                return str(time.time())
+            return f"seed:{seed}"
         return ""
 
+    def _generate(
+        self,
+        backend: LLMBackend,
+        model: Any,
+        config: LLMConfig,
+        system_prompt: str,
+        user_message: str,
+        node_id: Optional[str],
+    ) -> tuple[str, Optional[float], Optional[float], GenerationStats]:
+        """
+        Run a single generation, streaming fragments to the frontend if enabled.
+
+        The streaming API is always used and a PredictionWatchdog cancels it
+        when the ComfyUI prompt is cancelled or the config's generation_timeout
+        passes, including before the first token; config.stream only controls
+        the previews.
+
+        Args:
+            backend: LLM backend to generate with
+            model: Model handle from backend.acquire()
+            config: LLM configuration
+            system_prompt: System prompt for the LLM
+            user_message: Variables to expand
+            node_id: ComfyUI node ID that receives the preview events
+
+        Returns:
+            Tuple of (text, time_to_first_token, tokens_per_second, stats)
+
+        Raises:
+            GenerationInterrupted: The ComfyUI prompt was cancelled
+            GenerationTimeout: generation_timeout passed before the text was complete
+        """
+        preview_node = node_id if config.stream else None
+        started = time.perf_counter()
+        first_token_at = None
+        last_sent = 0.0
+        fragments = []
+
+        prediction = backend.predict(model, config, system_prompt, user_message, stream=True)
+        with PredictionWatchdog(prediction, config.generation_timeout, started=started) as watchdog:
+            try:
+                for fragment in prediction:
+                    if watchdog.fired:
+                        break
+                    now = time.perf_counter()
+                    if first_token_at is None:
+                        first_token_at = now
+                    fragments.append(fragment)
+                    if preview_node is not None and now - last_sent >= STREAM_EVENT_INTERVAL:
+                        self._send_stream_event(
+                            preview_node, fragments, started, first_token_at, done=False
+                        )
+                        last_sent = now
+            except Exception:
+                # A cancelled prediction may end with a connection error; report the reason
+                watchdog.raise_if_fired(len(fragments))
+                raise
+        watchdog.raise_if_fired(len(fragments))
+
+        text, stats = prediction.result()
+
+        ttft, tps = self._send_stream_event(
+            preview_node, fragments, started, first_token_at, done=True
+        )
+        return text.strip(), ttft, tps, stats
+
+    @staticmethod
+    def _send_stream_event(
+        node_id: Optional[str],
+        fragments: list[str],
+        started: float,
+        first_token_at: Optional[float],
+        done: bool,
+    ) -> tuple[float, float]:
+        """Push the text streamed so far to the frontend and return (ttft, tokens/sec)."""
+        now = time.perf_counter()
+        ttft = (first_token_at or now) - started
+        decode_time = now - (first_token_at or now)
+        tps = len(fragments) / decode_time if decode_time > 0 else 0.0
+
+        if node_id is not None:
+            send_event(
+                STREAM_EVENT,
+                {
+                    "node": node_id,
+                    "text": "".join(fragments),
+                    "ttft": round(ttft, 3),
+                    "tps": round(tps, 1),
+                    "done": done,
+                },
+            )
+        return ttft, tps
+
+    @staticmethod
+    def _record_generation_metrics(
+        labels: dict[str, str],
+        elapsed: float,
+        ttft: Optional[float],
+        tps: Optional[float],
+        stats: GenerationStats,
+    ) -> None:
+        """Record generation timings and token counts (backend stats preferred when present)."""
+        metrics = get_metrics()
+        ttft = stats.time_to_first_token or ttft
+        tps = stats.tokens_per_second or tps
+        metrics.observe_stage("generation", elapsed, **labels)
+        if ttft is not None:
+            metrics.observe_stage("ttft", ttft, **labels)
+        metrics.record_generation(
+            tokens_in=stats.prompt_tokens,
+            tokens_out=stats.completion_tokens,
+            tokens_per_second=tps,
+            **labels,
+        )
+
+    def _generate_on_host(
+        self,
+        backend: LLMBackend,
+        config: LLMConfig,
+        system_prompt: str,
+        user_message: str,
+        node_id: Optional[str],
+        status_lines: list[str],
+    ) -> tuple[str, float, Optional[float], Optional[float], GenerationStats]:
+        """
+        Connect to the config's server, hold the model and generate.
+
+        A stale pooled connection is reopened and the generation retried once;
+        a second connection error is raised so the caller can fail over.
+
+        Returns:
+            Tuple of (text, elapsed seconds, time_to_first_token, tokens_per_second, stats)
+        """
+        metrics = get_metrics()
+        labels = config.metric_labels
+
+        with metrics.time_stage("client_connect", **labels):
+            backend.connect(config)
+
+        # Hold the model while generating; it is unloaded only once idle
+        load_started = time.perf_counter()
+        model, load_info = backend.acquire(config)
+        if load_info:
+            metrics.observe_stage("model_load", time.perf_counter() - load_started, **labels)
+            status_lines.append(load_info)
+
+        try:
+            started = time.perf_counter()
+            try:
+                result, ttft, tps, stats = self._generate(
+                    backend, model, config, system_prompt, user_message, node_id
+                )
+            except backend.connection_errors() as e:
+                status_lines.append(f"[LLM] Connection lost ({type(e).__name__}), reconnecting")
+                model = backend.reconnect(config)
+                result, ttft, tps, stats = self._generate(
+                    backend, model, config, system_prompt, user_message, node_id
+                )
+            except (GenerationInterrupted, GenerationTimeout):
+                raise
+            except Exception:
+                # A handle that fails for other reasons may be stale; resolve it anew next time
+                discard_info = backend.discard_model(config)
+                if discard_info:
+                    status_lines.append(discard_info)
+                raise
+            elapsed = time.perf_counter() - started
+            self._record_generation_metrics(labels, elapsed, ttft, tps, stats)
+        finally:
+            release_info = backend.release(config)
+            if release_info:
+                status_lines.append(release_info)
+
+        return result, elapsed, ttft, tps, stats
+
+    def _prepare_request(
+        self, system_prompt: str, yaml_input: str, config: LLMConfig
+    ) -> tuple[str, str, list[str]]:
+        """
+        Apply the config's request rewrites (pre-expansion, pruning, wire format).
+
+        Returns:
+            Tuple of (system_prompt, user_message, status_lines) as sent to the LLM
+        """
+        status_lines = []
+
+        # Replace preset keywords with their expansions so the LLM cannot leak them
+        if config.preexpand_keywords:
+            yaml_input, replaced = preexpand_variables(
+                yaml_input, parse_template_tables(system_prompt)
+            )
+            if replaced:
+                status_lines.append(
+                    f"[Pre-expand] Expanded {len(replaced)} keyword(s): {', '.join(replaced)}"
+                )
+
+        # Keep only the preset rows these variables use
+        if config.prune_system_prompt:
+            system_prompt, prune_info = compile_system_prompt(system_prompt, yaml_input)
+            status_lines.append(prune_info)
+
+        # Send variables in the configured wire format (compact drops NA fields)
+        if config.wire_format != "Verbose":
+            wire_input, note = to_wire_format(yaml_input, config.wire_format)
+            verbose_tokens = estimate_tokens(yaml_input)
+            wire_tokens = estimate_tokens(wire_input) + estimate_tokens(note)
+            saved = 100 * (verbose_tokens - wire_tokens) / verbose_tokens if verbose_tokens else 0
+            status_lines.append(
+                f"[Wire] {config.wire_format}: ~{wire_tokens} tokens vs ~{verbose_tokens} "
+                f"verbose ({saved:.0f}% saved)"
+            )
+            system_prompt = system_prompt + note
+            yaml_input = wire_input
+
+        return system_prompt, yaml_input, status_lines
+
     def _call_lm_studio(
         self,
         system_prompt: str,
         yaml_input: str,
-        config: dict[str, Any],
+        config: LLMConfig,
+        node_id: Optional[str] = None,
+        prefetch: bool = False,
     ) -> tuple[str, str]:
         """
         Call LM Studio for prompt expansion.
 
+        Generates through the backend selected in the config (lmstudio SDK or
+        an OpenAI-compatible HTTP server); both reuse their connections across
+        executions. Requests with a fixed seed are served
+        from the expansion cache when an identical request was seen before,
+        and requests the lookahead worker already expanded are served from it.
+
         Args:
             system_prompt: System prompt for the LLM
             yaml_input: YAML variables to expand
-            config: LLM configuration dictionary
+            config: LLM configuration
+            node_id: ComfyUI node ID for live streaming previews
+            prefetch: Called by the lookahead worker (don't consume prefetched results)
 
         Returns:
             Tuple of (expanded_prompt, status_info)
-        """
-        status_lines = []
 
-        try:
-            import lmstudio as lms
-        except ImportError:
-            return "", "[ERROR] lmstudio SDK not installed. Install with: pip install lmstudio"
+        Raises:
+            GenerationInterrupted: The ComfyUI prompt was cancelled
+        """
+        metrics = get_metrics()
+        labels = config.metric_labels
+
+        keywords = preset_keywords(yaml_input)
+        system_prompt, yaml_input, status_lines = self._prepare_request(
+            system_prompt, yaml_input, config
+        )
+
+        # Take the expansion the lookahead worker made while the previous prompt ran
+        if config.lookahead and not prefetch:
+            lookahead = get_lookahead()
+            lookahead.enable()
+            prefetched = lookahead.take(
+                request_key(system_prompt, yaml_input, config),
+                timeout=config.generation_timeout or HTTP_READ_TIMEOUT,
+            )
+            if prefetched is not None:
+                result, info, seconds = prefetched
+                metrics.inc("zforge_requests_total", outcome="prefetch_hit", **labels)
+                status_lines.append(f"[Lookahead] HIT - expanded in the background ({seconds:.2f}s)")
+                status_lines.extend(
+                    line for line in info.splitlines()
+                    if not line.startswith(("[Pre-expand]", "[Wire]", "[Prompt]"))
+                )
+                status_lines.append(lookahead.format_stats())
+                return result, "\n".join(status_lines)
 
-        try:
-            server_address = f"{config['host']}:{config['port']}"
-            status_lines.append(f"[LLM] Connecting to {server_address}")
-
-            model_id = config.get("model", "").strip() or None
-
-            with lms.Client(server_address) as client:
-                # Get model
-                if model_id:
-                    model = client.llm.model(model_id)
-                    status_lines.append(f"[LLM] Using model: {model_id}")
-                else:
-                    model = client.llm.model()
-                    status_lines.append("[LLM] Using currently loaded model")
-
-                # Build chat
-                chat = lms.Chat(system_prompt)
-                chat.add_user_message(yaml_input)
-
-                # Generation config
-                gen_config = {
-                    "temperature": config["temperature"],
-                    "maxTokens": config["max_tokens"],
-                    "contextOverflowPolicy": "truncateMiddle",
-                }
-
-                if config["top_p"] < 1.0:
-                    gen_config["topPSampling"] = config["top_p"]
-                if config["top_k"] > 0:
-                    gen_config["topKSampling"] = config["top_k"]
-                if config["repeat_penalty"] != 1.0:
-                    gen_config["repeatPenalty"] = config["repeat_penalty"]
-
-                # Add seed if specified (not -1)
-                seed = config.get("seed", -1)
-                if seed >= 0:
-                    gen_config["seed"] = seed
-                    status_lines.append(f"[LLM] Using seed: {seed}")
+        # Serve repeated fixed-seed requests from the expansion cache
+        cache = get_expansion_cache()
+        request_cache_key = make_cache_key(system_prompt, yaml_input, config)
+        cache_key = None
+        cache_mode = config.cache_mode
+        if cache_mode != "Off":
+            cache.configure(
+                max_entries=config.cache_max_entries,
+                ttl=config.cache_ttl_minutes * 60,
+                disk_enabled=cache_mode == "Memory + Disk",
+            )
+            cache_key = request_cache_key
+            if cache_key is None:
+                status_lines.append("[Cache] Bypassed (seed -1)")
+            else:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    metrics.inc("zforge_requests_total", outcome="cache_hit", **labels)
+                    status_lines.append(f"[Cache] HIT {cache_key[:12]}")
+                    status_lines.append(cache.format_stats())
+                    return cached, "\n".join(status_lines)
+                status_lines.append(f"[Cache] MISS {cache_key[:12]}")
+
+        # Concurrent identical fixed-seed requests share one generation
+        flight_key = request_cache_key
+        if flight_key is None:
+            return self._expand(
+                system_prompt, yaml_input, config, node_id, keywords, status_lines, cache_key
+            )
 
-                status_lines.append(
-                    f"[LLM] Generating: temp={config['temperature']}, "
-                    f"max_tokens={config['max_tokens']}"
+        def lead() -> Optional[tuple[str, list[str]]]:
+            # An identical request may have finished between our cache miss and this flight
+            if cache_key is not None:
+                cached = cache.get(cache_key, count_miss=False)
+                if cached is not None:
+                    metrics.inc("zforge_requests_total", outcome="cache_hit", **labels)
+                    return cached, [
+                        f"[Cache] HIT {cache_key[:12]} (stored by an identical request)",
+                        cache.format_stats(),
+                    ]
+            # Generation lines only - every caller keeps its own status lines
+            lines: list[str] = []
+            try:
+                result, _ = self._expand(
+                    system_prompt, yaml_input, config, node_id, keywords, lines, cache_key
                 )
+            except GenerationInterrupted:
+                if prefetch:
+                    return None  # Followers from queued prompts generate themselves
+                raise
+            return result, lines
+
+        single_flight = get_single_flight()
+        while True:
+            outcome, shared = single_flight.do(flight_key, lead)
+            if outcome is not None:
+                break
+            if not shared:
+                raise GenerationInterrupted("Cancelled during lookahead")
+            status_lines.append("[Single-flight] Lookahead generation cancelled - generating here")
+
+        result, lines = outcome
+        status_lines.extend(lines)
+        if shared:
+            metrics.inc("zforge_requests_total", outcome="coalesced", **labels)
+            status_lines.append(
+                f"[Single-flight] Shared an identical in-flight generation ({flight_key[:12]})"
+            )
+        return result, "\n".join(status_lines)
 
-                # Generate
-                response = model.respond(chat, config=gen_config)
-                result = str(response).strip()
+    def _expand(
+        self,
+        system_prompt: str,
+        yaml_input: str,
+        config: LLMConfig,
+        node_id: Optional[str],
+        keywords: list[str],
+        status_lines: list[str],
+        cache_key: Optional[str],
+    ) -> tuple[str, str]:
+        """
+        Generate an expansion on one of the configured hosts.
 
-                status_lines.append(f"[LLM] Generated {len(result)} characters")
+        Args:
+            system_prompt: System prompt as sent to the LLM
+            yaml_input: Variables as sent to the LLM
+            config: LLM configuration
+            node_id: ComfyUI node ID for live streaming previews
+            keywords: Preset keywords to check the output for
+            status_lines: Status lines so far (extended in place)
+            cache_key: Expansion cache key to store the result under, or None
 
-                # Unload if requested
-                if config.get("unload", True):
-                    try:
-                        model.unload()
-                        status_lines.append("[LLM] Model unloaded")
-                    except Exception as e:
-                        status_lines.append(f"[WARNING] Unload failed: {e}")
+        Returns:
+            Tuple of (expanded_prompt, status_info)
 
-                return result, "\n".join(status_lines)
+        Raises:
+            GenerationInterrupted: The ComfyUI prompt was cancelled
+        """
+        metrics = get_metrics()
+        labels = config.metric_labels
+
+        if processing_interrupted():
+            raise GenerationInterrupted("Cancelled before generation")
+
+        backend = get_backend(config.backend)
+        unavailable = backend.unavailable_reason()
+        if unavailable:
+            status_lines.append(f"[ERROR] {unavailable}")
+            return "", "\n".join(status_lines)
 
+        try:
+            if config.seed >= 0:
+                status_lines.append(f"[LLM] Using seed: {config.seed}")
+
+            if config.model_id:
+                status_lines.append(f"[LLM] Using model: {config.model_id}")
+            else:
+                status_lines.append("[LLM] Using currently loaded model")
+
+            status_lines.append(
+                f"[LLM] Generating: temp={config.temperature}, "
+                f"max_tokens={config.max_tokens}"
+            )
+
+            # Route to a host, failing over to the next one if it cannot be reached
+            hosts = config.host_list
+            balancer = get_host_balancer()
+            tried: list[str] = []
+            while True:
+                address = balancer.acquire(hosts, config.balancing, exclude=tuple(tried))
+                tried.append(address)
+                status_lines.append(f"[LLM] Connecting to {address} ({backend.name})")
+                try:
+                    result, elapsed, ttft, tps, stats = self._generate_on_host(
+                        backend, config.for_host(address), system_prompt, yaml_input,
+                        node_id, status_lines,
+                    )
+                except backend.connection_errors() as e:
+                    balancer.release(address, failed=True, error=f"{type(e).__name__}: {e}")
+                    if len(tried) >= len(hosts):
+                        raise
+                    status_lines.append(
+                        f"[Hosts] {address} unreachable ({type(e).__name__}), failing over"
+                    )
+                    continue
+                except Exception:
+                    balancer.release(address)
+                    raise
+                balancer.release(address)
+                break
+
+            status_lines.append(f"[LLM] Generated {len(result)} characters in {elapsed:.2f}s")
+            if ttft is not None:
+                status_lines.append(f"[LLM] Streamed: first token {ttft:.2f}s, {tps:.1f} tok/s")
+
+            leaked = find_leaked_keywords(result, keywords)
+            if leaked:
+                hint = "" if config.preexpand_keywords else " - enable preexpand_keywords"
+                status_lines.append(
+                    f"[WARNING] Preset keyword(s) in output: {', '.join(leaked)}{hint}"
+                )
+
+            if cache_key and result:
+                get_expansion_cache().put(cache_key, result, elapsed)
+
+            metrics.inc("zforge_requests_total", outcome="ok", **labels)
+            backend_stats = backend.format_stats()
+            if backend_stats:
+                status_lines.append(backend_stats)
+            if len(hosts) > 1:
+                status_lines.append(balancer.format_stats(hosts))
+            if config.cache_mode != "Off":
+                status_lines.append(get_expansion_cache().format_stats())
+            return result, "\n".join(status_lines)
+
+        except GenerationInterrupted:
+            metrics.inc("zforge_requests_total", outcome="cancelled", **labels)
+            raise
         except Exception as e:
+            metrics.inc("zforge_requests_total", outcome="error", **labels)
             status_lines.append(f"[ERROR] {type(e).__name__}: {e}")
 
             error_str = str(e).lower()
@@ -489,6 +900,55 @@ class ZForgePromptBuilder:
 
             return "", "\n".join(status_lines)
 
+    def _serve_from_reservoir(
+        self, node_inputs: dict[str, Any], config: LLMConfig, status_lines: list[str]
+    ) -> Optional[dict[str, Any]]:
+        """
+        Pop a pre-expanded prompt for a fully randomized run and keep the pool refilling.
+
+        Returns:
+            Node output like build_prompt(), or None if the pool is empty
+        """
+        reservoir = get_prompt_reservoir()
+        key = pool_key(node_inputs, config)
+        seed = node_inputs.get("seed")
+        popped = reservoir.pop(key, seed)
+        reservoir.register(
+            key,
+            {
+                **node_inputs,
+                "llm_config": config.with_changes(reservoir_depth=0, lookahead=False),
+                "unique_id": None,
+            },
+            hosts=config.host_list,
+            depth=config.reservoir_depth,
+            refills_per_minute=config.reservoir_refill_per_minute,
+            seed=seed,
+        )
+        if popped is None:
+            if reservoir.is_refilling(key):
+                status_lines.append(
+                    "[Reservoir] Nothing ready for this seed - expanding now, refilling in the background"
+                )
+            else:
+                status_lines.append(
+                    "[Reservoir] Next seed not predictable (use the increment, decrement or fixed "
+                    "control) - not refilling"
+                )
+            return None
+
+        entry, left = popped
+        get_metrics().inc("zforge_requests_total", outcome="reservoir_hit", **config.metric_labels)
+        status = "\n".join([
+            f"[Reservoir] Served a pre-expanded prompt ({left} left)",
+            entry["status"],
+            reservoir.format_stats(key),
+        ])
+        return {
+            "ui": {"randomized_values": [entry["randomized_values"]]},
+            "result": (entry["variables"], entry["llm_instructions"], entry["image_prompt"], status),
+        }
+
     def build_prompt(
         self,
         # Mode Selection
@@ -538,12 +998,15 @@ class ZForgePromptBuilder:
         # Optional
         person_2: Optional[str] = None,
         person_3: Optional[str] = None,
-        llm_config: Optional[str] = None,
+        llm_config: Optional[LLMConfig] = None,
         interaction: str = "",
         yaml_input: str = "",
         system_prompt_override: str = "",
+        seed: Optional[int] = None,
+        unique_id: Optional[str] = None,
     ):
         """Build the prompt."""
+        node_inputs = {name: value for name, value in locals().items() if name != "self"}
         status_lines = []
         randomized_values = {}  # Track values for UI update
 
@@ -595,15 +1058,30 @@ class ZForgePromptBuilder:
             }
 
         # Parse LLM config (uses defaults if not connected)
-        config = parse_llm_config(llm_config)
+        metrics = get_metrics()
+        with metrics.time_stage("config_parse"):
+            config = parse_llm_config(llm_config)
+        labels = config.metric_labels
 
         if llm_config:
             # Show config status if connected
-            if config.get("status"):
-                status_lines.append(f"[LLM Config] {config['status']}")
+            if config.status:
+                status_lines.append(f"[LLM Config] {config.status}")
         else:
             status_lines.append("[LLM Config] Using defaults (no config node connected)")
 
+        # Fully randomized runs can take a prompt the reservoir expanded in the background
+        if (
+            config.reservoir_depth
+            and llm_mode == "Internal (LM Studio)"
+            and input_mode != "YAML Mode"
+            and randomize_all_people
+            and randomize_scene
+        ):
+            served = self._serve_from_reservoir(node_inputs, config, status_lines)
+            if served is not None:
+                return served
+
         status_lines.append(f"[Genre] {genre}")
 
         # Validate Person 1 ethnicity against genre
@@ -611,17 +1089,8 @@ class ZForgePromptBuilder:
         if eth_warning:
             status_lines.append(eth_warning)
 
-        # Determine system prompt (priority: override > config > default)
-        if system_prompt_override.strip():
-            system_prompt = system_prompt_override.strip()
-            status_lines.append("[Prompt] Using override")
-        elif config.get("system_prompt"):
-            system_prompt = config["system_prompt"]
-            template_name = config.get("system_prompt_template", "from config")
-            status_lines.append(f"[Prompt] Using template: {template_name}")
-        else:
-            system_prompt = DEFAULT_SYSTEM_PROMPT
-            status_lines.append("[Prompt] Using default v3")
+        system_prompt, prompt_info = resolve_system_prompt(system_prompt_override, config)
+        status_lines.append(prompt_info)
 
         num_people = int(people)
 
@@ -638,7 +1107,8 @@ class ZForgePromptBuilder:
 
             # Apply Person 1 randomization if enabled
             if should_randomize_p1:
-                p1_data = randomize_subject(genre=genre)
+                with metrics.time_stage("randomize", **labels):
+                    p1_data = randomize_subject(genre=genre, rng=derive_rng(seed, "person_1"))
                 person_1_age = p1_data["age"]
                 person_1_gender = p1_data["gender"]
                 person_1_ethnicity = p1_data["ethnicity"]
@@ -680,7 +1150,8 @@ class ZForgePromptBuilder:
 
             # Apply scene randomization if enabled
             if randomize_scene:
-                scene_data = generate_random_scene(genre=genre)
+                with metrics.time_stage("randomize", **labels):
+                    scene_data = generate_random_scene(genre=genre, rng=derive_rng(seed, "scene"))
                 location = scene_data["location"]
                 time = scene_data["time"]
                 weather = scene_data["weather"]
@@ -732,10 +1203,12 @@ class ZForgePromptBuilder:
             # Master randomize cascades to connected Person nodes
             if randomize_all_people:
                 if num_people >= 2:
-                    p2_data = randomize_subject(genre=genre)
+                    with metrics.time_stage("randomize", **labels):
+                        p2_data = randomize_subject(genre=genre, rng=derive_rng(seed, "person_2"))
                     status_lines.extend(format_randomized_person(p2_data, "Person 2"))
                 if num_people >= 3:
-                    p3_data = randomize_subject(genre=genre)
+                    with metrics.time_stage("randomize", **labels):
+                        p3_data = randomize_subject(genre=genre, rng=derive_rng(seed, "person_3"))
                     status_lines.extend(format_randomized_person(p3_data, "Person 3"))
             else:
                 # Log connected nodes with their status from Person node
@@ -751,92 +1224,104 @@ class ZForgePromptBuilder:
                     status_lines.append("[Person 3] connected")
 
             # Build YAML
-            yaml_output = build_yaml_from_widgets(
-                subjects=num_people,
-                aspect=aspect,
-                # Person 1
-                s1_age=person_1_age,
-                s1_gender=person_1_gender,
-                s1_ethnicity=person_1_ethnicity,
-                s1_body_type=person_1_body_type,
-                s1_body_type_custom=person_1_body_type_custom,
-                s1_hair=person_1_hair,
-                s1_face=person_1_face,
-                s1_expression=person_1_expression,
-                s1_gaze=person_1_gaze,
-                s1_hands=person_1_hands,
-                s1_skin_texture=person_1_skin_texture,
-                s1_skin_details=person_1_skin_details,
-                s1_extras=person_1_extras,
-                s1_outfit=person_1_outfit,
-                s1_accessories=person_1_accessories,
-                s1_footwear=person_1_footwear,
-                s1_pose=person_1_pose,
-                # Person 2
-                s2_age=p2_data.get("age", ""),
-                s2_gender=p2_data.get("gender", "NA"),
-                s2_ethnicity=p2_data.get("ethnicity", ""),
-                s2_body_type=p2_data.get("body_type", "NA"),
-                s2_body_type_custom=p2_data.get("body_type_custom", ""),
-                s2_hair=p2_data.get("hair", ""),
-                s2_face=p2_data.get("face", ""),
-                s2_expression=p2_data.get("expression", ""),
-                s2_gaze=p2_data.get("gaze", ""),
-                s2_hands=p2_data.get("hands", ""),
-                s2_skin_texture=p2_data.get("skin_texture", ""),
-                s2_skin_details=p2_data.get("skin_details", ""),
-                s2_extras=p2_data.get("extras", ""),
-                s2_outfit=p2_data.get("outfit", ""),
-                s2_accessories=p2_data.get("accessories", ""),
-                s2_footwear=p2_data.get("footwear", ""),
-                s2_pose=p2_data.get("pose", ""),
-                # Person 3
-                s3_age=p3_data.get("age", ""),
-                s3_gender=p3_data.get("gender", "NA"),
-                s3_ethnicity=p3_data.get("ethnicity", ""),
-                s3_body_type=p3_data.get("body_type", "NA"),
-                s3_body_type_custom=p3_data.get("body_type_custom", ""),
-                s3_hair=p3_data.get("hair", ""),
-                s3_face=p3_data.get("face", ""),
-                s3_expression=p3_data.get("expression", ""),
-                s3_gaze=p3_data.get("gaze", ""),
-                s3_hands=p3_data.get("hands", ""),
-                s3_skin_texture=p3_data.get("skin_texture", ""),
-                s3_skin_details=p3_data.get("skin_details", ""),
-                s3_extras=p3_data.get("extras", ""),
-                s3_outfit=p3_data.get("outfit", ""),
-                s3_accessories=p3_data.get("accessories", ""),
-                s3_footwear=p3_data.get("footwear", ""),
-                s3_pose=p3_data.get("pose", ""),
-                # Interaction
-                interaction=interaction,
-                # Scene
-                location=location,
-                time=time,
-                weather=weather,
-                atmosphere=atmosphere,
-                props=props,
-                background=background,
-                era=era,
-                action=action,
-                story=story,
-                lighting=lighting,
-                # Composition
-                framing=framing,
-                camera_angle=camera_angle,
-            )
+            with metrics.time_stage("yaml_build", **labels):
+                yaml_output = build_yaml_from_widgets(
+                    subjects=num_people,
+                    aspect=aspect,
+                    # Person 1
+                    s1_age=person_1_age,
+                    s1_gender=person_1_gender,
+                    s1_ethnicity=person_1_ethnicity,
+                    s1_body_type=person_1_body_type,
+                    s1_body_type_custom=person_1_body_type_custom,
+                    s1_hair=person_1_hair,
+                    s1_face=person_1_face,
+                    s1_expression=person_1_expression,
+                    s1_gaze=person_1_gaze,
+                    s1_hands=person_1_hands,
+                    s1_skin_texture=person_1_skin_texture,
+                    s1_skin_details=person_1_skin_details,
+                    s1_extras=person_1_extras,
+                    s1_outfit=person_1_outfit,
+                    s1_accessories=person_1_accessories,
+                    s1_footwear=person_1_footwear,
+                    s1_pose=person_1_pose,
+                    # Person 2
+                    s2_age=p2_data.get("age", ""),
+                    s2_gender=p2_data.get("gender", "NA"),
+                    s2_ethnicity=p2_data.get("ethnicity", ""),
+                    s2_body_type=p2_data.get("body_type", "NA"),
+                    s2_body_type_custom=p2_data.get("body_type_custom", ""),
+                    s2_hair=p2_data.get("hair", ""),
+                    s2_face=p2_data.get("face", ""),
+                    s2_expression=p2_data.get("expression", ""),
+                    s2_gaze=p2_data.get("gaze", ""),
+                    s2_hands=p2_data.get("hands", ""),
+                    s2_skin_texture=p2_data.get("skin_texture", ""),
+                    s2_skin_details=p2_data.get("skin_details", ""),
+                    s2_extras=p2_data.get("extras", ""),
+                    s2_outfit=p2_data.get("outfit", ""),
+                    s2_accessories=p2_data.get("accessories", ""),
+                    s2_footwear=p2_data.get("footwear", ""),
+                    s2_pose=p2_data.get("pose", ""),
+                    # Person 3
+                    s3_age=p3_data.get("age", ""),
+                    s3_gender=p3_data.get("gender", "NA"),
+                    s3_ethnicity=p3_data.get("ethnicity", ""),
+                    s3_body_type=p3_data.get("body_type", "NA"),
+                    s3_body_type_custom=p3_data.get("body_type_custom", ""),
+                    s3_hair=p3_data.get("hair", ""),
+                    s3_face=p3_data.get("face", ""),
+                    s3_expression=p3_data.get("expression", ""),
+                    s3_gaze=p3_data.get("gaze", ""),
+                    s3_hands=p3_data.get("hands", ""),
+                    s3_skin_texture=p3_data.get("skin_texture", ""),
+                    s3_skin_details=p3_data.get("skin_details", ""),
+                    s3_extras=p3_data.get("extras", ""),
+                    s3_outfit=p3_data.get("outfit", ""),
+                    s3_accessories=p3_data.get("accessories", ""),
+                    s3_footwear=p3_data.get("footwear", ""),
+                    s3_pose=p3_data.get("pose", ""),
+                    # Interaction
+                    interaction=interaction,
+                    # Scene
+                    location=location,
+                    time=time,
+                    weather=weather,
+                    atmosphere=atmosphere,
+                    props=props,
+                    background=background,
+                    era=era,
+                    action=action,
+                    story=story,
+                    lighting=lighting,
+                    # Composition
+                    framing=framing,
+                    camera_angle=camera_angle,
+                )
 
         # Handle LLM mode
         expanded_prompt = ""
 
         if llm_mode == "Internal (LM Studio)":
             status_lines.append("[LLM] Internal mode - generating prompt")
-            expanded_prompt, lm_info = self._call_lm_studio(
-                system_prompt=system_prompt,
-                yaml_input=yaml_output,
-                config=config,
-            )
+            try:
+                expanded_prompt, lm_info = self._call_lm_studio(
+                    system_prompt=system_prompt,
+                    yaml_input=yaml_output,
+                    config=config,
+                    node_id=unique_id,
+                )
+            except GenerationInterrupted:
+                raise_interrupt()
             status_lines.append(lm_info)
+            if not expanded_prompt and config.offline_fallback:
+                expanded_prompt, offline_info = expand_offline(system_prompt, yaml_output, genre)
+                status_lines.append("[Offline] LLM expansion failed - used rule-based fallback")
+                status_lines.append(offline_info)
+        elif llm_mode == "Offline (rule-based)":
+            expanded_prompt, offline_info = expand_offline(system_prompt, yaml_output, genre)
+            status_lines.append(offline_info)
         else:
             status_lines.append(
                 "[MODE] External mode - connect 'variables' + 'llm_instructions' to your LLM node"
@@ -850,6 +1335,18 @@ class ZForgePromptBuilder:
             "result": (yaml_output, system_prompt, expanded_prompt, status),
         }
 
+    async def build_prompt_async(self, **kwargs: Any) -> dict[str, Any]:
+        """
+        Coroutine version of build_prompt() for async-capable ComfyUI.
+
+        Internal mode runs in a worker thread: the backend's network I/O and
+        model loading block, and would otherwise hold the executor's event
+        loop. External and Offline modes are CPU-only and run inline.
+        """
+        if kwargs.get("llm_mode") != "Internal (LM Studio)":
+            return self.build_prompt(**kwargs)
+        return await asyncio.to_thread(self.build_prompt, **kwargs)
+
 
 # Node registration
 NODE_CLASS_MAPPINGS = {"ZForgePromptBuilder": ZForgePromptBuilder}